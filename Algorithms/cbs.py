@@ -2,39 +2,53 @@ from Primitives.node import Node
 
 from .mapf import MAPF
 from .search_tree import SearchTreePQS
-from .utils import validate, simulate, get_start_node, update_solution_for
+from .stats import SolverStats
+from .utils import validate, simulate, get_start_node, replan, CacheUsage
 
 
-def solve(task: MAPF):
-    """ Base version of the conflict based search """
+def solve(task: MAPF, disjoint=False, time_limit=None, node_limit=None, stats=False):
+    """
+    Base version of the conflict based search
 
-    ast = SearchTreePQS()
+    - disjoint: split conflicts into a positive and a negative constraint on one agent
+    - time_limit, node_limit: seconds and expanded nodes the search may take, when it runs out of them
+        the best conflict free node found so far is returned, if any, see `SearchTreePQS` for the result
+    - stats: time the phases of the search and count its nodes, see `SolverStats`
+    """
 
-    if not validate(task): return None, ast
+    ast = SearchTreePQS(time_limit, node_limit)
+    ast.stats['low level cache'] = CacheUsage(task)
+    run = SolverStats(ast, task, enabled=stats).timed(
+        get_start_node=get_start_node, simulate=simulate, make_copy=Node.make_copy, replan=replan,
+        add_to_open=ast.add_to_open, get_best_node_from_open=ast.get_best_node_from_open
+    )
 
-    node = get_start_node(task)
-    if node is None: return None, ast
+    if not validate(task): return ast.finish(), ast
 
-    ast.add_to_open(node)
+    node = run.get_start_node(task)
+    if node is None: return ast.finish(), ast
+
+    run.add_to_open(node)
 
     while not ast.open_is_empty():  # MAIN LOOP
-        node: Node = ast.get_best_node_from_open() # type: ignore
+        if ast.out_of_budget(): break
+        node: Node = run.get_best_node_from_open() # type: ignore
         if node is None: break # open is empty
 
-        conflicts = simulate(node)
+        conflicts = run.simulate(node)
         if not conflicts:  # goal node found
-            return node, ast
+            return ast.finish(node), ast
 
         conflict = conflicts[0]  # base version without any improvements
 
-        for agent_id in conflict.agent_ids: # generate new nodes for 2 agents
-            neighbor = node.make_copy(conflict.produce_constraint(agent_id))
+        for constraint in conflict.split(disjoint): # generate 2 new nodes
+            neighbor = run.make_copy(node, constraint)
 
             if not ast.was_expanded(neighbor):
-                if update_solution_for(agent_id, neighbor, task):
+                if run.replan(neighbor, task):
                     assert neighbor.cost >= node.cost
-                    ast.add_to_open(neighbor)
+                    run.add_to_open(neighbor)
 
         ast.add_to_closed(node)
 
-    return None, ast
+    return ast.finish(), ast
@@ -1,5 +1,6 @@
 import itertools
 from operator import attrgetter
+from typing import Optional
 from collections import Counter
 
 from Primitives.node import Node
@@ -7,43 +8,67 @@ from Primitives.conflict import Conflict, VertexConflict, EdgeConflict
 
 from .mapf import MAPF
 from .search_tree import SearchTreePQS
-from .utils import validate, simulate, get_start_node, update_solution_for
-
-
-def solve(task: MAPF):
-    """ Conflict based search with prioritizing conflicts optimization and not lazy """
-
-    ast = SearchTreePQS()
+from .stats import SolverStats
+from .symmetry import SymmetryReasoning
+from .utils import validate, simulate, get_start_node, replan, CacheUsage
+
+
+def solve(task: MAPF, disjoint=False, symmetry=False, time_limit=None, node_limit=None, stats=False):
+    """
+    Conflict based search with prioritizing conflicts optimization and not lazy
+
+    - disjoint: split conflicts with positive constraints, as in `cbs`
+    - symmetry: split rectangle and corridor conflicts with barrier constraints, see `SymmetryReasoning`
+    - time_limit, node_limit: budget of the search, as in `cbs`
+    - stats: time the phases of the search and count its nodes, as in `cbs`
+    """
+
+    ast = SearchTreePQS(time_limit, node_limit)
+    ast.stats['low level cache'] = CacheUsage(task)
+    reasoning = SymmetryReasoning(task) if symmetry else None
+    if reasoning: ast.stats['symmetric conflicts'] = reasoning
+    run = SolverStats(ast, task, enabled=stats).timed(
+        get_start_node=get_start_node, simulate=simulate, best_conflict=best_conflict, make_copy=Node.make_copy,
+        replan=replan, add_to_open=ast.add_to_open, get_best_node_from_open=ast.get_best_node_from_open
+    )
 
-    if not validate(task): return None, ast
+    if not validate(task): return ast.finish(), ast
 
-    node = get_start_node(task, counted_mdds=True)
-    if node is None: return None, ast
+    node = run.get_start_node(task, counted_mdds=True)
+    if node is None: return ast.finish(), ast
 
-    ast.add_to_open(node)
+    run.add_to_open(node)
 
     while not ast.open_is_empty():  # MAIN LOOP
-        node: Node = ast.get_best_node_from_open() # type: ignore
+        if ast.out_of_budget(): break
+        node: Node = run.get_best_node_from_open() # type: ignore
         if node is None: break # open is empty
 
-        conflict = best_conflict(node)
-        if conflict is None:  # goal node found
-            return node, ast
+        conflicts = run.simulate(node)
+        if not conflicts:  # goal node found
+            return ast.finish(node), ast
+        conflict = run.best_conflict(node, conflicts)
 
-        for agent_id in conflict.agent_ids: # generate new nodes for 2 agents
-            neighbor = node.make_copy(conflict.produce_constraint(agent_id))
+        constraints = reasoning.split(node, conflict) if reasoning else None
+        for constraint in constraints or conflict.split(disjoint): # generate 2 new nodes
+            neighbor = run.make_copy(node, constraint)
 
             if not ast.was_expanded(neighbor):
-                if update_solution_for(agent_id, neighbor, task, counted_mdd=True):
+                if run.replan(neighbor, task, counted_mdd=True):
                     assert neighbor.cost >= node.cost
-                    ast.add_to_open(neighbor)
+                    run.add_to_open(neighbor)
 
         ast.add_to_closed(node)
 
-    return None, ast
+    return ast.finish(), ast
+
 
+def best_conflict(node: Node, conflicts: Optional[list[Conflict]] = None) -> Conflict:
+    """
+    Cardinal conflict of the node if there is one, else semi-cardinal, else the first one, `None` without conflicts
 
-def best_conflict(node: Node) -> Conflict:
+    - conflicts: conflicts of the node, if `simulate` has found them already
+    """
     def get_mdd(agent_id: int):
         return node.solutions[agent_id].counted_mdd
     
@@ -55,7 +80,7 @@ def best_conflict(node: Node) -> Conflict:
             return mdd[layer] == 1
         return True
 
-    conflicts = simulate(node)
+    if conflicts is None: conflicts = simulate(node)
     if not conflicts: return None # type: ignore
 
     # order conflicts by priority of their agents and iterate through them,
@@ -1,87 +1,240 @@
 import numpy as np
-import networkx as nx
+from typing import Optional
 
 from Primitives.node import Node
+from Primitives.solution import Solution
 
 from .mapf import MAPF
 from .search_tree import SearchTreePQS
-from .utils import validate, simulate, get_start_node, update_solution_for
+from .stats import SolverStats
+from .utils import validate, simulate, get_start_node, replan, CacheUsage
 
 
-def solve(task: MAPF):
-    """ Conflict based search using admissable heuristic """
+def solve(task: MAPF, disjoint=False, time_limit=None, node_limit=None, stats=False):
+    """ Conflict based search using admissable heuristic, `disjoint`, `time_limit`, `node_limit` and `stats` as in `cbs` """
 
-    ast = SearchTreePQS()
+    ast = SearchTreePQS(time_limit, node_limit)
+    pairs = PairStats()
+    ast.stats['cardinal pairs'] = pairs
+    ast.stats['low level cache'] = CacheUsage(task)
+    run = SolverStats(ast, task, enabled=stats).timed(
+        get_start_node=get_start_node, simulate=simulate, make_copy=Node.make_copy, replan=replan,
+        heuristic=heuristic, add_to_open=ast.add_to_open, get_best_node_from_open=ast.get_best_node_from_open
+    )
 
-    if not validate(task): return None, ast
+    if not validate(task): return ast.finish(), ast
 
-    node = get_start_node(task, mdds=True)
-    if node is None: return None, ast
+    node = run.get_start_node(task, mdds=True)
+    if node is None: return ast.finish(), ast
 
-    ast.add_to_open(node)
+    run.add_to_open(node)
 
     while not ast.open_is_empty():  # MAIN LOOP
-        node: Node = ast.get_best_node_from_open() # type: ignore
+        if ast.out_of_budget(): break
+        node: Node = run.get_best_node_from_open() # type: ignore
         if node is None: break # open is empty
 
-        conflicts = simulate(node)
+        conflicts = run.simulate(node)
         if not conflicts:  # goal node found
-            return node, ast
+            return ast.finish(node), ast
 
         conflict = conflicts[0]
 
-        for agent_id in conflict.agent_ids: # generate new nodes for 2 agents
-            neighbor = node.make_copy(conflict.produce_constraint(agent_id))
+        for constraint in conflict.split(disjoint): # generate 2 new nodes
+            neighbor = run.make_copy(node, constraint)
 
             if not ast.was_expanded(neighbor):
-                if update_solution_for(agent_id, neighbor, task, mdd=True):
-                    h = heuristic(neighbor)
+                if run.replan(neighbor, task, mdd=True):
+                    h = run.heuristic(neighbor, pairs)
                     neighbor.cost += h # CBS-h
                     # assert neighbor.cost >= node.cost, "child cost must be >= parent cost"
-                    ast.add_to_open(neighbor)
+                    run.add_to_open(neighbor)
 
         ast.add_to_closed(node)
 
-    return None, ast
+    return ast.finish(), ast
 
 
-def heuristic(node: Node) -> int:
-    def get_mdd(agent_id: int) -> list[np.ndarray]:
-        return node.solutions[agent_id].mdd # type: ignore
+class PairStats:
+    """
+    How the pairs of agents in the cardinal graphs were found
+
+    - checked: pairs whose singleton MDD layers were compared, all pairs of a graph built anew
+        and the pairs of the replanned agents when the graph is updated from the parent's one
+    - reused: pairs whose edges were taken unchanged from the parent's graph
+    """
+
+    def __init__(self) -> None:
+        self.checked = 0
+        self.reused = 0
+
+    def __repr__(self) -> str:
+        return f"{self.checked} checked, {self.reused} reused from the parent's graph"
+
+
+class CardinalGraph:
+    """
+    Graph of agents whose MDDs have singleton layers at the same cell at the same time,
+    its minimum vertex cover is the CBS-h heuristic
+
+    - singletons: (N, L) array, cell of each agent's MDD layer if the layer has only one cell, -1 otherwise,
+        L is the longest MDD, shorter ones are padded with -1
+    - adjacency: for each agent a bitset of its neighbours in the graph
+    - cover: size of the minimum vertex cover
+    """
+
+    def __init__(self, singletons: np.ndarray, adjacency: list[int]) -> None:
+        self.singletons = singletons
+        self.adjacency = adjacency
+        self.cover = min_vertex_cover(adjacency)
+
+
+def singletons_of(solution: Solution) -> np.ndarray:
+    """ Cells of the solution's singleton MDD layers as `x << 32 | y`, -1 for the wider layers """
+    assert solution.mdd is not None
+    return solution.mdd.singletons()
 
-    conflict_graph = nx.Graph()
-    num_agents = len(node.solutions)
 
-    for outer_agent in range(num_agents):
-        for inner_agent in range(outer_agent + 1, num_agents):
-            mdd1 = get_mdd(outer_agent)
-            mdd2 = get_mdd(inner_agent)
-
-            # TODO: delete
-            assert mdd1
-            assert mdd2
-
-            for layer1, layer2 in zip(mdd1, mdd2):
-                if layer1.shape[0] == layer2.shape[0] == 1:
-                    if layer1[0, 0] == layer2[0, 0] and layer1[0, 1] == layer2[0, 1]:
-                        conflict_graph.add_edge(inner_agent, outer_agent)
-
-    for k in range(1, conflict_graph.number_of_nodes()):
-        if k_vertex_cover(conflict_graph, k):
-            return k
-    return 0
-
-
-def k_vertex_cover(g, k):
-    if g.number_of_edges() == 0:
-        return True
-    elif g.number_of_edges() > k*g.number_of_nodes():
-        return False
-        
-    v = list(g.edges())[0]
-    g1 = g.copy()
-    g2 = g.copy()
-
-    g1.remove_node(v[0])
-    g2.remove_node(v[1])
-    return k_vertex_cover(g1, k-1) or k_vertex_cover(g2, k-1)
+def _bitset(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def _meetings(singletons: np.ndarray, agent: int) -> np.ndarray:
+    """ Mask of agents whose singleton layers meet the agent's ones """
+    row = singletons[agent]
+    meet = ((singletons == row) & (row >= 0)).any(axis=1)
+    meet[agent] = False
+    return meet
+
+
+def _fit(singletons: np.ndarray, width: int) -> np.ndarray:
+    """ `singletons` padded with -1 to have at least `width` columns, copied in any case """
+    padded = np.full((singletons.shape[0], max(width, singletons.shape[1])), -1, dtype=np.int64)
+    padded[:, :singletons.shape[1]] = singletons
+    return padded
+
+
+def cardinal_graph(node: Node, pairs: Optional[PairStats] = None) -> CardinalGraph:
+    """
+    Fills `node.cardinal_graph` and returns it, counting the pairs in `pairs`
+
+    If the parent has its graph, only agents with different solutions are checked again
+    """
+    if node.cardinal_graph is not None:
+        return node.cardinal_graph # type: ignore
+
+    num_agents = len(node.solutions)
+    parent: Optional[CardinalGraph] = node.parent.cardinal_graph if node.parent is not None else None # type: ignore
+    if parent is None:
+        node.cardinal_graph = _build_graph(node.solutions, pairs)
+        return node.cardinal_graph
+
+    changed = [
+        agent for agent, solution in enumerate(node.solutions)
+        if solution is not node.parent.solutions[agent] # type: ignore
+    ]
+    rows = [singletons_of(node.solutions[agent]) for agent in changed]
+    singletons = _fit(parent.singletons, max(map(len, rows), default=0))
+    adjacency = list(parent.adjacency)
+    for agent, row in zip(changed, rows):
+        singletons[agent] = -1
+        singletons[agent, :len(row)] = row
+
+        # drop old edges of the agent and add new ones
+        bit = 1 << agent
+        for other in _members(adjacency[agent]):
+            adjacency[other] &= ~bit
+        adjacency[agent] = _bitset(_meetings(singletons, agent))
+        for other in _members(adjacency[agent]):
+            adjacency[other] |= bit
+
+    if pairs is not None:
+        checked = len(changed) * (num_agents - 1) - len(changed) * (len(changed) - 1) // 2
+        pairs.checked += checked
+        pairs.reused += num_agents * (num_agents - 1) // 2 - checked
+
+    node.cardinal_graph = CardinalGraph(singletons, adjacency)
+    return node.cardinal_graph
+
+
+def _build_graph(solutions: list[Solution], pairs: Optional[PairStats]) -> CardinalGraph:
+    num_agents = len(solutions)
+    rows = [singletons_of(solution) for solution in solutions]
+    singletons = np.full((num_agents, max(map(len, rows))), -1, dtype=np.int64)
+    for agent, row in enumerate(rows):
+        singletons[agent, :len(row)] = row
+
+    first, second = np.triu_indices(num_agents, k=1)
+    computed = ((singletons[first] == singletons[second]) & (singletons[first] >= 0)).any(axis=1)
+    meet = np.zeros((num_agents, num_agents), dtype=bool)
+    meet[first, second] = meet[second, first] = computed
+
+    if pairs is not None:
+        pairs.checked += len(first)
+
+    return CardinalGraph(singletons, [_bitset(row) for row in meet])
+
+
+def heuristic(node: Node, pairs: Optional[PairStats] = None) -> int:
+    """ Size of the minimum vertex cover of the node's cardinal graph, cached in the node """
+    return cardinal_graph(node, pairs).cover
+
+
+def _members(bitset: int):
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+def min_vertex_cover(adjacency: list[int]) -> int:
+    """
+    Size of the minimum vertex cover of the graph given by adjacency bitsets, exact
+
+    Branch and bound over subsets of vertices, each subset is solved once. 
+    Connected components are solved apart, leaves take their neighbours without branching
+    """
+    memo: dict[int, int] = {}
+
+    def component(vertex: int, vertices: int) -> int:
+        reached = frontier = 1 << vertex
+        while frontier:
+            neighbours = 0
+            for v in _members(frontier):
+                neighbours |= adjacency[v]
+            frontier = neighbours & vertices & ~reached
+            reached |= frontier
+        return reached
+
+    def cover(vertices: int) -> int:
+        """ size of the minimum cover of the subgraph on `vertices` """
+        if vertices in memo: return memo[vertices]
+        key = vertices
+
+        best, best_degree = -1, 0
+        for v in _members(vertices):
+            neighbours = adjacency[v] & vertices
+            degree = neighbours.bit_count()
+            if degree == 0: # isolated, never in the cover
+                vertices &= ~(1 << v)
+            elif degree == 1: # some minimum cover has the leaf's neighbour
+                result = 1 + cover(vertices & ~neighbours & ~(1 << v))
+                break
+            elif degree > best_degree:
+                best, best_degree = v, degree
+        else:
+            if best < 0: 
+                result = 0
+            elif (part := component(best, vertices)) != vertices:
+                result = cover(part) + cover(vertices & ~part)
+            else:
+                # either the vertex is in the cover or all of its neighbours are
+                neighbours = adjacency[best] & vertices
+                result = 1 + cover(vertices & ~(1 << best))
+                if best_degree < result: # bound
+                    result = min(result, best_degree + cover(vertices & ~neighbours & ~(1 << best)))
+
+        memo[key] = result
+        return result
+
+    return cover((1 << len(adjacency)) - 1)
@@ -0,0 +1,51 @@
+from Primitives.node import Node
+
+from .mapf import MAPF
+from .search_tree import SearchTreeFocal
+from .utils import validate, simulate, get_start_node, replan, count_conflicts
+
+
+def solve(task: MAPF, suboptimality=1.5, time_limit=None, node_limit=None):
+    """
+    Enhanced conflict based search, bounded suboptimal: the cost of the found solution
+    is at most `suboptimality` times the optimal one
+
+    Both levels are focal searches: among the nodes within the bound the high level expands
+    the one with the fewest conflicts, the low level plans paths avoiding the other agents' ones
+
+    - time_limit, node_limit: budget of the search, as in `cbs`
+    """
+    if suboptimality < 1:
+        raise ValueError("suboptimality must be at least 1")
+
+    ast = SearchTreeFocal(
+        suboptimality, lambda node: (count_conflicts(node), node.cost), time_limit, node_limit
+    )
+
+    if not validate(task): return ast.finish(), ast
+
+    node = get_start_node(task, suboptimality=suboptimality)
+    if node is None: return ast.finish(), ast
+
+    ast.add_to_open(node)
+
+    while not ast.open_is_empty():  # MAIN LOOP
+        if ast.out_of_budget(): break
+        node: Node = ast.get_best_node_from_open() # type: ignore
+        if node is None: break # open is empty
+
+        conflicts = simulate(node)
+        if not conflicts:  # goal node found
+            return ast.finish(node), ast
+
+        for constraint in conflicts[0].split(): # generate 2 new nodes
+            neighbor = node.make_copy(constraint)
+
+            if not ast.was_expanded(neighbor):
+                if replan(neighbor, task, avoid_conflicts=True, suboptimality=suboptimality):
+                    assert neighbor.lower_bound >= node.lower_bound
+                    ast.add_to_open(neighbor)
+
+        ast.add_to_closed(node)
+
+    return ast.finish(), ast
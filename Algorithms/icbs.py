@@ -1,43 +1,98 @@
 from Primitives.node import Node
+from Primitives.solution import Solution
 
 from .mapf import MAPF
-from .cbsh import heuristic
+from .cbsh import PairStats, heuristic
 from .cbs_pc import best_conflict
 from .search_tree import SearchTreePQS
-from .utils import validate, get_start_node, update_solution_for
+from .stats import SolverStats
+from .symmetry import SymmetryReasoning
+from .utils import validate, simulate, get_start_node, replan, count_conflicts, CacheUsage
 
 
-def solve(task: MAPF):
-    """ Improved conflict based search """
+def solve(task: MAPF, disjoint=False, symmetry=False, time_limit=None, node_limit=None, stats=False):
+    """
+    Improved conflict based search
 
-    ast = SearchTreePQS()
+    - disjoint: split conflicts with positive constraints, as in `cbs`
+    - symmetry: split rectangle and corridor conflicts with barrier constraints, see `SymmetryReasoning`
+    - time_limit, node_limit: budget of the search, as in `cbs`
+    - stats: time the phases of the search and count its nodes, as in `cbs`
+    """
 
-    if not validate(task): 
-        return None, ast
+    ast = SearchTreePQS(time_limit, node_limit)
+    pairs = PairStats()
+    ast.stats['cardinal pairs'] = pairs
+    ast.stats['low level cache'] = CacheUsage(task)
+    reasoning = SymmetryReasoning(task) if symmetry else None
+    if reasoning: ast.stats['symmetric conflicts'] = reasoning
+    ast.stats['bypasses'] = 0
+    run = SolverStats(ast, task, enabled=stats).timed(
+        get_start_node=get_start_node, simulate=simulate, best_conflict=best_conflict, make_copy=Node.make_copy,
+        replan=replan, bypass=bypass, heuristic=heuristic,
+        add_to_open=ast.add_to_open, get_best_node_from_open=ast.get_best_node_from_open
+    )
 
-    node = get_start_node(task, counted_mdds=True, mdds=True)
-    if node is None: 
-        return None, ast
+    if not validate(task): return ast.finish(), ast
 
-    ast.add_to_open(node)
+    node = run.get_start_node(task, counted_mdds=True, mdds=True)
+    if node is None: return ast.finish(), ast
+
+    run.add_to_open(node)
 
     while not ast.open_is_empty():  # MAIN LOOP
-        node: Node = ast.get_best_node_from_open() # type: ignore
+        if ast.out_of_budget(): break
+        node: Node = run.get_best_node_from_open() # type: ignore
         if node is None: 
             break # open is empty
 
-        conflict = best_conflict(node)
-        if conflict is None:  # goal node found
-            return node, ast
+        conflicts = run.simulate(node)
+        if not conflicts:  # goal node found
+            return ast.finish(node), ast
+        conflict = run.best_conflict(node, conflicts)
 
-        for agent_id in conflict.agent_ids: # generate new nodes for 2 agents
-            neighbor = node.make_copy(conflict.produce_constraint(agent_id))
+        neighbors, bypassed = [], False
+        constraints = reasoning.split(node, conflict) if reasoning else None
+        for constraint in constraints or conflict.split(disjoint): # generate 2 new nodes
+            neighbor = run.make_copy(node, constraint)
 
             if not ast.was_expanded(neighbor):
-                if update_solution_for(agent_id, neighbor, task, counted_mdd=True, mdd=True):
-                    neighbor.cost += heuristic(neighbor)
-                    ast.add_to_open(neighbor)
+                if run.replan(neighbor, task, counted_mdd=True, mdd=True, avoid_conflicts=True):
+                    bypassed = run.bypass(node, neighbor)
+                    if bypassed: break
+                    neighbors.append(neighbor)
+
+        if bypassed: # node took the neighbor's path, look at it again instead of branching
+            ast.stats['bypasses'] += 1 # type: ignore
+            run.add_to_open(node)
+            continue
+
+        for neighbor in neighbors:
+            neighbor.cost += run.heuristic(neighbor, pairs)
+            run.add_to_open(neighbor)
 
         ast.add_to_closed(node)
 
-    return None, ast
\ No newline at end of file
+    return ast.finish(), ast
+
+
+def bypass(node: Node, neighbor: Node) -> bool:
+    """
+    Gives the replanned paths from the `neighbor` to the `node` if they cost the same and have fewer conflicts
+
+    The paths satisfy the node's constraints too and have the same costs, 
+    so they lie in the agents' MDDs of the node, which stay as they are
+    """
+    replanned = [
+        agent_id for agent_id, solution in enumerate(neighbor.solutions) 
+        if solution is not node.solutions[agent_id]
+    ]
+    if any(neighbor.solutions[agent_id].cost != node.solutions[agent_id].cost for agent_id in replanned):
+        return False
+    if count_conflicts(neighbor) >= count_conflicts(node):
+        return False
+
+    for agent_id in replanned:
+        old, new = node.solutions[agent_id], neighbor.solutions[agent_id]
+        node.update_solution_for(agent_id, Solution(agent_id, new.path, old.counted_mdd, old.mdd))
+    return True
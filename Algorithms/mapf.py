@@ -13,6 +13,10 @@ class MAPF:
     - map: Map on which paths should be found
     - start_points: 2-d numpy array of start points for each agent (x, y by columns, points by rows)
     - goal_points: 2-d numpy array of goal points for each agent (x, y by columns, points by rows)
+    - distances: cache of exact distance tables to the goal cells (low-level heuristic),
+        filled lazily by `Algorithms.utils.distances_to`
+    - grid: `lightspeed.Grid` for the map, created lazily by `Algorithms.utils.grid_for`
+    - paths: cache of low level search results, created lazily by `Algorithms.utils.path_cache_for`
 
     sizes of start_points and gaol_points must be the same
     """
@@ -20,6 +24,9 @@ class MAPF:
     map: Map = field(default_factory=Map)
     start_points: np.ndarray = _Empty
     goal_points: np.ndarray = _Empty
+    distances: dict = field(default_factory=dict, repr=False, compare=False)
+    grid: object = field(default=None, repr=False, compare=False)
+    paths: object = field(default=None, repr=False, compare=False)
 
     def read_txt(self, filename: str):
         """
@@ -27,16 +34,17 @@ class MAPF:
 
         :param filename - name of the .txt file
         """
-        with open(filename, 'r') as file:
-            lines = file.readlines()
+        with open(filename, 'rb') as file:
+            lines = file.read().splitlines()
 
         self.map.read_txt(lines)
-
-        num_agents = int(lines[self.map.height + 1])
-        self.start_points = np.zeros((num_agents, 2), dtype=int)
-        self.goal_points = np.zeros((num_agents, 2), dtype=int)
-
-        for i in range(num_agents):
-            sy, sx, gy, gx = map(int, lines[self.map.height + 2 + i].split())
-            self.start_points[i] = (sx, sy)
-            self.goal_points[i] = (gx, gy)
+        self.distances.clear()
+        self.grid = None
+        self.paths = None
+
+        # rows of agents are (sy, sx, gy, gx), parsed all at once
+        first = self.map.height + 2
+        num_agents = int(lines[first - 1])
+        points = np.array(b' '.join(lines[first:first + num_agents]).split()).astype(int).reshape(num_agents, 4)
+        self.start_points = points[:, [1, 0]]
+        self.goal_points = points[:, [3, 2]]
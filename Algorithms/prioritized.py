@@ -0,0 +1,144 @@
+import random
+import numpy as np
+from typing import Optional
+
+from Primitives.node import Node
+from Primitives.solution import Solution
+
+from .mapf import MAPF
+from .search_tree import SearchTreePQS
+from .utils import validate, grid_for, distances_to
+
+
+def solve(task: MAPF, orderings=('longest', 'shortest'), restarts=8, seed=0, time_limit=None, node_limit=None):
+    """
+    Prioritized planning: agents are planned one by one, each one avoids the paths of the agents
+    planned before it (their vertices, moves and goals, where they stay forever)
+
+    Fast, but neither optimal nor complete: with a bad ordering some agent has no path around
+    the earlier ones. The cheapest conflict free node over all tried orderings is returned,
+    a good upper bound for the optimal solvers
+
+    - orderings: orderings of the agents tried first, 'longest' plans the agents with longer
+        shortest paths first, 'shortest' the other way round, 'given' in order of the task
+    - restarts: number of random orderings tried after them
+    - seed: seed of the random orderings
+    - time_limit, node_limit: seconds and number of orderings the planner may try
+
+    `ast` only holds the result: its status is 'solved' if some ordering succeeded, 'failed' if none did,
+    or the exhausted budget, `ast.lower_bound` is the sum of the shortest paths lengths,
+    `ast.stats` counts the tried and the failed orderings, no high level nodes are expanded
+    """
+    ast = SearchTreePQS(time_limit)
+    ast.stats['tried orderings'] = 0
+    ast.stats['failed orderings'] = 0
+
+    if not validate(task):
+        ast.status, ast.lower_bound = 'no solution', float('inf')
+        return None, ast
+
+    agents = range(len(task.start_points))
+    distances = [int(distances_to(agent_id, task)[tuple(task.start_points[agent_id][::-1])]) for agent_id in agents]
+    if min(distances, default=0) < 0:
+        ast.status, ast.lower_bound = 'no solution', float('inf')
+        return None, ast
+    ast.lower_bound = sum(distances)
+
+    rng = random.Random(seed)
+    candidates = [_ordering(name, distances) for name in orderings]
+    candidates += [rng.sample(agents, len(agents)) for _ in range(restarts)]
+
+    best: Optional[Node] = None
+    seen: set[tuple[int, ...]] = set()
+    for order in candidates:
+        if tuple(order) in seen: continue
+        if node_limit is not None and len(seen) >= node_limit:
+            ast.status = 'node limit'
+            break
+        if ast.out_of_budget(): break
+
+        node = _plan(task, order)
+        seen.add(tuple(order))
+        ast.stats['tried orderings'] += 1 # type: ignore
+        if node is None:
+            ast.stats['failed orderings'] += 1 # type: ignore
+        elif best is None or node.cost < best.cost:
+            best = node
+
+    ast.incumbent = best
+    if best is not None: ast.status = 'solved'
+    elif ast.status is None: ast.status = 'failed'
+    return best, ast
+
+
+def _ordering(name: str, distances: list[int]) -> list[int]:
+    agents = list(range(len(distances)))
+    if name == 'longest': return sorted(agents, key=lambda agent_id: -distances[agent_id])
+    if name == 'shortest': return sorted(agents, key=lambda agent_id: distances[agent_id])
+    if name == 'given': return agents
+    raise ValueError(f"unknown ordering {name!r}")
+
+
+def _plan(task: MAPF, order: list[int]) -> Optional[Node]:
+    """ Node with the paths of the agents planned in the `order`, `None` if some agent has no path """
+    grid = grid_for(task)
+    reserved = _Reservations()
+    solutions: list[Solution] = [None] * len(order) # type: ignore
+
+    for agent_id in order:
+        path = grid.find_path(
+            task.start_points[agent_id], task.goal_points[agent_id], heuristic=distances_to(agent_id, task),
+            v_constraints=reserved.vertices.rows, e_constraints=reserved.edges.rows, parked=reserved.goals.rows
+        )
+        if path is None: return None
+        solutions[agent_id] = Solution(agent_id, path)
+        reserved.add(path)
+
+    return Node(solutions)
+
+
+class _Reservations:
+    """
+    Paths of the planned agents as constraints for `lightspeed.find_path`:
+    vertices before the ends of the paths, moves between them and goals taken from the end on
+    """
+
+    def __init__(self) -> None:
+        self.vertices = _Rows(3)
+        self.edges = _Rows(5)
+        self.goals = _Rows(3)
+
+    def add(self, path: np.ndarray) -> None:
+        cost = len(path) - 1
+        times = np.arange(cost, dtype=np.int32)[:, None]
+        self.vertices.extend(np.hstack((times, path[:-1])))
+        self.goals.extend(np.hstack(([[cost]], path[-1:])))
+
+        # an edge constraint forbids moving along the edge either way, ends go in sorted order
+        moved = np.any(path[1:] != path[:-1], axis=1)
+        ends = np.stack((path[:-1], path[1:]), axis=1)[moved]
+        swap = (ends[:, 0, 0] > ends[:, 1, 0]) | ((ends[:, 0, 0] == ends[:, 1, 0]) & (ends[:, 0, 1] > ends[:, 1, 1]))
+        ends[swap] = ends[swap][:, ::-1]
+        self.edges.extend(np.hstack((times[moved], ends.reshape(-1, 4))))
+
+
+class _Rows:
+    """ Growing int32 array, so the reservations are not copied for every agent """
+
+    def __init__(self, width: int) -> None:
+        self._data = np.empty((256, width), dtype=np.int32)
+        self._count = 0
+
+    @property
+    def rows(self) -> np.ndarray:
+        """ Contiguous view of the added rows, `lightspeed` may reorder them """
+        return self._data[:self._count]
+
+    def extend(self, rows: np.ndarray) -> None:
+        count = self._count + len(rows)
+        if count > len(self._data):
+            data = np.empty((max(count, 2 * len(self._data)), self._data.shape[1]), dtype=np.int32)
+            data[:self._count] = self.rows
+            self._data = data
+        self._data[self._count:count] = rows
+        self._count = count
@@ -1,10 +1,50 @@
+import time
 from heapq import heappop, heappush
+from itertools import count
+from typing import Optional
+
+from Primitives.node import Node
+
+from .utils import conflict_table
 
 
 class SearchTreePQS:
-    def __init__(self):
+    """
+    Open and closed lists of the high level search, with an optional budget for the search
+
+    - stats: named counters the solver wants to report along with the number of expanded nodes,
+        `finish` stops the ones which have a `stop` method
+    - time_limit: seconds the search may take from the creation of the tree, `None` for no limit
+    - node_limit: number of nodes the search may expand, `None` for no limit
+    - generated, duplicates: number of nodes added to open, and of nodes found expanded already by `was_expanded`,
+        which are pruned then
+    - profile: `SolverStats` of the search if the solver collects them, `finish` completes them
+
+    Result of the search, set by `finish`:
+    - status: 'optimal' when the solution is found (or 'solved' for the bounded suboptimal search),
+        'no solution' if there is none, 'time limit' or 'node limit' if the search ran out of its budget
+    - lower_bound: lower bound on the cost of the optimal solution
+    - incumbent: cheapest conflict free node added to open, the best solution so far,
+        looked for only with a budget, without one the search never stops before it finds a solution
+    """
+
+    solved_status = 'optimal'
+
+    def __init__(self, time_limit: Optional[float] = None, node_limit: Optional[int] = None):
         self._open = []
         self._closed = set()
+        self.stats: dict[str, object] = {}
+        self.generated = 0
+        self.duplicates = 0
+        self.profile = None
+
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self._deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+        self.status: Optional[str] = None
+        self.lower_bound = 0.0
+        self.incumbent: Optional[Node] = None
 
     def __len__(self):
         return len(self._open) + len(self._closed)
@@ -14,6 +54,8 @@ class SearchTreePQS:
 
     def add_to_open(self, item):
         heappush(self._open, item)
+        self.generated += 1
+        self._offer(item)
 
     def get_best_node_from_open(self):
         while self._open:
@@ -26,7 +68,123 @@ class SearchTreePQS:
         self._closed.add(item)
 
     def was_expanded(self, item):
-        return item in self._closed
+        if item in self._closed:
+            self.duplicates += 1
+            return True
+        return False
     
     def count_expanded(self):
         return len(self._closed)
+
+    def open_bound(self) -> float:
+        """ The least cost in open, a lower bound on the cost of the optimal solution """
+        while self._open and self._open[0] in self._closed:
+            heappop(self._open)
+        return self._open[0].cost if self._open else float('inf')
+
+    def out_of_budget(self) -> bool:
+        """ Whether the search has used up its time or node limit, sets the `status` then """
+        if self.node_limit is not None and self.count_expanded() >= self.node_limit:
+            self.status = 'node limit'
+        elif self._deadline is not None and time.perf_counter() >= self._deadline:
+            self.status = 'time limit'
+        return self.status is not None
+
+    def finish(self, solution: Optional[Node] = None) -> Optional[Node]:
+        """ 
+        Sets the result of the search, `solution` is the found one, `None` if the search stopped without it
+
+        Returns the node for the caller: the solution, or the incumbent if the search ran out of its budget
+        """
+        if solution is not None:
+            self.status = self.solved_status
+            self.incumbent = solution
+            self.lower_bound = min(_solution_cost(solution), self.open_bound())
+        elif self.status is None: # open is exhausted
+            self.status = 'no solution'
+            self.lower_bound = float('inf')
+        else:
+            self.lower_bound = self.open_bound()
+            if self.incumbent is not None and self._within_bound(_solution_cost(self.incumbent)):
+                self.status = self.solved_status
+        for counter in self.stats.values():
+            if hasattr(counter, 'stop'): counter.stop(self) # type: ignore
+        return self.incumbent
+
+    def _within_bound(self, cost: int) -> bool:
+        return cost <= self.lower_bound
+
+    def _offer(self, item):
+        """ Makes the node the incumbent if it is conflict free and cheaper than the current one """
+        if self.time_limit is None and self.node_limit is None: return
+        if self.incumbent is not None and _solution_cost(item) >= _solution_cost(self.incumbent): return
+        if not conflict_table(item):
+            self.incumbent = item
+
+
+def _solution_cost(node: Node) -> int:
+    """ Cost of the node's paths, without any heuristic added to the node's cost """
+    return sum(solution.cost for solution in node.solutions)
+
+
+class SearchTreeFocal(SearchTreePQS):
+    """
+    Open list with a focal list for the bounded suboptimal search (ECBS)
+
+    Open is ordered by the lower bounds of the nodes, focal has the nodes with cost
+    at most `suboptimality` times the least lower bound in open and is ordered by `focal_key`,
+    the best node is taken from focal. Nodes are kept in both lists and skipped there once expanded
+
+    - suboptimality: factor of the bound, at least 1
+    - focal_key: function of a node, the least one goes first
+    """
+
+    solved_status = 'solved'
+
+    def __init__(
+        self, suboptimality: float, focal_key, time_limit: Optional[float] = None, node_limit: Optional[int] = None
+    ):
+        super().__init__(time_limit, node_limit)
+        self.suboptimality = suboptimality
+        self.focal_key = focal_key
+        self._focal = []
+        self._rest = [] # nodes of open beyond the bound, by cost
+        self._bound = 0.0
+        self._counter = count()
+
+    def add_to_open(self, item):
+        stamp = next(self._counter)
+        heappush(self._open, (item.lower_bound, stamp, item))
+        if item.cost <= self._bound:
+            heappush(self._focal, (self.focal_key(item), stamp, item))
+        else:
+            heappush(self._rest, (item.cost, stamp, item))
+        self.generated += 1
+        self._offer(item)
+
+    def open_bound(self) -> float:
+        """ The least lower bound of the nodes in open, a lower bound on the cost of the optimal solution """
+        while self._open and self._open[0][2] in self._closed:
+            heappop(self._open)
+        return self._open[0][0] if self._open else float('inf')
+
+    def get_best_node_from_open(self):
+        lower_bound = self.open_bound()
+        if not self._open: return None
+
+        bound = self.suboptimality * lower_bound
+        if bound > self._bound:
+            self._bound = bound
+            while self._rest and self._rest[0][0] <= bound:
+                _, stamp, item = heappop(self._rest)
+                heappush(self._focal, (self.focal_key(item), stamp, item))
+
+        while self._focal:
+            _, _, item = heappop(self._focal)
+            if not self.was_expanded(item):
+                return item
+        # the node with the least lower bound belongs to focal, unless rounding left it out
+        return self._open[0][2]
+
+    def _within_bound(self, cost: int) -> bool:
+        return cost <= self.suboptimality * self.lower_bound
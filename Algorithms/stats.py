@@ -0,0 +1,70 @@
+import time
+from types import SimpleNamespace
+
+from .mapf import MAPF
+from .utils import grid_for
+
+
+class SolverStats:
+    """
+    Where the time of a CBS solver goes, collected when the solver is called with `stats=True`
+    and reported in `ast.stats['profile']`
+
+    Solvers take their hot functions from `timed` once, before the main loop. Switched off,
+    it gives the functions as they are, so the stats cost nothing inside the loop
+
+    - times, calls: seconds spent in each phase and the number of its calls, phases may nest
+    - low_level_calls, low_level_expanded: `find_path` searches made by the solver and the nodes they expanded
+    - generated, expanded, duplicates: high level nodes added to open, expanded,
+        and pruned for having the same constraints as an expanded one
+    """
+
+    def __init__(self, ast, task: MAPF, enabled=True) -> None:
+        self.enabled = enabled
+        self.times: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.low_level_calls = 0
+        self.low_level_expanded = 0
+        self.generated = 0
+        self.expanded = 0
+        self.duplicates = 0
+        if not enabled: return
+
+        self._grid = grid_for(task)
+        self._grid_start = (self._grid.calls, self._grid.expanded)
+        ast.stats['profile'] = self
+        ast.profile = self
+
+    def timed(self, **functions) -> SimpleNamespace:
+        """ Namespace of the functions, each one timed as a phase named after it if the stats are on """
+        if not self.enabled: return SimpleNamespace(**functions)
+        return SimpleNamespace(**{phase: self._timed(phase, function) for phase, function in functions.items()})
+
+    def _timed(self, phase: str, function):
+        self.times[phase] = 0.0
+        self.calls[phase] = 0
+        times, calls, clock = self.times, self.calls, time.perf_counter
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[phase] += clock() - start
+                calls[phase] += 1
+        return timed_function
+
+    def stop(self, ast) -> None:
+        """ Takes the counters of the finished search from the tree and the grid, called by `ast.finish` """
+        self.generated, self.expanded, self.duplicates = ast.generated, ast.count_expanded(), ast.duplicates
+        self.low_level_calls = self._grid.calls - self._grid_start[0]
+        self.low_level_expanded = self._grid.expanded - self._grid_start[1]
+
+    def __repr__(self) -> str:
+        lines = [
+            f"{self.generated} generated, {self.expanded} expanded, {self.duplicates} duplicates pruned",
+            f"low level: {self.low_level_calls} searches, {self.low_level_expanded} nodes expanded"
+        ]
+        for phase, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            if self.calls[phase]: lines.append(f"  {phase}: {seconds:.3f} s in {self.calls[phase]} calls")
+        return "\n".join(lines)
@@ -0,0 +1,210 @@
+import numpy as np
+from typing import Optional
+from CExtension import lightspeed # type: ignore
+
+from Primitives.map import Point
+from Primitives.node import Node
+from Primitives.solution import Solution
+from Primitives.conflict import Conflict, VertexConflict, EdgeConflict
+from Primitives.constraint import Constraint, BarrierConstraint
+
+from .mapf import MAPF
+from .utils import grid_for
+
+
+class SymmetryReasoning:
+    """
+    Recognizes rectangle and corridor conflicts, on which CBS would branch on every permutation
+    of equally good paths of the two agents, and splits them once with barrier constraints
+
+    Both kinds are sound: any pair of conflict free paths satisfies one of the two barriers,
+    and both barriers are broken by the current paths, so each child makes progress
+
+    - rectangles, corridors: number of conflicts split as rectangle and corridor ones
+    """
+
+    def __init__(self, task: MAPF, *, rectangles=True, corridors=True) -> None:
+        self.task = task
+        self.use_rectangles = rectangles
+        self.use_corridors = corridors
+        self.rectangles = 0
+        self.corridors = 0
+
+        free = task.map.cells == 0
+        padded = np.pad(free, 1)
+        self._degrees = (padded[:-2, 1:-1].astype(int) + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) * free
+        self._corridors: dict[Point, Optional[tuple[frozenset[Point], tuple[Point, Point]]]] = {}
+        self._bypasses: dict[tuple[Point, frozenset[Point]], np.ndarray] = {}
+
+    def split(self, node: Node, conflict: Conflict) -> Optional[list[Constraint]]:
+        """ Constraints for the two children of the node, `None` if the conflict is neither a rectangle nor a corridor one """
+        if self.use_rectangles:
+            constraints = self._rectangle(node, conflict)
+            if constraints is not None:
+                self.rectangles += 1
+                return constraints
+        if self.use_corridors:
+            constraints = self._corridor(node, conflict)
+            if constraints is not None:
+                self.corridors += 1
+                return constraints
+        return None
+
+    def __repr__(self) -> str:
+        return f"{self.rectangles} rectangle, {self.corridors} corridor conflicts"
+
+    def _start(self, agent_id: int) -> Point:
+        x, y = self.task.start_points[agent_id]
+        return int(x), int(y)
+
+    def _goal(self, agent_id: int) -> Point:
+        x, y = self.task.goal_points[agent_id]
+        return int(x), int(y)
+
+    def _rectangle(self, node: Node, conflict: Conflict) -> Optional[list[Constraint]]:
+        """
+        Both agents move in the same directions along both axes and reach the rectangle between
+        their starts and goals at the same time, so on time they meet wherever their paths cross in it
+
+        The agent whose start is in line with the rectangle's columns may not cross its far row on time,
+        or the other one may not cross its far column on time
+        """
+        if not isinstance(conflict, VertexConflict): return None
+
+        a1, a2 = conflict.agent_ids
+        (s1, g1), (s2, g2) = (self._start(a1), self._goal(a1)), (self._start(a2), self._goal(a2))
+        dx, dy = int(np.sign(g1[0] - s1[0])), int(np.sign(g1[1] - s1[1]))
+        if dx == 0 or dy == 0 or (dx, dy) != (np.sign(g2[0] - s2[0]), np.sign(g2[1] - s2[1])):
+            return None
+
+        def further(a: int, b: int, d: int) -> int:
+            return max(a * d, b * d) * d
+
+        def nearer(a: int, b: int, d: int) -> int:
+            return min(a * d, b * d) * d
+
+        # corners of the rectangle where the agents enter it and where they leave it
+        rs = further(s1[0], s2[0], dx), further(s1[1], s2[1], dy)
+        rg = nearer(g1[0], g2[0], dx), nearer(g1[1], g2[1], dy)
+        if (rg[0] - rs[0]) * dx < 0 or (rg[1] - rs[1]) * dy < 0: return None
+        if _manhattan(s1, rs) != _manhattan(s2, rs): return None
+
+        if s1[0] == rs[0] and s2[1] == rs[1]: first, second = a1, a2
+        elif s2[0] == rs[0] and s1[1] == rs[1]: first, second = a2, a1
+        else: return None
+
+        row = [(x, rg[1]) for x in range(rs[0], rg[0] + dx, dx)]
+        column = [(rg[0], y) for y in range(rs[1], rg[1] + dy, dy)]
+        constraints: list[Constraint] = [
+            BarrierConstraint(first, conflict.time, tuple((_manhattan(self._start(first), p), p) for p in row)),
+            BarrierConstraint(second, conflict.time, tuple((_manhattan(self._start(second), p), p) for p in column))
+        ]
+        return constraints if _broken(node, constraints) else None
+
+    def _corridor(self, node: Node, conflict: Conflict) -> Optional[list[Constraint]]:
+        """
+        Agents go through a corridor (chain of cells with two free neighbors) in opposite directions,
+        one of them has to let the other one through first
+
+        Corridor has `k` moves between its ends, `t` is the earliest time an agent can reach its exit,
+        `b` is the earliest time it can reach the exit around the corridor. Then either the first agent
+        is not at its exit in `[0, min(b1 - 1, t2 + k)]` or the second one in `[0, min(b2 - 1, t1 + k)]`
+        """
+        if isinstance(conflict, VertexConflict): cells = [conflict.point]
+        elif isinstance(conflict, EdgeConflict): cells = list(conflict.edge)
+        else: return None
+
+        cells = [(int(x), int(y)) for x, y in cells]
+        if any(self._degrees[y, x] != 2 for x, y in cells): return None
+        corridor = self._corridor_of(cells[0])
+        if corridor is None: return None
+        interior, _ = corridor
+
+        a1, a2 = conflict.agent_ids
+        traversals = [_traversal(node.solutions[a], conflict.time, interior) for a in (a1, a2)]
+        if traversals[0] is None or traversals[1] is None: return None
+        (entry, exit), (other_entry, other_exit) = traversals # type: ignore
+        if entry == exit or (entry, exit) != (other_exit, other_entry): return None
+
+        k = len(interior) + 1
+        t1, t2 = self._distance(self._start(a1), exit), self._distance(self._start(a2), entry)
+        b1 = self._distance_around(self._start(a1), exit, interior)
+        b2 = self._distance_around(self._start(a2), entry, interior)
+
+        end1, end2 = int(min(b1 - 1, t2 + k)), int(min(b2 - 1, t1 + k))
+        constraints: list[Constraint] = [
+            BarrierConstraint(a1, conflict.time, tuple((t, exit) for t in range(end1 + 1))),
+            BarrierConstraint(a2, conflict.time, tuple((t, entry) for t in range(end2 + 1)))
+        ]
+        return constraints if _broken(node, constraints) else None
+
+    def _corridor_of(self, cell: Point) -> Optional[tuple[frozenset[Point], tuple[Point, Point]]]:
+        """ Cells of the corridor through the `cell` and its two ends, `None` for a cycle """
+        if cell in self._corridors:
+            return self._corridors[cell]
+
+        interior, ends = [cell], []
+        for first in self._neighbors(cell):
+            previous, current = cell, first
+            while self._degrees[current[1], current[0]] == 2 and current != cell:
+                interior.append(current)
+                previous, current = current, next(p for p in self._neighbors(current) if p != previous)
+            ends.append(current)
+
+        corridor = None if cell in ends else (frozenset(interior), (ends[0], ends[1]))
+        for p in interior:
+            self._corridors[p] = corridor
+        return corridor
+
+    def _neighbors(self, p: Point) -> list[Point]:
+        cells = self.task.map.cells
+        height, width = cells.shape
+        candidates = [(p[0] + 1, p[1]), (p[0] - 1, p[1]), (p[0], p[1] + 1), (p[0], p[1] - 1)]
+        return [(x, y) for x, y in candidates if 0 <= x < width and 0 <= y < height and cells[y, x] == 0]
+
+    def _distance(self, s: Point, g: Point) -> float:
+        """ Shortest distance on the static map, the table is shared with the low-level heuristic """
+        if g not in self.task.distances:
+            self.task.distances[g] = grid_for(self.task).distances(g)
+        d = int(self.task.distances[g][s[1], s[0]])
+        return d if d >= 0 else np.inf
+
+    def _distance_around(self, s: Point, g: Point, interior: frozenset[Point]) -> float:
+        """ Shortest distance on the static map with the corridor blocked """
+        key = (g, interior)
+        if key not in self._bypasses:
+            blocked = self.task.map.cells.copy()
+            for x, y in interior:
+                blocked[y, x] = 1
+            self._bypasses[key] = lightspeed.distances(blocked, g)
+        d = int(self._bypasses[key][s[1], s[0]])
+        return d if d >= 0 else np.inf
+
+
+def _manhattan(p1: Point, p2: Point) -> int:
+    return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
+
+
+def _traversal(solution: Solution, time: int, interior: frozenset[Point]) -> Optional[tuple[Point, Point]]:
+    """ Cells where the agent enters the corridor it is in at the `time` and leaves it, `None` if it starts or stays there """
+    def at(t: int) -> Point:
+        x, y = solution.get_point_at(t)
+        return int(x), int(y)
+
+    before = time
+    while before >= 0 and at(before) in interior:
+        before -= 1
+    after = time
+    while after <= solution.cost and at(after) in interior:
+        after += 1
+
+    if before < 0 or after > solution.cost: return None
+    return at(before), at(after)
+
+
+def _broken(node: Node, constraints: list[Constraint]) -> bool:
+    """ Whether the current paths of the node break all the barriers, otherwise the split makes no progress """
+    return all(
+        any(node.solutions[c.agent_id].get_point_at(t) == p for t, p in c.vertices) # type: ignore
+        for c in constraints
+    )
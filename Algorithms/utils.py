@@ -1,10 +1,17 @@
+import os
+import atexit
 import numpy as np
+from typing import Iterable, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from CExtension import lightspeed # type: ignore
 
 from Primitives.map import Point
+from Primitives.mdd import MDD
 from Primitives.node import Node
 from Primitives.solution import Solution
 from Primitives.conflict import Conflict, VertexConflict, EdgeConflict
+from Primitives.constraint import Constraint, VertexConstraint, EdgeConstraint
 
 from .mapf import MAPF
 
@@ -14,96 +21,399 @@ def extract_tuple(value) -> tuple:
     return (value, None)
 
 
-def get_start_node(task: MAPF, counted_mdds=False, mdds=False) -> Node:
-    solutions = []
-    for i, (s, g) in enumerate(zip(task.start_points, task.goal_points)):
-        result = lightspeed.find_path(task.map.cells, s, g, lite_mdd=counted_mdds, full_mdd=mdds)
-        if result is None: 
-            return None # type: ignore
-        solutions.append(Solution(i, *extract_tuple(result)))
-    return Node(solutions)
+def solution_from(agent_id: int, result) -> Solution:
+    """ Solution for the agent from the `lightspeed.find_path` result """
+    path, counted_mdd, *mdd = extract_tuple(result)
+    mdd = MDD(*mdd[0]) if mdd and mdd[0] is not None else None
+    return Solution(agent_id, path, counted_mdd, mdd)
 
 
-def update_solution_for(agent_id: int, node: Node, task: MAPF, *, counted_mdd=False, mdd=False) -> bool:
-    # construct contiguous ndarrays
-    v_constraints = np.array(
-        [np.asarray(c) for c in node.vertexConstraints if c.agent_id == agent_id],
-        dtype=np.int32
-    )
-    e_constraints = np.array(
-        [np.asarray(c) for c in node.edgeConstraints if c.agent_id == agent_id],
-        dtype=np.int32
-    )
+def grid_for(task: MAPF):
+    """ `lightspeed.Grid` of the task's map, created once and cached in the task """
+    if task.grid is None:
+        task.grid = lightspeed.Grid(task.map.cells)
+    return task.grid
+
+
+def distances_to(agent_id: int, task: MAPF) -> np.ndarray:
+    """ Exact distances to the agent's goal on the static map, computed once per goal and cached in the task """
+    g = tuple(task.goal_points[agent_id])
+    if g not in task.distances:
+        task.distances[g] = grid_for(task).distances(g)
+    return task.distances[g]
+
+
+class PathCache:
+    """
+    LRU cache of `lightspeed.find_path` results (paths with their MDDs, or `None` when there is no path),
+    bounded by the number of bytes in the stored arrays
+
+    Keyed by the agent, requested MDDs and the agent's constraints in canonical order, 
+    so the same search made in different branches of the CBS tree is done once
+
+    - hits, misses: number of searches taken from the cache and made again
+    """
+
+    def __init__(self, capacity: int = 64 << 20) -> None:
+        self.capacity = capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+
+    @staticmethod
+    def key(agent_id: int, constraints: tuple[np.ndarray, ...], *flags) -> tuple:
+        """ `constraints` as returned by `Node.constraints_for` """
+        def canonical(constraints: np.ndarray) -> bytes:
+            # rows in lexicographic order
+            return constraints[np.lexsort(constraints.T[::-1])].tobytes()
+        return (agent_id, *flags, *map(canonical, constraints))
+
+    def get(self, key: tuple, default=None, accept=None):
+        """ Cached result for the `key`, `default` if there is none or if the `accept` predicate rejects it """
+        entry = self._entries.get(key)
+        if entry is None or (accept is not None and not accept(entry[0])):
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: tuple, result):
+        if key in self._entries: return
+        size = _nbytes(result) + sum(len(part) for part in key if isinstance(part, bytes))
+        if size > self.capacity: return
+
+        self._entries[key] = (result, size)
+        self.size += size
+        while self.size > self.capacity:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, hit rate {self.hit_rate():.1%}, {self.size / 1024:.0f} KiB"
+
+
+def _nbytes(result) -> int:
+    if result is None: return 0
+    if isinstance(result, np.ndarray): return result.nbytes
+    return sum(_nbytes(part) for part in result)
+
+
+def path_cache_for(task: MAPF) -> PathCache:
+    """ Cache of low level search results for the task, created once and kept in the task """
+    if task.paths is None:
+        task.paths = PathCache()
+    return task.paths # type: ignore
+
+
+class CacheUsage:
+    """
+    Hits and misses of the task's `PathCache` made by one solve, the cache itself is shared by all solves on the task
+
+    Counted from the creation to `stop`, which `SearchTreePQS.finish` calls
+
+    - hits, misses: number of searches the solve took from the cache and made again
+    - size: bytes in the cache at the end of the solve
+    """
+
+    def __init__(self, task: MAPF) -> None:
+        self.cache = path_cache_for(task)
+        self._start = self._counters()
+        self._stop: Optional[tuple[int, int, int]] = None
+
+    def _counters(self) -> tuple[int, int, int]:
+        return self.cache.hits, self.cache.misses, self.cache.size
+
+    def stop(self, ast=None) -> None:
+        self._stop = self._counters()
+
+    @property
+    def hits(self) -> int:
+        return (self._stop or self._counters())[0] - self._start[0]
+
+    @property
+    def misses(self) -> int:
+        return (self._stop or self._counters())[1] - self._start[1]
+
+    @property
+    def size(self) -> int:
+        return (self._stop or self._counters())[2]
+
+    def __repr__(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses, hit rate {rate:.1%}, {self.size / 1024:.0f} KiB"
+
+
+# threads for low-level searches, `lightspeed` releases GIL while searching
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+# keywords of `lightspeed.find_path` for the arrays of `Node.constraints_for`
+_constraint_keywords = ('v_constraints', 'e_constraints', 'p_constraints')
+
+
+def find_paths_batch(
+    task: MAPF, agent_ids: Iterable[int], constraints: Optional[dict[int, tuple]] = None, *,
+    counted_mdd=False, mdd=False
+) -> list:
+    """
+    Plans paths for many agents concurrently on a thread pool, returns `lightspeed` results in order of `agent_ids`
+
+    - constraints: optional mapping from agent id to its (vertex, edge, positive) constraint arrays,
+        as `Node.constraints_for` returns them, any of them can be `None`
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        atexit.register(_executor.shutdown)
+
+    grid = grid_for(task)
+    constraints = constraints or {}
+
+    def plan(agent_id: int, heuristic: np.ndarray):
+        arrays = constraints.get(agent_id, ())
+        kwargs = {keyword: array for keyword, array in zip(_constraint_keywords, arrays) if array is not None}
+        return grid.find_path(
+            task.start_points[agent_id], task.goal_points[agent_id], **kwargs,
+            lite_mdd=counted_mdd, full_mdd=mdd, heuristic=heuristic
+        )
+
+    # distance tables are cached in the task, fill the cache before going to other threads
+    agent_ids = list(agent_ids)
+    heuristics = [distances_to(agent_id, task) for agent_id in agent_ids]
+    return list(_executor.map(plan, agent_ids, heuristics))
+
+
+def get_start_node(task: MAPF, counted_mdds=False, mdds=False, suboptimality: Optional[float] = None) -> Node:
+    """ 
+    Root node with the shortest paths of all agents
+
+    - suboptimality: plan with focal search instead, each agent avoids conflicts with the ones planned before it
+    """
+    if suboptimality is not None:
+        solutions: list[Solution] = []
+        for agent_id in range(len(task.start_points)):
+            result = grid_for(task).find_path(
+                task.start_points[agent_id], task.goal_points[agent_id], heuristic=distances_to(agent_id, task),
+                cat=[solution.path for solution in solutions], suboptimality=suboptimality
+            )
+            if result is None: return None # type: ignore
+            path, lower_bound = result
+            solutions.append(Solution(agent_id, path, lower_bound=lower_bound))
+        return Node(solutions)
+
+    results = find_paths_batch(task, range(len(task.start_points)), counted_mdd=counted_mdds, mdd=mdds)
+    if any(result is None for result in results):
+        return None # type: ignore
+    return Node([solution_from(i, result) for i, result in enumerate(results)])
+
+
+def update_solution_for(
+    agent_id: int, node: Node, task: MAPF, *, counted_mdd=False, mdd=False, avoid_conflicts=False,
+    suboptimality: Optional[float] = None
+) -> bool:
+    """
+    Replans the agent under the node's constraints
+
+    - avoid_conflicts: among the shortest paths choose the one with the fewest conflicts 
+        with the other agents' current paths, the search depends on those paths, so a cached result
+        of the same search without them is taken only if its path has no conflicts with them
+    - suboptimality: focal search, the path may be up to this many times longer than the shortest one,
+        prefers fewer conflicts with the other agents' paths if `avoid_conflicts` is set,
+        focal searches avoiding conflicts are not cached
+    """
+    v_constraints, e_constraints, p_constraints = node.constraints_for(agent_id)
 
     s = task.start_points[agent_id]
     g = task.goal_points[agent_id]
 
-    # find path
-    result = lightspeed.find_path(
-        task.map.cells, s, g, 
-        v_constraints=v_constraints, e_constraints=e_constraints,
-        lite_mdd=counted_mdd, full_mdd=mdd
-    )
+    cat = None
+    if avoid_conflicts:
+        cat = [solution.path for solution in node.solutions if solution.agent_id != agent_id]
+
+    # find path, unless the same search was already made
+    cache = path_cache_for(task)
+    key = PathCache.key(agent_id, (v_constraints, e_constraints, p_constraints), counted_mdd, mdd, suboptimality)
+    cached = cat is None or suboptimality is None
+    accept = None if cat is None else lambda result: result is None or not _has_conflicts(node, agent_id, result)
+    result = cache.get(key, default=key, accept=accept) if cached else key
+    if result is key:
+        focal = {} if suboptimality is None else dict(suboptimality=suboptimality)
+        result = grid_for(task).find_path(
+            s, g, 
+            v_constraints=v_constraints, e_constraints=e_constraints, p_constraints=p_constraints,
+            lite_mdd=counted_mdd, full_mdd=mdd, heuristic=distances_to(agent_id, task), cat=cat, **focal
+        )
+        # avoiding conflicts only picks one of the shortest paths, their MDDs are the same
+        if cached: cache.put(key, result)
 
     if result is None: return False
 
+    if suboptimality is None:
+        solution = solution_from(agent_id, result)
+    else:
+        path, lower_bound = result
+        # constraints of the agent only grow, so the bound of its previous path holds too
+        solution = Solution(agent_id, path, lower_bound=max(lower_bound, node.solutions[agent_id].lower_bound))
+
     # update solution
-    node.update_solution_for(agent_id, Solution(agent_id, *extract_tuple(result)))
+    node.update_solution_for(agent_id, solution)
 
     return True
 
 
-def simulate(node: Node) -> list[Conflict]:
-    """ Given a node with solutions, simulates them to find conflicts """
+def _has_conflicts(node: Node, agent_id: int, result) -> bool:
+    """ Whether the path of the `lightspeed` result conflicts with the paths of the other agents in the node """
+    paths = [solution.path for solution in node.solutions]
+    paths[agent_id] = extract_tuple(result)[0]
+    return bool(lightspeed.conflicts_of(paths, agent_id))
+
+
+def replan(node: Node, task: MAPF, **options) -> bool:
+    """
+    Replans the agents the node's own constraint applies to, `options` are the ones of `update_solution_for`:
+    the constrained agent and, for a positive constraint, every other agent whose path breaks it
+
+    Returns `False` if some of them have no path
+    """
+    constraint: Constraint = node.constraint # type: ignore
+    agents = [constraint.agent_id]
+    if constraint.positive:
+        agents += [
+            solution.agent_id for solution in node.solutions if solution.agent_id != constraint.agent_id
+            and any(_breaks(solution, implied) for implied in constraint.implied_for(solution.agent_id))
+        ]
+    return all(update_solution_for(agent_id, node, task, **options) for agent_id in agents)
+
+
+def _breaks(solution: Solution, constraint: Constraint) -> bool:
+    """ Whether the solution breaks the negative constraint """
+    if isinstance(constraint, VertexConstraint):
+        return solution.get_point_at(constraint.time) == constraint.point
+    if isinstance(constraint, EdgeConstraint):
+        move = {solution.get_point_at(constraint.time), solution.get_point_at(constraint.time + 1)}
+        return move == set(constraint.edge)
+    raise TypeError("Unexpected Constraint type")
+
+
+def count_conflicts(node: Node) -> int:
+    """ Number of conflicting time steps over all pairs of agents in the node """
+    return sum(map(len, conflict_table(node).values()))
+
+
+def conflicts_at(node: Node, time: int, agents: Optional[Iterable[int]] = None) -> list[Conflict]:
+    """ 
+    All conflicts between the agents at the `time`, edge conflicts are for moves from `time - 1` 
+    
+    - agents: ids of agents to look at in increasing order, default is all of them
+    """
+    solutions = node.solutions if agents is None else [node.solutions[i] for i in agents]
     conflicts: list[Conflict] = []
 
-    time = 0
     last_step: dict[Point, list[int]] = {}
+    if time > 0:
+        for solution in solutions:
+            last_step.setdefault(solution.get_point_at(time - 1), []).append(solution.agent_id)
+
     current_step: dict[Point, list[int]] = {}
-    for time in range(node.time + 1):
-        for solution in node.solutions:
-            v = solution.get_point_at(time)
-            if v in current_step:  # someone in there already
-                for other_id in current_step[v]:
-                    vc = VertexConflict((solution.agent_id, other_id), time, v)
-                    conflicts.append(vc)
-                    
-                current_step[v].append(solution.agent_id)
-            else: 
-                current_step[v] = [solution.agent_id]
-
-            if v in last_step:  # someone was there on the previous step
-                # can't have more than one agent at the same point by now
-                assert len(last_step[v]) == 1
-
-                other_id = last_step[v][0]
-                if solution.agent_id == other_id:  # same agent just stayed at this point
-                    continue
-
-                previous_point = solution.get_point_at(time - 1)
-                # TODO: whacky, fix later
-                other_current_point = node.solutions[other_id].get_point_at(time)
-                assert node.solutions[other_id].agent_id == other_id
-                if other_current_point == previous_point:
-                    # some agent was at this point at previous step
-                    # and he is now at our previous point
-                    # this means we have an edge conflict
-                    ec = EdgeConflict(
-                        (solution.agent_id, other_id), time - 1, tuple(sorted((previous_point, v)))
-                    )
-                    conflicts.append(ec)
-                    # remove current point of the agent we are 
-                    # conflicting with to avoid duplicate conflicts
-                    last_step.pop(other_current_point)
-
-        if conflicts: return conflicts
-
-        last_step = current_step
-        current_step = {}
+    swapped: set[tuple[int, int]] = set()
+    for solution in solutions:
+        v = solution.get_point_at(time)
+        if v in current_step:  # someone in there already
+            for other_id in current_step[v]:
+                vc = VertexConflict((solution.agent_id, other_id), time, v)
+                conflicts.append(vc)
+                
+            current_step[v].append(solution.agent_id)
+        else: 
+            current_step[v] = [solution.agent_id]
+
+        # someone was there on the previous step
+        for other_id in last_step.get(v, ()):
+            if solution.agent_id == other_id:  # same agent just stayed at this point
+                continue
+            if (other_id, solution.agent_id) in swapped:  # found this conflict from the other side
+                continue
+
+            previous_point = solution.get_point_at(time - 1)
+            other_current_point = node.solutions[other_id].get_point_at(time)
+            assert node.solutions[other_id].agent_id == other_id
+            if other_current_point == previous_point:
+                # some agent was at this point at previous step
+                # and he is now at our previous point
+                # this means we have an edge conflict
+                ec = EdgeConflict(
+                    (solution.agent_id, other_id), time - 1, (previous_point, v)
+                )
+                conflicts.append(ec)
+                swapped.add((solution.agent_id, other_id))
 
     return conflicts
 
 
+def conflict_table(node: Node) -> dict[tuple[int, int], list[int]]:
+    """
+    Fills `node.conflict_table` and returns it
+
+    The first table is computed for all pairs of agents, every other one is taken from 
+    the parent's table by checking only the replanned agents against the rest
+    """
+    if node.conflict_table is not None and not node.replanned:
+        return node.conflict_table
+
+    paths = [solution.path for solution in node.solutions]
+    if node.conflict_table is None:
+        agents, table = range(len(paths)), {}
+    else:
+        agents = sorted(node.replanned)
+        table = {
+            pair: times for pair, times in node.conflict_table.items()
+            if pair[0] not in node.replanned and pair[1] not in node.replanned
+        }
+
+    checked = set()
+    for agent in agents:
+        checked.add(agent)
+        for other, time in lightspeed.conflicts_of(paths, agent):
+            if other in checked: continue # the pair is already there
+            table.setdefault((min(agent, other), max(agent, other)), []).append(time)
+
+    node.conflict_table = table
+    node.replanned = set()
+    return table
+
+
+def simulate(node: Node, *, all_conflicts=False) -> list[Conflict]:
+    """
+    Given a node with solutions, finds conflicts between them
+
+    Times of conflicts are taken from the node's conflict table, 
+    conflict objects are made only for those times and agents
+
+    - all_conflicts: if `True` returns conflicts at every time, 
+        otherwise only the ones at the earliest time with any conflict
+    """
+    table = conflict_table(node)
+    if not table: return []
+
+    if all_conflicts:
+        involved: dict[int, set[int]] = {}
+        for pair, times in table.items():
+            for time in times:
+                involved.setdefault(time, set()).update(pair)
+    else:
+        first = min(times[0] for times in table.values())
+        involved = {first: {agent for pair, times in table.items() if times[0] == first for agent in pair}}
+
+    return [conflict for time in sorted(involved) for conflict in conflicts_at(node, time, sorted(involved[time]))]
+
+
 def validate(task: MAPF) -> bool:
     if len(task.start_points) != len(task.goal_points):
         return False
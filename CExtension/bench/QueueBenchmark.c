@@ -0,0 +1,146 @@
+// Micro-benchmark of the binary heap `PriorityQueue` against the sorted array queue it replaced
+//
+// Build and run from the project root:
+//     cc -O2 -ICExtension/include CExtension/bench/QueueBenchmark.c CExtension/src/PriorityQueue.c -o queue_bench
+//     ./queue_bench [number of nodes]
+//
+// Workload imitates the open list of the low-level `A*`: every iteration draws the best node
+// and pushes up to 4 successors with equal or slightly bigger `f`, so the queue keeps growing
+
+#include "PriorityQueue.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+typedef struct {
+    int x, y;
+    int g, f;
+    void *parent;
+} BenchNode;
+
+static int highestG(const void *p1, const void *p2) {
+    BenchNode *node1 = (BenchNode*)p1, *node2 = (BenchNode*)p2;
+    int df = node2->f - node1->f;
+    if (df != 0) return df;
+    return node1->g - node2->g;
+}
+
+// ---------------- the old sorted array queue, kept here for comparison ----------------
+
+typedef struct {
+    void* nodes;
+    size_t width;
+    size_t size;
+    size_t capacity;
+    CompareFunction cmp;
+} SortedQueue;
+
+#define getElem(q, i) (char*)q->nodes + q->width * (i)
+
+static SortedQueue *newSortedQueue(size_t width, size_t capacity, CompareFunction cmp) {
+    SortedQueue *q = malloc(sizeof(SortedQueue));
+    q->nodes = calloc(capacity, width);
+    q->capacity = capacity;
+    q->width = width;
+    q->size = 0;
+    q->cmp = cmp;
+    return q;
+}
+
+static bool sortedDequeue(SortedQueue *q, void *storage) {
+    if (q->size == 0) return false;
+    q->size--;
+    memcpy(storage, getElem(q, q->size), q->width);
+    return true;
+}
+
+static int binarySearch(SortedQueue *q, const void *target) {
+    int a = 0, b = (int)q->size, m;
+    do {
+        m = (a + b) / 2;
+        int cmp = q->cmp(getElem(q, m), target);
+        if (cmp < 0) a = m + 1;
+        else if (cmp > 0) b = m;
+        else break;
+        m = a;
+    } while (a != b);
+    while (m < b && q->cmp(getElem(q, m), target) == 0) ++m;
+    return m;
+}
+
+static void sortedEnqueue(SortedQueue *q, const void *node) {
+    if (q->size == q->capacity) {
+        q->nodes = realloc(q->nodes, q->width * q->capacity * 2);
+        q->capacity *= 2;
+    }
+    if (q->size == 0) {
+        memcpy(getElem(q, q->size), node, q->width);
+        q->size++;
+        return;
+    }
+    int paste = binarySearch(q, node);
+    memmove(getElem(q, paste + 1), getElem(q, paste), q->width * (q->size - paste));
+    memcpy(getElem(q, paste), node, q->width);
+    q->size++;
+}
+
+static void deleteSortedQueue(SortedQueue *q) {
+    free(q->nodes);
+    free(q);
+}
+
+// ---------------------------------------------------------------------------------------
+
+static BenchNode successor(BenchNode *node, int i) {
+    // moving away from the goal increases `f` by 2, moving towards it keeps `f` the same
+    BenchNode next = {node->x + i, node->y - i, node->g + 1, node->f + 2 * (rand() % 2)};
+    return next;
+}
+
+static double runHeap(int total) {
+    srand(42);
+    clock_t start = clock();
+    PriorityQueue *q = newQueue(sizeof(BenchNode), 64, highestG);
+    BenchNode node = {0};
+    enqueue(q, &node);
+    for (int pushed = 1; pushed < total && dequeue(q, &node);) {
+        for (int i = 0; i < 4; ++i, ++pushed) {
+            BenchNode next = successor(&node, i);
+            enqueue(q, &next);
+        }
+    }
+    while (dequeue(q, &node));
+    deleteQueue(q);
+    return (double)(clock() - start) / CLOCKS_PER_SEC;
+}
+
+static double runSorted(int total) {
+    srand(42);
+    clock_t start = clock();
+    SortedQueue *q = newSortedQueue(sizeof(BenchNode), 64, highestG);
+    BenchNode node = {0};
+    sortedEnqueue(q, &node);
+    for (int pushed = 1; pushed < total && sortedDequeue(q, &node);) {
+        for (int i = 0; i < 4; ++i, ++pushed) {
+            BenchNode next = successor(&node, i);
+            sortedEnqueue(q, &next);
+        }
+    }
+    while (sortedDequeue(q, &node));
+    deleteSortedQueue(q);
+    return (double)(clock() - start) / CLOCKS_PER_SEC;
+}
+
+int main(int argc, char **argv) {
+    int total = argc > 1 ? atoi(argv[1]) : 0;
+    int sizes[] = {10000, 100000, 500000};
+    int count = total > 0 ? 1 : sizeof(sizes) / sizeof(int);
+    if (total > 0) sizes[0] = total;
+
+    printf("%12s %14s %14s\n", "nodes", "sorted array", "binary heap");
+    for (int i = 0; i < count; ++i)
+        printf("%12d %13.4fs %13.4fs\n", sizes[i], runSorted(sizes[i]), runHeap(sizes[i]));
+    return 0;
+}
@@ -2,12 +2,67 @@
 #define Algorithm_h
 
 #include "Node.h"
+#include "NodeSet.h"
+#include "Allocator.h"
+#include "PriorityQueue.h"
 #include <stdbool.h>
 
-bool findPath(Map *map, Point s, Point g, Node *found);
+/** Memory used by the searches, reused from one search to another to avoid allocating it every time
+ Nodes of the found path live in the `allocator`, so they are valid only until the next search
+ Create only using `newWorkspace` function, when created, must be deleted with `deleteWorkspace`
+ */
+typedef struct {
+    Allocator *allocator;
+    PriorityQueue *open;    // of `Node`s, created by the first `findPath`
+    PriorityQueue *mddOpen; // of `MddNode`s, created by the first `findAllPaths`
+    PriorityQueue *focal[3]; // open, focal and the rest of open of `Node*`s, created by the first `findFocalPath`
+    NodeSet closed;
+    NodeSet layers[2];      // for building MDD layer by layer
+    ConstraintIndex index;  // constraints of the current search
+    ConflictAvoidanceTable cat; // paths of other agents for the current search, if any
+    PriorityQueue *lastOpen; // open queue of the last search
+    int expectedOpenSize;
+} Workspace;
+
+/** What a search did, to tune the heuristics and size the maps
+ Counters are filled by `getSearchStats`, the times by the caller, the searches don't measure them
+ */
+typedef struct {
+    long long expanded;  // nodes taken from open and expanded
+    long long generated; // nodes put to open
+    long long maxOpen;   // the most nodes open had at once, duplicates waiting to be skipped included
+    long long bytes;     // memory taken from the allocator for the nodes
+    long long chunks;    // chunks held by the allocator of the workspace
+    double searchTime;   // seconds spent in the search
+    double mddTime;      // seconds spent building MDDs from the nodes of the search
+} SearchStats;
+
+/// Creates workspace suitable for searches on the map with the given dimensions
+Workspace *newWorkspace(int width, int height);
+
+void deleteWorkspace(Workspace *w);
+
+/// fills the counters of `stats` for the last search made with the workspace, leaves the times as they are
+void getSearchStats(Workspace *w, SearchStats *stats);
+
+bool findPath(Map *map, Workspace *w, Point s, Point g, Node *found);
+
+/// focal search, from the nodes with `f` at most `suboptimality` times the least `f` in open
+/// expands the one with the fewest conflicts with the conflict avoidance table of the map first,
+/// so the found path is at most `suboptimality` times longer than the shortest one
+/// `lowerBound` gets the least `f` in open at the end, which is a lower bound on the shortest path length
+bool findFocalPath(Map *map, Workspace *w, Point s, Point g, double suboptimality, Node *found, int *lowerBound);
     
 // bool testPath(Map *map, Point s, Point g);
 
-bool findAllPaths(Map *map, Point s, Point g, MddNode *found);
+/// finds all shortest paths, `found` is the goal node, its parents lead to all of them
+/// without `allWaits` agents wait only next to constraints and at the goal, as in `findPath`,
+/// which is faster, but leaves out the paths waiting elsewhere
+bool findAllPaths(Map *map, Workspace *w, Point s, Point g, bool allWaits, MddNode *found);
+
+/// fills `distances` (row major, `width * height` ints) with the length of the shortest path
+/// from each cell to `g` on the static map (constraints are ignored),
+/// walls and cells from which `g` can't be reached get `-1`
+void fillDistances(Map *map, Point g, int *distances);
 
 #endif /* Algorithm_h */
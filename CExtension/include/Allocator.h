@@ -27,6 +27,16 @@ Allocator *newAllocator(size_t chunkSize, size_t expectedChunkCount);
 /// Returns a pointer at the start of the allocated region
 void *allocate(Allocator *a, size_t size);
 
+/// Makes all allocated space available again without freeing the chunks
+/// every pointer previously returned by `allocate` becomes invalid
+void resetAllocator(Allocator *a);
+
+/// Bytes allocated since the last reset, with the unused ends of the chunks skipped on the way
+size_t allocatedBytes(Allocator *a);
+
+/// Number of chunks the allocator holds, kept from reset to reset
+int countChunks(Allocator *a);
+
 ///Remove the allocator and free all allocated space
 void deleteAllocator(Allocator *a);
 
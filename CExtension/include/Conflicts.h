@@ -0,0 +1,37 @@
+#ifndef Conflicts_h
+#define Conflicts_h
+
+#include "Map.h"
+
+#include <stdbool.h>
+
+/** Paths of all agents in a solution, agent `i` goes through `lengths[i]` points from `paths[i]`
+ After the end of its path an agent waits at the last point forever
+ */
+typedef struct {
+    int count;
+    const Point *const *paths;
+    const int *lengths;
+} Paths;
+
+/// Longest path length, that is how many time steps the solution takes
+int countTimeSteps(const Paths *paths);
+
+/// Finds times when two agents are in the same point (vertex conflict)
+/// or when they swap their points (edge conflict at the time of arrival)
+/// writes them to `times` in increasing order, `times` must have place for `countTimeSteps(paths)` of them
+/// if `all` is `false` stops at the earliest conflict
+/// returns number of written times
+int findConflictTimes(const Paths *paths, bool all, int *times);
+
+/// Conflict of some agent with the `other` one at the `time`
+typedef struct {
+    int other;
+    int time;
+} AgentConflict;
+
+/// Appends to `found` (array of `AgentConflict`) all conflicts of the `agent` with every other agent
+/// with the same time convention as `findConflictTimes`, ordered by the other agent and then by time
+void findConflictsOf(const Paths *paths, int agent, Array *found);
+
+#endif /* Conflicts_h */
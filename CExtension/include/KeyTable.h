@@ -0,0 +1,31 @@
+#ifndef KeyTable_h
+#define KeyTable_h
+
+#include <stddef.h>
+#include <stdbool.h>
+
+/** Open addressing hash table from non negative integer keys to int values
+ Grows twice when more than half of the slots are taken
+ Do not interact with fields directly, only use through the functions below
+ */
+typedef struct {
+    long long *keys;
+    int *values;
+    int capacity;
+    int count;
+} KeyTable;
+
+void initKeyTable(KeyTable *atPointer, size_t expectedCount);
+
+/// Sets `value` for the `key`, replacing the old one if the key is already there
+void putKey(KeyTable *table, long long key, int value);
+
+bool hasKey(KeyTable *table, long long key);
+
+/// Returns value stored for the `key`, or `missing` if there is no such key
+int getValue(KeyTable *table, long long key, int missing);
+
+void clearKeyTable(KeyTable *table);
+void deinitKeyTable(KeyTable *table);
+
+#endif /* KeyTable_h */
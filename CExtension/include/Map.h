@@ -2,6 +2,7 @@
 #define Map_h
 
 #include "Array.h"
+#include "KeyTable.h"
 
 typedef struct {
     int x, y;
@@ -29,11 +30,47 @@ typedef struct {
     Edge e;
 } EConstraint;
 
+/** Constraints of the map hashed by time and place, so each check in `getNeighbors` takes constant time
+ Built once per search by `indexConstraints`, the memory is kept from one build to another
+ */
+typedef struct {
+    KeyTable vertices;  // (time, cell)
+    KeyTable edges;     // (time, cell, direction) of an edge, from its lesser end
+    KeyTable lastTimes; // cell -> the last time when it is constrained
+    KeyTable lastMoves; // cell -> the last time when a move from it to a neighbor is constrained
+    KeyTable positives; // time -> cell where the agent must be at that time
+    KeyTable parked;    // cell -> time from which it is taken forever
+    int lastTime;       // the last time when any move is constrained, `-1` if there are no constraints
+    int lastPositive;   // the last time with a positive constraint, `-1` if there are none
+} ConstraintIndex;
+
+void initConstraintIndex(ConstraintIndex *index);
+void deinitConstraintIndex(ConstraintIndex *index);
+
+/** Conflict avoidance table, where other agents are at each time, used to break ties between equal paths
+ Agents stay at the last points of their paths forever
+ */
+typedef struct {
+    KeyTable occupied; // (time, cell) -> number of agents there before the ends of their paths
+    KeyTable parked;   // cell -> time from which some agent stays there
+} ConflictAvoidanceTable;
+
+void initConflictAvoidanceTable(ConflictAvoidanceTable *cat);
+void clearConflictAvoidanceTable(ConflictAvoidanceTable *cat);
+void deinitConflictAvoidanceTable(ConflictAvoidanceTable *cat);
+
 typedef struct {
     int width, height;
     Array *vConstraints;
     Array *eConstraints;
+    Array *pConstraints;
+    Array *parked;
+    bool sorted; // constraint arrays are sorted, done on the first check without an index
+    ConstraintIndex *index;
+    ConflictAvoidanceTable *cat;
     const char *data;
+    const int *distances;
+    unsigned char *moves;
 } Map;
 
 /// creates map with given `width` and `height`
@@ -48,15 +85,58 @@ Map *newMapWithConstraints(int width, int height,
                            Array *edgeConstraints,
                            const char *rawBuffer);
 
+/// replaces constraints of the map, any of them can be `NULL`
+/// arrays are not copied, so they must outlive their use in the map,
+/// they are sorted in place if the map checks constraints without an index
+/// map stops using its constraint index, if it had one
+void setConstraints(Map *map, Array *vertexConstraints, Array *edgeConstraints);
+
+/// fills `index` with the current constraints of the map, from now on map checks constraints only with it
+/// without an index constraints are checked with binary search in the sorted arrays
+void indexConstraints(Map *map, ConstraintIndex *index);
+
+/// precomputes in which directions agent can move from each cell,
+/// so `getNeighbors` doesn't check bounds and walls, worth it if the map is reused for many searches
+void precomputeMoves(Map *map);
+
+/// makes `A*` use exact distances to the goal instead of manhattan distance
+/// `distances` is a row major array of `width * height` ints, like the one `fillDistances` produces,
+/// it is not copied, so it must outlive the map
+void setDistances(Map *map, const int *distances);
+
+/// replaces positive constraints of the map, `VConstraint`s the agent must satisfy: 
+/// be at the point `p` at the `time`, can be `NULL`, it is not copied, so it must outlive the map
+/// and is sorted in place like the other constraints
+void setPositiveConstraints(Map *map, Array *positiveConstraints);
+
+/// replaces cells taken by other agents which stay there forever, `VConstraint`s with the `time`
+/// from which the point `p` is taken, can be `NULL`, it is not copied, so it must outlive the map
+void setParkedAgents(Map *map, Array *parked);
+
+/// makes searches prefer paths with fewer conflicts with the paths in `cat` among the equally short ones,
+/// `NULL` to stop, `cat` is not copied
+void setConflictAvoidanceTable(Map *map, ConflictAvoidanceTable *cat);
+
+/// adds the path of one more agent to the `cat` of the `map`, path has `length` points
+void addToConflictAvoidanceTable(Map *map, const Point *path, int length);
+
+/// number of agents from the conflict avoidance table of the map at point `p` at `time`, `0` without the table
+int countConflicts(Map *map, int time, Point p);
+
 /// find neighbors to the point `p` at `time` on the 4-connected grid
 /// returns the amount of neighbors it found, max is 5 (4 directoins + stay put),
 /// found neighbors positions are stored in `storage`
 int getNeighbors(Map *map, int time, Point p, bool isGoal, Point storage[5]);
 
-/// returns the last time when point `g` is constraint
+/// the last time when any move is constrained, `-1` if there are no constraints,
+/// after it the map doesn't change, so an agent at the same point later is in the same situation
+int getLastConstrainedTime(Map *map);
+
+/// returns the last time when point `g` is constraint, `INT_MAX` if another agent is parked there
 /// if `g` is not constrainded at any time, returns `-1`
 /// this is so A* algorithm *would not exit when found goal node
 /// if it is constrained later in the future
+/// positive constraints at other points count too, the agent can't finish before it visits them
 int getGoalTimeBoundary(Map *map, Point g);
 
 void deleteMap(Map *map);
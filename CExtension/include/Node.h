@@ -6,6 +6,7 @@
 typedef struct Node {
     Point p;
     int g, f;
+    int conflicts; // with the conflict avoidance table of the map on the way here
     struct Node* parent;
 } Node;
 
@@ -18,6 +19,7 @@ int nodePtrCmp(const void *p1, const void *p2);
 typedef struct MddNode {
     Point p;
     int g, f;
+    int conflicts; // fewest conflicts on the way here, `-1` until counted
     struct MddNode *parents[5];
 } MddNode;
 
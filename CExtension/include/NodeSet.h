@@ -0,0 +1,45 @@
+#ifndef NodeSet_h
+#define NodeSet_h
+
+#include "Node.h"
+
+#include <stddef.h>
+#include <stdbool.h>
+
+/** Open addressing hash set of pointers to search nodes, keyed by position and time `(x, y, g)`
+ Works with `Node` and `MddNode` alike, because they have the same head
+ Grows twice when more than half of the slots are taken, so initial capacity is only a hint
+ Do not interact with fields directly, only use through the functions below
+ */
+typedef struct {
+    Node **slots;
+    int capacity;
+    int count;
+    int lastTime; // nodes at the same position after it are the same node, `INT_MAX` to keep all times apart
+} NodeSet;
+
+void initNodeSet(NodeSet *atPointer, size_t expectedCount);
+NodeSet *newNodeSet(size_t expectedCount);
+
+int countNodeSet(NodeSet *set);
+
+/// Insert pointer to the `node` into the set
+/// returns `false` if there is already a node with the same position and time, the set is not changed then
+bool addToNodeSet(NodeSet *set, Node *node);
+
+/// Returns stored node with the same position and time as `node` has, `NULL` if there is no such node
+Node *searchNodeSet(NodeSet *set, const Node *node);
+
+/// Calls `withMapping` with an address of each stored pointer, so it gets `Node**` as the element
+void mapNodeSet(NodeSet *set, MapFunction withMapping, void *usingAdditionalData);
+
+/// From now on nodes at the same position later than `time` are the same node,
+/// for searches where nothing changes after `time`, so the search space is finite
+/// must be called on an empty set, `clearNodeSet` keeps all times apart again
+void mergeTimesAfter(NodeSet *set, int time);
+void clearNodeSet(NodeSet *set);
+
+void deinitNodeSet(NodeSet *set);
+void deleteNodeSet(NodeSet *set);
+
+#endif /* NodeSet_h */
@@ -6,15 +6,20 @@
 #include <stddef.h>
 #include <stdbool.h>
 
-/** Stores the element in the order defined by cmp function
+/** Binary heap, stores the elements in the order defined by cmp function
+ Elements with equal priorities are drawn in the reverse order of insertion (the last inserted goes first)
  Do not interact with fields directly, only use through the functions below
  Create only using `newQueue` function, when created, must be deleted with `deleteQueue`
  */
 typedef struct {
     void* nodes;
+    size_t *stamps;
+    void *hole;
     size_t width;
     size_t size;
     size_t capacity;
+    size_t inserted;
+    size_t peak; // the largest size since the queue was created or cleared
     CompareFunction cmp;
 } PriorityQueue;
 
@@ -29,9 +34,22 @@ PriorityQueue *newQueue(size_t width, size_t capacity, CompareFunction priorityC
 /// `storage` cannot be `NULL` and must have sufficient space
 bool dequeue(PriorityQueue *q, void *storage);
 
+/// Copy element with the HIGHEST priority to `storage` without removing it from the `q`
+/// returns `false` if the queue is empty
+bool peek(PriorityQueue *q, void *storage);
+
 /// Insert element pointed by `node` in the queue
 void enqueue(PriorityQueue *q, const void *node);
 
+/// Number of elements inserted since the queue was created or cleared
+size_t countInserted(PriorityQueue *q);
+
+/// The most elements the queue had at once since it was created or cleared
+size_t peakSize(PriorityQueue *q);
+
+/// Removes all elements from the queue, keeping the allocated space
+void clearQueue(PriorityQueue *q);
+
 /// Deleted the queue and frees all allocated space
 void deleteQueue(PriorityQueue *q);
 
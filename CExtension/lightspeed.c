@@ -1,72 +1,159 @@
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <structmember.h>
 
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
 #include <numpy/arrayobject.h>
 
-#include "Set.h"
 #include "Map.h"
-#include "Allocator.h"
 #include "Algorithm.h"
+#include "Conflicts.h"
 
-#define NUM_BUCKETS 317
+#include <time.h>
 
 // / Uncomment if you want to debug `A*`
 // #define DebugMode
 
+/// sums of the stats of all searches made by the module since the last `reset_stats`,
+/// except for `maxOpen` and `chunks`, which are the largest ones, changed only with GIL held
+static SearchStats totals;
+static long long totalSearches;
 
-extern Allocator *a;
+static double now(void) {
+    struct timespec t;
+    timespec_get(&t, TIME_UTC);
+    return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+static void addToTotals(const SearchStats *stats) {
+    totalSearches++;
+    totals.expanded += stats->expanded;
+    totals.generated += stats->generated;
+    if (stats->maxOpen > totals.maxOpen) totals.maxOpen = stats->maxOpen;
+    totals.bytes += stats->bytes;
+    if (stats->chunks > totals.chunks) totals.chunks = stats->chunks;
+    totals.searchTime += stats->searchTime;
+    totals.mddTime += stats->mddTime;
+}
+
+static PyObject *statsToDict(const SearchStats *stats) {
+    return Py_BuildValue(
+        "{s:L,s:L,s:L,s:L,s:L,s:d,s:d}",
+        "expanded", stats->expanded, "generated", stats->generated, "max_open", stats->maxOpen,
+        "bytes", stats->bytes, "chunks", stats->chunks, "search_time", stats->searchTime, "mdd_time", stats->mddTime
+    );
+}
+
+/// `result` of a search, paired with its stats if they are `wanted`, steals the reference to `result`
+static PyObject *withStats(PyObject *result, const SearchStats *stats, bool wanted) {
+    if (!result || !wanted) return result;
+    return Py_BuildValue("(NN)", result, statsToDict(stats));
+}
 
-static Map *setupConstraints(PyArrayObject *grid, PyArrayObject *vConstraints, PyArrayObject *eConstraints) {
+
+/// wraps constraints from numpy arrays converted by `toConstraintRows` into `storage` and sets them to the `map`
+static void setupConstraints(Map *map, Array storage[4], 
+                             PyArrayObject *vConstraints, PyArrayObject *eConstraints, PyArrayObject *pConstraints,
+                             PyArrayObject *parked) {
     int vConstraintsCount = 0;
     if (vConstraints) vConstraintsCount = (int)PyArray_DIM(vConstraints, 0);
 
     int eConstraintsCount = 0;
     if (eConstraints) eConstraintsCount = (int)PyArray_DIM(eConstraints, 0);
 
-    int w = (int)PyArray_DIM(grid, 1);
-    int h = (int)PyArray_DIM(grid, 0);
-    char *mapBytes = PyArray_BYTES(grid);
-
-    if (vConstraintsCount > 0 || eConstraintsCount > 0) {
-        Array constraints[2] = {0};
-        Array *vc = NULL, *ec = NULL;
-        if (vConstraintsCount > 0) {
-            initArrayWithBuffer(constraints, sizeof(VConstraint), PyArray_DATA(vConstraints), vConstraintsCount);
-            vc = constraints;
-        }
-        if (eConstraintsCount > 0)  {
-            initArrayWithBuffer(constraints + 1, sizeof(EConstraint), PyArray_DATA(eConstraints), eConstraintsCount);
-            ec = constraints + 1;
-        }
-        return newMapWithConstraints(w, h, vc, ec, mapBytes);
+    int pConstraintsCount = 0;
+    if (pConstraints) pConstraintsCount = (int)PyArray_DIM(pConstraints, 0);
+
+    int parkedCount = 0;
+    if (parked) parkedCount = (int)PyArray_DIM(parked, 0);
+
+    Array *vc = NULL, *ec = NULL, *pc = NULL, *pa = NULL;
+    if (vConstraintsCount > 0) {
+        initArrayWithBuffer(storage, sizeof(VConstraint), PyArray_DATA(vConstraints), vConstraintsCount);
+        vc = storage;
     }
-    return newMap(w, h, mapBytes);
+    if (eConstraintsCount > 0)  {
+        initArrayWithBuffer(storage + 1, sizeof(EConstraint), PyArray_DATA(eConstraints), eConstraintsCount);
+        ec = storage + 1;
+    }
+    if (pConstraintsCount > 0)  {
+        initArrayWithBuffer(storage + 2, sizeof(VConstraint), PyArray_DATA(pConstraints), pConstraintsCount);
+        pc = storage + 2;
+    }
+    if (parkedCount > 0) {
+        initArrayWithBuffer(storage + 3, sizeof(VConstraint), PyArray_DATA(parked), parkedCount);
+        pa = storage + 3;
+    }
+    setConstraints(map, vc, ec);
+    setPositiveConstraints(map, pc);
+    setParkedAgents(map, pa);
 }
 
-static void logConstraints(PyArrayObject *vConstraints, PyArrayObject *eConstraints) {
-    int vConstraintsCount = 0;
-    if (vConstraints) vConstraintsCount = (int)PyArray_DIM(vConstraints, 0);
+/// replaces `*rows`, if given, with a new reference to a C contiguous array of int rows of `layout`,
+/// which is the same array if it is one already, the caller releases it after the search
+/// on failure sets python exception, `*rows` becomes `NULL` and `false` is returned
+static bool toRows(PyArrayObject **rows, int columns, const char *name, const char *layout) {
+    if (!*rows) return true;
+    PyArrayObject *array = (PyArrayObject*)PyArray_FROMANY(
+        (PyObject*)*rows, NPY_INT, 2, 2, NPY_ARRAY_IN_ARRAY | NPY_ARRAY_FORCECAST
+    );
+    if (array && PyArray_DIM(array, 1) != columns) {
+        PyErr_Format(PyExc_ValueError, "%s must be an array of rows %s", name, layout);
+        Py_CLEAR(array);
+    }
+    *rows = array;
+    return array != NULL;
+}
 
-    int eConstraintsCount = 0;
-    if (eConstraints) eConstraintsCount = (int)PyArray_DIM(eConstraints, 0);
-    
-    printf("VertexConstraints: len = %d ", vConstraintsCount);
-    puts("in format: t, (x, y)");
+/// converts all constraint arrays of a search with `toRows`, so their memory can be read as constraint structs,
+/// release them with `releaseConstraintRows` after the search
+/// on failure sets python exception, releases the converted ones, sets all of them to `NULL` and returns `false`
+static bool toConstraintRows(PyArrayObject **vConstraints, PyArrayObject **eConstraints,
+                             PyArrayObject **pConstraints, PyArrayObject **parked) {
+    PyArrayObject **rows[] = {vConstraints, eConstraints, pConstraints, parked};
+    static const int columns[] = {3, 5, 3, 3};
+    static const char *names[] = {"v_constraints", "e_constraints", "p_constraints", "parked"};
+    static const char *layouts[] = {"(t, x, y)", "(t, x1, y1, x2, y2)", "(t, x, y)", "(t, x, y)"};
+    for (int i = 0; i < 4; ++i) {
+        if (toRows(rows[i], columns[i], names[i], layouts[i])) continue;
+        for (int j = 0; j < i; ++j) Py_CLEAR(*rows[j]);
+        for (int j = i + 1; j < 4; ++j) *rows[j] = NULL;
+        return false;
+    }
+    return true;
+}
 
-    VConstraint *vcs = (VConstraint*)PyArray_DATA(vConstraints);
-    for (int i = 0; i < vConstraintsCount; ++i)
-        printf("[%d] = %d, (%d, %d)\n", i, vcs[i].time, vcs[i].p.x, vcs[i].p.y);
-    
-    printf("\nEdgeConstraints: len = %d ", eConstraintsCount);
-    puts("in format: t, (x1, y1) -> (x2, y2)");
-    
-    EConstraint *ecs = (EConstraint*)PyArray_DATA(eConstraints);
-    for (int i = 0; i < eConstraintsCount; ++i)
-        printf("[%d] = %d, (%d, %d) -> (%d, %d)\n",
-               i, ecs[i].time, ecs[i].e.p1.x, ecs[i].e.p1.y, ecs[i].e.p2.x, ecs[i].e.p2.y);
-    
-    printf("\n");
+static void releaseConstraintRows(PyArrayObject *vConstraints, PyArrayObject *eConstraints,
+                                  PyArrayObject *pConstraints, PyArrayObject *parked) {
+    Py_XDECREF(vConstraints);
+    Py_XDECREF(eConstraints);
+    Py_XDECREF(pConstraints);
+    Py_XDECREF(parked);
+}
+
+/// `distances` must be a C contiguous array of ints with the same shape as `grid`
+static bool checkDistances(PyArrayObject *grid, PyArrayObject *distances) {
+    bool ok = PyArray_TYPE(distances) == NPY_INT
+        && PyArray_NDIM(distances) == 2
+        && PyArray_DIM(distances, 0) == PyArray_DIM(grid, 0)
+        && PyArray_DIM(distances, 1) == PyArray_DIM(grid, 1)
+        && PyArray_IS_C_CONTIGUOUS(distances);
+    if (!ok)
+        PyErr_SetString(PyExc_ValueError, "heuristic must be a contiguous int32 array with the shape of the map");
+    return ok;
+}
+
+/// `0` means no focal search, otherwise it must be at least 1 and can't be combined with MDDs
+static bool checkSuboptimality(double suboptimality, int liteMdd, int fullMdd) {
+    if (suboptimality != 0 && suboptimality < 1) {
+        PyErr_SetString(PyExc_ValueError, "suboptimality must be at least 1");
+        return false;
+    }
+    if (suboptimality != 0 && (liteMdd || fullMdd)) {
+        PyErr_SetString(PyExc_ValueError, "MDDs are built only for the shortest paths, not with suboptimality");
+        return false;
+    }
+    return true;
 }
 
 static PyArrayObject *constructPath(Node *result) {
@@ -96,15 +183,13 @@ static PyArrayObject *constructPath(Node *result) {
     return path;
 }
 
-static void fillArray(void *p, void *auxData) { 
+static void appendCell(void *p, void *auxData) { 
     MddNode *node = *(MddNode**)p;
-    Point **ptr = (Point**)auxData;
-    **ptr = node->p;
-    (*ptr)++;
+    append((Array*)auxData, &node->p);
 }
 
 typedef struct {
-    Set *nextLayer;
+    NodeSet *nextLayer;
     int *ptr;
 } MapHelper;
 
@@ -113,28 +198,58 @@ static void appendParents(void *p, void *auxData) {
     MapHelper *helper = (MapHelper*)auxData;
 
     for (int i = 0; i < 5 && node->parents[i]; ++i) {
-        addTo(helper->nextLayer, &node->parents[i]);
+        addToNodeSet(helper->nextLayer, (Node*)node->parents[i]);
         helper->ptr[-1]++; // increase number of edges
     }
     
     helper->ptr[0]++; // increase number of nodes
 }
 
-static PyObject *constructPathAndMdd(MddNode *result, bool liteMdd, bool fullMdd) {
+/// full MDD as a pair of arrays: `cells` of all layers one after another, starting from the start layer,
+/// and `offsets`, layer `t` takes rows from `offsets[t]` to `offsets[t + 1]` in `cells`
+/// `cells` holds layers from the goal one to the start one, `ends[i]` is the end of `i`'th of them
+static PyObject *constructCsrMdd(Array *cells, const int *ends, int layers) {
+    npy_intp cellsShape[] = {countArray(cells), 2};
+    npy_intp offsetsShape[] = {layers + 1};
+    PyArrayObject *cellsArray = (PyArrayObject*)PyArray_SimpleNew(2, cellsShape, NPY_INT);
+    PyArrayObject *offsets = (PyArrayObject*)PyArray_SimpleNew(1, offsetsShape, NPY_INT);
+
+    Point *p = PyArray_DATA(cellsArray);
+    int *offset = PyArray_DATA(offsets);
+    offset[0] = 0;
+    for (int t = 0; t < layers; ++t) {
+        int i = layers - 1 - t; // layers were built backwards
+        int begin = i > 0 ? ends[i - 1] : 0;
+        int size = ends[i] - begin;
+        memcpy(p + offset[t], getElement(cells, begin), size * sizeof(Point));
+        offset[t + 1] = offset[t] + size;
+    }
+
+    PyObject *mdd = PyTuple_Pack(2, cellsArray, offsets);
+    Py_DECREF(cellsArray);
+    Py_DECREF(offsets);
+    return mdd;
+}
+
+static PyObject *constructPathAndMdd(Workspace *w, MddNode *result, bool liteMdd, bool fullMdd) {
     PyArrayObject *path = constructPath((Node*)result);
 
     npy_intp shape[] = {result->g * 2 + 1};
     PyObject *countedMdd = liteMdd ? PyArray_ZEROS(1, shape, NPY_INT, 0) : Py_None;
     int *countedMddPtr = liteMdd ? PyArray_DATA((PyArrayObject*)countedMdd) : NULL;
 
-    PyObject *mdd = fullMdd ? PyList_New(result->g + 1) : Py_None;
+    Array cells;
+    int *ends = NULL;
+    if (fullMdd) {
+        initArray(&cells, sizeof(Point), 4 * (result->g + 1), NULL);
+        ends = malloc((result->g + 1) * sizeof(int));
+    }
 
-    Set layers[2];
-    Set *layer = layers, *nextLayer = layers + 1;
-    initSet(layer, sizeof(MddNode*), NUM_BUCKETS, mddNodeHash, mddNodeCmp, NULL);
-    initSet(nextLayer, sizeof(MddNode*), NUM_BUCKETS, mddNodeHash, mddNodeCmp, NULL);
+    NodeSet *layer = w->layers, *nextLayer = w->layers + 1;
+    clearNodeSet(layer);
+    clearNodeSet(nextLayer);
 
-    addTo(layer, &result);
+    addToNodeSet(layer, (Node*)result);
     for (int i = 0; i <= result->g; ++i) {
         int *ptr;
         int dummy[] = {0, 0};
@@ -144,84 +259,150 @@ static PyObject *constructPathAndMdd(MddNode *result, bool liteMdd, bool fullMdd
             ptr = dummy + 1;
 
         MapHelper helper = {nextLayer, ptr};
-        mapSet(layer, appendParents, &helper);
+        mapNodeSet(layer, appendParents, &helper);
 
         if (fullMdd) { 
-            npy_intp shape[] = {ptr[0], 2};
-            PyArrayObject *mddLayer = (PyArrayObject*)PyArray_SimpleNew(2, shape, NPY_INT);
-            Point *p = PyArray_DATA(mddLayer);
-            mapSet(layer, fillArray, &p);
-            PyList_SET_ITEM(mdd, i, (PyObject*)mddLayer);
+            mapNodeSet(layer, appendCell, &cells);
+            ends[i] = countArray(&cells);
         }
         
         // swap layers and clear nextLayer
-        Set *tmp = layer;
+        NodeSet *tmp = layer;
         layer = nextLayer;
         nextLayer = tmp;
-        clearSet(nextLayer);
+        clearNodeSet(nextLayer);
     }
 
-    if (fullMdd) 
-        PyList_Reverse((PyObject*)mdd);
-    
-    deinitSet(layer);
-    deinitSet(nextLayer);
+    PyObject *mdd = Py_None;
+    if (fullMdd) {
+        mdd = constructCsrMdd(&cells, ends, result->g + 1);
+        deinitArray(&cells);
+        free(ends);
+    }
     
-    return PyTuple_Pack(3, path, countedMdd, mdd);
+    PyObject *returnObject = PyTuple_Pack(3, path, countedMdd, mdd);
+    Py_DECREF(path);
+    if (liteMdd) Py_DECREF(countedMdd);
+    if (fullMdd) Py_DECREF(mdd);
+    return returnObject;
 }
 
-static PyObject *
-fromPython(PyObject *self, PyObject *args, PyObject *keywords)
-{
-    PyArrayObject *grid = NULL, *vConstraints = NULL, *eConstraints = NULL;
-    int sx, sy, gx, gy;
-    bool liteMdd = false, fullMdd = false;
-    static char *keylist[] = {"map", "start", "goal", "v_constraints", "e_constraints", "lite_mdd", "full_mdd", NULL};
+/// `Paths` over a python sequence of paths, converted to contiguous int32 arrays when needed
+typedef struct {
+    PyObject *fast;
+    PyArrayObject **arrays;
+    const Point **points;
+    int *lengths;
+    Paths paths;
+} PythonPaths;
+
+static void releasePaths(PythonPaths *storage) {
+    for (int i = 0; i < storage->paths.count; ++i) Py_XDECREF(storage->arrays[i]);
+    free(storage->arrays);
+    free(storage->points);
+    free(storage->lengths);
+    Py_XDECREF(storage->fast);
+}
 
-    if (!PyArg_ParseTupleAndKeywords(
-        args, keywords, "O!(ii)(ii)|O!O!ii", keylist, 
-        &PyArray_Type, &grid, 
-        &sx, &sy, &gx, &gy, 
-        &PyArray_Type, &vConstraints, 
-        &PyArray_Type, &eConstraints,
-        &liteMdd, &fullMdd
-    ))
-        return NULL;
+/// fills `storage` from the `sequence`, on failure sets python exception, releases everything and returns `false`
+static bool wrapPaths(PyObject *sequence, PythonPaths *storage) {
+    storage->fast = PySequence_Fast(sequence, "paths must be a sequence");
+    int count = storage->fast ? (int)PySequence_Fast_GET_SIZE(storage->fast) : 0;
+    storage->arrays = calloc(count, sizeof(PyArrayObject*));
+    storage->points = malloc(count * sizeof(Point*));
+    storage->lengths = malloc(count * sizeof(int));
+    storage->paths = (Paths){count, storage->points, storage->lengths};
+    if (!storage->fast) {
+        releasePaths(storage);
+        return false;
+    }
+
+    PyObject **items = PySequence_Fast_ITEMS(storage->fast);
+    for (int i = 0; i < count; ++i) {
+        // no copy for contiguous int32 arrays, such as the paths returned from `find_path`
+        PyArrayObject *array = (PyArrayObject*)PyArray_FROMANY(items[i], NPY_INT, 2, 2, NPY_ARRAY_IN_ARRAY);
+        storage->arrays[i] = array;
+        if (array && (PyArray_DIM(array, 1) != 2 || PyArray_DIM(array, 0) == 0))
+            PyErr_SetString(PyExc_ValueError, "each path must be a non empty array of points with 2 columns");
+        if (PyErr_Occurred()) {
+            releasePaths(storage);
+            return false;
+        }
+        storage->points[i] = PyArray_DATA(array);
+        storage->lengths[i] = (int)PyArray_DIM(array, 0);
+    }
+    return true;
+}
 
-    Map *map = setupConstraints(grid, vConstraints, eConstraints);
+/// Finds the path on the `map` using memory from `w` and converts it to Python objects
+/// `map` is left without constraints and distances after the search
+/// the search itself runs without GIL, so `map` and `w` must not be shared with other threads
+/// `cat` is an optional conflict avoidance table, paths of other agents to break ties with
+/// `parked` are cells taken forever by other agents, rows (t, x, y) like vertex constraints
+/// `stats` gets what the search did, they are added to the module `totals` too
+static PyObject *search(Map *map, Workspace *w, Point s, Point g,
+                        PyArrayObject *vConstraints, PyArrayObject *eConstraints, PyArrayObject *pConstraints,
+                        PyArrayObject *parked, PyArrayObject *distances, bool liteMdd, bool fullMdd,
+                        double suboptimality, PythonPaths *cat, SearchStats *stats) {
+    Array constraints[4];
+    setupConstraints(map, constraints, vConstraints, eConstraints, pConstraints, parked);
+    if (distances) setDistances(map, PyArray_DATA(distances));
+    if (cat) {
+        clearConflictAvoidanceTable(&w->cat);
+        setConflictAvoidanceTable(map, &w->cat);
+        for (int i = 0; i < cat->paths.count; ++i)
+            addToConflictAvoidanceTable(map, cat->paths.paths[i], cat->paths.lengths[i]);
+    }
 
 #ifdef DebugMode
     puts("\n----------------------------------------------");
-    printf("Calculating path from (%d, %d) to (%d, %d)\n\n", sx, sy, gx, gy);
-    logConstraints(vConstraints, eConstraints);
-#endif
-    
-    Point s = {sx, sy}, g = {gx, gy};
-    
-#ifdef DebugMode
+    printf("Calculating path from (%d, %d) to (%d, %d)\n\n", s.x, s.y, g.x, g.y);
     printf("minimum path lenght with respect to constraints = %d\n", getGoalTimeBoundary(map, g));
 #endif
 
     bool found;
-    PyObject *returnObject;
-    if (!liteMdd && !fullMdd) {
-        a = newAllocator(20 * sizeof(Node), map->width * map->height / 3);
-        
+    PyObject *returnObject = NULL;
+    double start = now();
+    stats->mddTime = 0;
+    if (suboptimality != 0) {
+        // focal search, path with fewer conflicts within the bound along with the lower bound
+        Node result;
+        int lowerBound;
+        Py_BEGIN_ALLOW_THREADS
+        found = findFocalPath(map, w, s, g, suboptimality, &result, &lowerBound);
+        Py_END_ALLOW_THREADS
+        stats->searchTime = now() - start;
+        if (found) returnObject = Py_BuildValue("(Ni)", constructPath(&result), lowerBound);
+    } else if (!liteMdd && !fullMdd) {
         // actual A* here
         Node result;
-        found = findPath(map, s, g, &result);
+        Py_BEGIN_ALLOW_THREADS
+        found = findPath(map, w, s, g, &result);
+        Py_END_ALLOW_THREADS
+        stats->searchTime = now() - start;
         if (found) returnObject = (PyObject*)constructPath(&result);
     } else {
-        a = newAllocator(20 * sizeof(MddNode), map->width * map->height / 3);
-        
-        // A* for all paths
+        // A* for all paths, full MDDs give lower bounds in CBS-h, so they must have all of them,
+        // counted MDDs only rank conflicts
         MddNode result;
-        found = findAllPaths(map, s, g, &result);
-        if (found) returnObject = constructPathAndMdd(&result, liteMdd, fullMdd);
+        Py_BEGIN_ALLOW_THREADS
+        found = findAllPaths(map, w, s, g, fullMdd, &result);
+        Py_END_ALLOW_THREADS
+        stats->searchTime = now() - start;
+        if (found) {
+            start = now();
+            returnObject = constructPathAndMdd(w, &result, liteMdd, fullMdd);
+            stats->mddTime = now() - start;
+        }
     }
+    getSearchStats(w, stats);
+    addToTotals(stats);
     
-    deleteMap(map);
-    deleteAllocator(a);
+    setConstraints(map, NULL, NULL);
+    setPositiveConstraints(map, NULL);
+    setParkedAgents(map, NULL);
+    setDistances(map, NULL);
+    setConflictAvoidanceTable(map, NULL);
     
     if (!found) {
 #ifdef DebugMode
@@ -240,9 +421,432 @@ fromPython(PyObject *self, PyObject *args, PyObject *keywords)
     return returnObject;
 }
 
+static PyObject *
+fromPython(PyObject *self, PyObject *args, PyObject *keywords)
+{
+    PyArrayObject *grid = NULL, *vConstraints = NULL, *eConstraints = NULL, *pConstraints = NULL, *parked = NULL, *distances = NULL;
+    PyObject *catPaths = Py_None;
+    int sx, sy, gx, gy;
+    int liteMdd = false, fullMdd = false, wantStats = false;
+    double suboptimality = 0;
+    static char *keylist[] = {
+        "map", "start", "goal", "v_constraints", "e_constraints", "lite_mdd", "full_mdd", "heuristic", "cat",
+        "p_constraints", "suboptimality", "parked", "stats", NULL
+    };
+
+    if (!PyArg_ParseTupleAndKeywords(
+        args, keywords, "O!(ii)(ii)|O!O!iiO!OO!dO!p", keylist, 
+        &PyArray_Type, &grid, 
+        &sx, &sy, &gx, &gy, 
+        &PyArray_Type, &vConstraints, 
+        &PyArray_Type, &eConstraints,
+        &liteMdd, &fullMdd,
+        &PyArray_Type, &distances,
+        &catPaths,
+        &PyArray_Type, &pConstraints,
+        &suboptimality,
+        &PyArray_Type, &parked,
+        &wantStats
+    ))
+        return NULL;
+
+    if (distances && !checkDistances(grid, distances))
+        return NULL;
+    if (!checkSuboptimality(suboptimality, liteMdd, fullMdd))
+        return NULL;
+    if (!toConstraintRows(&vConstraints, &eConstraints, &pConstraints, &parked))
+        return NULL;
+
+    PythonPaths cat;
+    if (catPaths != Py_None && !wrapPaths(catPaths, &cat)) {
+        releaseConstraintRows(vConstraints, eConstraints, pConstraints, parked);
+        return NULL;
+    }
+
+    int width = (int)PyArray_DIM(grid, 1);
+    int height = (int)PyArray_DIM(grid, 0);
+    Map *map = newMap(width, height, PyArray_BYTES(grid));
+    Workspace *w = newWorkspace(width, height);
+    
+    Point s = {sx, sy}, g = {gx, gy};
+    SearchStats stats;
+    PyObject *returnObject = search(
+        map, w, s, g, vConstraints, eConstraints, pConstraints, parked, distances, 
+        liteMdd, fullMdd, suboptimality, catPaths != Py_None ? &cat : NULL, &stats
+    );
+    
+    deleteWorkspace(w);
+    deleteMap(map);
+    if (catPaths != Py_None) releasePaths(&cat);
+    releaseConstraintRows(vConstraints, eConstraints, pConstraints, parked);
+
+    return withStats(returnObject, &stats, wantStats);
+}
+
+static PyObject *
+statsFromPython(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+    PyObject *result = statsToDict(&totals);
+    if (!result) return NULL;
+    PyObject *searches = PyLong_FromLongLong(totalSearches);
+    if (!searches || PyDict_SetItemString(result, "searches", searches) < 0) {
+        Py_XDECREF(searches);
+        Py_DECREF(result);
+        return NULL;
+    }
+    Py_DECREF(searches);
+    return result;
+}
+
+static PyObject *
+resetStatsFromPython(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+    totals = (SearchStats){0};
+    totalSearches = 0;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+distancesFromPython(PyObject *self, PyObject *args, PyObject *keywords)
+{
+    PyArrayObject *grid = NULL;
+    int gx, gy;
+    static char *keylist[] = {"map", "goal", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, "O!(ii)", keylist, &PyArray_Type, &grid, &gx, &gy))
+        return NULL;
+
+    int w = (int)PyArray_DIM(grid, 1);
+    int h = (int)PyArray_DIM(grid, 0);
+    if (gx < 0 || gx >= w || gy < 0 || gy >= h) {
+        PyErr_SetString(PyExc_ValueError, "goal is out of the map bounds");
+        return NULL;
+    }
+
+    npy_intp shape[] = {h, w};
+    PyArrayObject *distances = (PyArrayObject*)PyArray_SimpleNew(2, shape, NPY_INT);
+    Map *map = newMap(w, h, PyArray_BYTES(grid));
+    Point g = {gx, gy};
+    fillDistances(map, g, PyArray_DATA(distances));
+    deleteMap(map);
+
+    return (PyObject*)distances;
+}
+
+static PyObject *
+conflictTimesFromPython(PyObject *self, PyObject *args, PyObject *keywords)
+{
+    PyObject *sequence = NULL;
+    int all = false;
+    static char *keylist[] = {"paths", "all_conflicts", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, "O|p", keylist, &sequence, &all))
+        return NULL;
+
+    PythonPaths storage;
+    if (!wrapPaths(sequence, &storage)) return NULL;
+
+    int *times = malloc((countTimeSteps(&storage.paths) + 1) * sizeof(int));
+    int found = findConflictTimes(&storage.paths, all, times);
+
+    PyObject *result = PyList_New(found);
+    for (int i = 0; result && i < found; ++i)
+        PyList_SET_ITEM(result, i, PyLong_FromLong(times[i]));
+
+    free(times);
+    releasePaths(&storage);
+    return result;
+}
+
+static PyObject *
+conflictsOfFromPython(PyObject *self, PyObject *args, PyObject *keywords)
+{
+    PyObject *sequence = NULL;
+    int agent;
+    static char *keylist[] = {"paths", "agent", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, "Oi", keylist, &sequence, &agent))
+        return NULL;
+
+    PythonPaths storage;
+    if (!wrapPaths(sequence, &storage)) return NULL;
+    if (agent < 0 || agent >= storage.paths.count) {
+        PyErr_SetString(PyExc_IndexError, "agent is out of range");
+        releasePaths(&storage);
+        return NULL;
+    }
+
+    Array found;
+    initArray(&found, sizeof(AgentConflict), 16, NULL);
+    findConflictsOf(&storage.paths, agent, &found);
+
+    int count = countArray(&found);
+    PyObject *result = PyList_New(count);
+    for (int i = 0; result && i < count; ++i) {
+        AgentConflict *conflict = getElement(&found, i);
+        PyList_SET_ITEM(result, i, Py_BuildValue("(ii)", conflict->other, conflict->time));
+    }
+
+    deinitArray(&found);
+    releasePaths(&storage);
+    return result;
+}
+
+/** Python type `Grid`, owns a copy of the map and everything the searches need
+ So a series of searches on the same map does not allocate the memory over and over
+ Searches release GIL, each running search takes its own workspace from the pool of `idle` ones,
+ so the same grid can be used from many threads at once, but it can't be reinitialized while any of them runs
+ */
+typedef struct {
+    PyObject_HEAD
+    PyArrayObject *cells;
+    Map *map;
+    Workspace **idle;
+    int idleCount;
+    int idleCapacity;
+    int running; // number of searches using the map without GIL, changed with GIL held
+    long long calls; // number of `find_path` calls
+    long long expanded; // nodes expanded by them
+} GridObject;
+
+/// must be called with GIL held
+static Workspace *acquireWorkspace(GridObject *self) {
+    if (self->idleCount > 0)
+        return self->idle[--self->idleCount];
+    return newWorkspace(self->map->width, self->map->height);
+}
+
+/// must be called with GIL held
+static void releaseWorkspace(GridObject *self, Workspace *w) {
+    if (self->idleCount == self->idleCapacity) {
+        int capacity = self->idleCapacity ? 2 * self->idleCapacity : 4;
+        Workspace **reallocated = realloc(self->idle, capacity * sizeof(Workspace*));
+        if (!reallocated) {
+            deleteWorkspace(w);
+            return;
+        }
+        self->idle = reallocated;
+        self->idleCapacity = capacity;
+    }
+    self->idle[self->idleCount++] = w;
+}
+
+static void clearWorkspaces(GridObject *self) {
+    for (int i = 0; i < self->idleCount; ++i)
+        deleteWorkspace(self->idle[i]);
+    free(self->idle);
+    self->idle = NULL;
+    self->idleCount = 0;
+    self->idleCapacity = 0;
+}
+
+static void Grid_dealloc(GridObject *self) {
+    clearWorkspaces(self);
+    if (self->map) deleteMap(self->map);
+    Py_XDECREF(self->cells);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static int Grid_init(GridObject *self, PyObject *args, PyObject *keywords) {
+    PyObject *object = NULL;
+    static char *keylist[] = {"map", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, "O", keylist, &object))
+        return -1;
+    // running searches read the map and the cells, which are replaced here
+    if (self->running > 0) {
+        PyErr_SetString(PyExc_RuntimeError, "the grid can't be reinitialized while other threads search on it");
+        return -1;
+    }
+    
+    PyArrayObject *cells = (PyArrayObject*)PyArray_FROMANY(
+        object, NPY_BYTE, 2, 2, NPY_ARRAY_C_CONTIGUOUS | NPY_ARRAY_ENSURECOPY
+    );
+    if (!cells) return -1;
+    
+    // `__init__` may be called more than once
+    clearWorkspaces(self);
+    if (self->map) deleteMap(self->map);
+    Py_XDECREF(self->cells);
+    
+    int width = (int)PyArray_DIM(cells, 1);
+    int height = (int)PyArray_DIM(cells, 0);
+    self->cells = cells;
+    self->map = newMap(width, height, PyArray_BYTES(cells));
+    precomputeMoves(self->map);
+    return 0;
+}
+
+/// a grid made without `__init__` has no map to search on
+static bool isInitialized(GridObject *self) {
+    if (self->map) return true;
+    PyErr_SetString(PyExc_RuntimeError, "the grid is not initialized, create it with Grid(map)");
+    return false;
+}
+
+static bool inBounds(GridObject *self, int x, int y) {
+    if (0 <= x && x < self->map->width && 0 <= y && y < self->map->height)
+        return true;
+    PyErr_Format(PyExc_ValueError, "point (%d, %d) is out of the map bounds", x, y);
+    return false;
+}
+
+static PyObject *Grid_findPath(GridObject *self, PyObject *args, PyObject *keywords) {
+    PyArrayObject *vConstraints = NULL, *eConstraints = NULL, *pConstraints = NULL, *parked = NULL, *distances = NULL;
+    PyObject *catPaths = Py_None;
+    int sx, sy, gx, gy;
+    int liteMdd = false, fullMdd = false, wantStats = false;
+    double suboptimality = 0;
+    static char *keylist[] = {
+        "start", "goal", "v_constraints", "e_constraints", "lite_mdd", "full_mdd", "heuristic", "cat",
+        "p_constraints", "suboptimality", "parked", "stats", NULL
+    };
+
+    if (!PyArg_ParseTupleAndKeywords(
+        args, keywords, "(ii)(ii)|O!O!iiO!OO!dO!p", keylist,
+        &sx, &sy, &gx, &gy,
+        &PyArray_Type, &vConstraints,
+        &PyArray_Type, &eConstraints,
+        &liteMdd, &fullMdd,
+        &PyArray_Type, &distances,
+        &catPaths,
+        &PyArray_Type, &pConstraints,
+        &suboptimality,
+        &PyArray_Type, &parked,
+        &wantStats
+    ))
+        return NULL;
+
+    if (!isInitialized(self))
+        return NULL;
+    if (!inBounds(self, sx, sy) || !inBounds(self, gx, gy))
+        return NULL;
+    if (distances && !checkDistances(self->cells, distances))
+        return NULL;
+    if (!checkSuboptimality(suboptimality, liteMdd, fullMdd))
+        return NULL;
+    if (!toConstraintRows(&vConstraints, &eConstraints, &pConstraints, &parked))
+        return NULL;
+
+    PythonPaths cat;
+    if (catPaths != Py_None && !wrapPaths(catPaths, &cat)) {
+        releaseConstraintRows(vConstraints, eConstraints, pConstraints, parked);
+        return NULL;
+    }
+
+    self->calls++;
+    // constraints and distances are set per search, so each search gets its own shallow copy of the map
+    Map map = *self->map;
+    Workspace *w = acquireWorkspace(self);
+    
+    Point s = {sx, sy}, g = {gx, gy};
+    SearchStats stats;
+    self->running++;
+    PyObject *returnObject = search(
+        &map, w, s, g, vConstraints, eConstraints, pConstraints, parked, distances, 
+        liteMdd, fullMdd, suboptimality, catPaths != Py_None ? &cat : NULL, &stats
+    );
+    self->running--;
+    self->expanded += stats.expanded;
+    
+    releaseWorkspace(self, w);
+    if (catPaths != Py_None) releasePaths(&cat);
+    releaseConstraintRows(vConstraints, eConstraints, pConstraints, parked);
+    return withStats(returnObject, &stats, wantStats);
+}
+
+static PyObject *Grid_distances(GridObject *self, PyObject *args, PyObject *keywords) {
+    int gx, gy;
+    static char *keylist[] = {"goal", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, "(ii)", keylist, &gx, &gy))
+        return NULL;
+    if (!isInitialized(self))
+        return NULL;
+    if (!inBounds(self, gx, gy))
+        return NULL;
+
+    npy_intp shape[] = {self->map->height, self->map->width};
+    PyArrayObject *distances = (PyArrayObject*)PyArray_SimpleNew(2, shape, NPY_INT);
+    int *data = PyArray_DATA(distances);
+    Point g = {gx, gy};
+    
+    self->running++;
+    Py_BEGIN_ALLOW_THREADS
+    fillDistances(self->map, g, data);
+    Py_END_ALLOW_THREADS
+    self->running--;
+    
+    return (PyObject*)distances;
+}
+
+static PyMethodDef gridMethods[] = {
+    {"find_path", (PyCFunction)(void(*)(void))Grid_findPath, METH_VARARGS | METH_KEYWORDS,
+     "find_path(start, goal, v_constraints=None, e_constraints=None, lite_mdd=False, full_mdd=False, heuristic=None, cat=None, p_constraints=None, suboptimality=0, parked=None, stats=False)\n"
+     "Same as the module level `find_path`, but reuses the memory of the grid from call to call.\n"
+     "Releases GIL while searching, can be called from many threads at once."},
+    {"distances", (PyCFunction)(void(*)(void))Grid_distances, METH_VARARGS | METH_KEYWORDS,
+     "distances(goal)\n"
+     "Same as the module level `distances` on the map of the grid."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyMemberDef gridMembers[] = {
+    {"map", T_OBJECT_EX, offsetof(GridObject, cells), READONLY, "copy of the map the grid was created with"},
+    {"calls", T_LONGLONG, offsetof(GridObject, calls), READONLY, "number of `find_path` calls made on the grid"},
+    {"expanded", T_LONGLONG, offsetof(GridObject, expanded), READONLY, "number of nodes expanded by these calls"},
+    {NULL}        /* Sentinel */
+};
+
+static PyTypeObject GridType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "lightspeed.Grid",
+    .tp_doc = "Grid(map)\n"
+              "Map prepared for many path searches on it, keeps memory pools between the searches.\n"
+              "Calling `__init__` again replaces the map, it raises RuntimeError while other threads search on the grid.",
+    .tp_basicsize = sizeof(GridObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)Grid_init,
+    .tp_dealloc = (destructor)Grid_dealloc,
+    .tp_methods = gridMethods,
+    .tp_members = gridMembers,
+};
+
 static PyMethodDef methods[] = {
     {"find_path", (PyCFunction)(void(*)(void))fromPython, METH_VARARGS | METH_KEYWORDS,
-     "Do some stuff"},
+     "find_path(map, start, goal, v_constraints=None, e_constraints=None, lite_mdd=False, full_mdd=False, heuristic=None, cat=None, p_constraints=None, suboptimality=0, parked=None, stats=False)\n"
+     "Find the shortest path from `start` to `goal` which respects the constraints, `None` if there is no such path.\n"
+     "With MDDs returns (path, counted MDD or None, full MDD as (cells, layer offsets) or None).\n"
+     "`heuristic` is an optional table of exact distances to the `goal`, as returned by `distances`.\n"
+     "`cat` is an optional sequence of other agents' paths, among the shortest paths the one with\n"
+     "the fewest vertex conflicts with them is returned.\n"
+     "`p_constraints` are positive constraints, rows (t, x, y) of places the agent must be at.\n"
+     "With `suboptimality` of at least 1 runs focal search instead: returns (path, lower bound), the path is\n"
+     "at most `suboptimality` times longer than the shortest one, paths with fewer conflicts with `cat` are preferred,\n"
+     "the lower bound is at most the length of the shortest path. No MDDs then.\n"
+     "`parked` are rows (t, x, y) of cells other agents take from the time t on and never leave.\n"
+     "With `stats` returns (result, stats), where stats is a dict of the search: nodes `expanded` and `generated`,\n"
+     "`max_open` size, `bytes` the nodes took, allocator `chunks`, seconds of `search_time` and `mdd_time`."},
+    {"stats", (PyCFunction)statsFromPython, METH_NOARGS,
+     "stats()\n"
+     "Totals of all `find_path` calls since the last `reset_stats`: number of `searches`, and the stats\n"
+     "of `find_path` summed over them, except for `max_open` and `chunks`, which are the largest ones."},
+    {"reset_stats", (PyCFunction)resetStatsFromPython, METH_NOARGS,
+     "reset_stats()\n"
+     "Sets the totals returned by `stats` to zero."},
+    {"distances", (PyCFunction)(void(*)(void))distancesFromPython, METH_VARARGS | METH_KEYWORDS,
+     "distances(map, goal)\n"
+     "Table of the shortest distances from every cell to `goal` ignoring constraints, -1 for unreachable cells."},
+    {"conflict_times", (PyCFunction)(void(*)(void))conflictTimesFromPython, METH_VARARGS | METH_KEYWORDS,
+     "conflict_times(paths, all_conflicts=False)\n"
+     "Sorted times when some agents with given paths are at the same point or swap their points,\n"
+     "agents wait at the ends of their paths. Only the earliest time unless `all_conflicts` is set."},
+    {"conflicts_of", (PyCFunction)(void(*)(void))conflictsOfFromPython, METH_VARARGS | METH_KEYWORDS,
+     "conflicts_of(paths, agent)\n"
+     "All conflicts of the `agent` with the others as a list of (other agent, time) pairs, ordered by both,\n"
+     "with the same times as in `conflict_times`."},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -258,7 +862,18 @@ static struct PyModuleDef lightspeed = {
 PyMODINIT_FUNC
 PyInit_lightspeed(void)
 {
-    PyObject* mod = PyModule_Create(&lightspeed);
     import_array();
+    if (PyType_Ready(&GridType) < 0)
+        return NULL;
+
+    PyObject* mod = PyModule_Create(&lightspeed);
+    if (!mod) return NULL;
+
+    Py_INCREF(&GridType);
+    if (PyModule_AddObject(mod, "Grid", (PyObject*)&GridType) < 0) {
+        Py_DECREF(&GridType);
+        Py_DECREF(mod);
+        return NULL;
+    }
     return mod;
 }
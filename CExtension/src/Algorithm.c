@@ -1,19 +1,39 @@
 #include "Algorithm.h"
 
-#include "Set.h"
-#include "Allocator.h"
-#include "PriorityQueue.h"
-
+#include <limits.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 
-#define NUM_BUCKETS 1337
+#define EXPECTED_CLOSED 1024
+#define EXPECTED_LAYER_SIZE 16
+#define NODES_PER_CHUNK 20
 
 int manhattan(Point p1, Point p2) {
     return abs(p1.x - p2.x) + abs(p1.y - p2.y);
 }
 
+/// distance from `p` to the goal `g`, exact if the map has a table of distances, manhattan otherwise
+/// `-1` means that `g` is unreachable from `p`
+static int estimate(Map *map, Point p, Point g) {
+    if (map->distances) return map->distances[p.y * map->width + p.x];
+    return manhattan(p, g);
+}
+
+/// `estimate` from `p` at `time`, knowing that the agent can stay at the goal only after `maxConstrainedTime`,
+/// so an agent which has to wait for it dives to the goal instead of expanding every earlier state
+static int estimateAt(Map *map, Point p, int time, Point g, int maxConstrainedTime) {
+    int distance = estimate(map, p, g);
+    int waiting = maxConstrainedTime + 1 - time;
+    return distance > waiting ? distance : waiting;
+}
+
+/// searches need not go beyond this time: after the last constraint the map doesn't change,
+/// so the rest of any shortest path takes less than `width * height` moves
+static int horizonOf(Map *map) {
+    return getLastConstrainedTime(map) + map->width * map->height;
+}
+
 static int lowestG(const void *p1, const void *p2) {
     Node *node1 = (Node*)p1, *node2 = (Node*)p2;
     // reverse order, lower f, higher priority
@@ -28,17 +48,98 @@ static int highestG(const void *p1, const void *p2) {
     // reverse order, lower f, higher priority
     int df = node2->f - node1->f; 
     if (df != 0) return df;
+    // reverse order, fewer conflicts with other agents, higher priority
+    int dc = node2->conflicts - node1->conflicts;
+    if (dc != 0) return dc;
     // same order here, higher g, higher priority
     return node1->g - node2->g;
 }
 
-Allocator *a;
+static int lowestF(const void *p1, const void *p2) {
+    Node *node1 = *(Node**)p1, *node2 = *(Node**)p2;
+    // reverse order, lower f, higher priority
+    return node2->f - node1->f;
+}
 
-bool findPath(Map *map, Point s, Point g, Node *storage) {
-    Set *closed = newSet(sizeof(Node*), NUM_BUCKETS, nodePtrHash, nodePtrCmp, NULL);
-    PriorityQueue *open = newQueue(sizeof(Node), map->height * map->width / 2, highestG);
+static int fewestConflicts(const void *p1, const void *p2) {
+    Node *node1 = *(Node**)p1, *node2 = *(Node**)p2;
+    // reverse order, fewer conflicts with other agents, higher priority
+    int dc = node2->conflicts - node1->conflicts;
+    if (dc != 0) return dc;
+    // then as in `highestG`
+    int df = node2->f - node1->f;
+    if (df != 0) return df;
+    return node1->g - node2->g;
+}
+
+Workspace *newWorkspace(int width, int height) {
+    Workspace *w = malloc(sizeof(Workspace));
+    // `MddNode` is the biggest of the nodes, so any of them will fit in a chunk
+    w->allocator = newAllocator(NODES_PER_CHUNK * sizeof(MddNode), width * height / 3);
+    w->open = NULL;
+    w->mddOpen = NULL;
+    w->lastOpen = NULL;
+    for (int i = 0; i < 3; ++i) w->focal[i] = NULL;
+    w->expectedOpenSize = width * height / 2 + 1;
+    initNodeSet(&w->closed, EXPECTED_CLOSED);
+    initNodeSet(w->layers, EXPECTED_LAYER_SIZE);
+    initNodeSet(w->layers + 1, EXPECTED_LAYER_SIZE);
+    initConstraintIndex(&w->index);
+    initConflictAvoidanceTable(&w->cat);
+    return w;
+}
+
+void deleteWorkspace(Workspace *w) {
+    deleteAllocator(w->allocator);
+    if (w->open) deleteQueue(w->open);
+    if (w->mddOpen) deleteQueue(w->mddOpen);
+    for (int i = 0; i < 3; ++i)
+        if (w->focal[i]) deleteQueue(w->focal[i]);
+    deinitNodeSet(&w->closed);
+    deinitNodeSet(w->layers);
+    deinitNodeSet(w->layers + 1);
+    deinitConstraintIndex(&w->index);
+    deinitConflictAvoidanceTable(&w->cat);
+    free(w);
+}
+
+/// creates the `queue` if there is none yet, empties it and returns
+static PriorityQueue *emptyQueue(Workspace *w, PriorityQueue **queue, size_t width, CompareFunction cmp) {
+    if (!*queue) *queue = newQueue(width, w->expectedOpenSize, cmp);
+    clearQueue(*queue);
+    return *queue;
+}
+
+/// clears everything left from the previous search, indexes constraints of the `map`
+/// and returns open queue to use, every search starts with it, so its stats are of this search
+static PriorityQueue *prepare(Map *map, Workspace *w, PriorityQueue **open, size_t width, CompareFunction cmp) {
+    indexConstraints(map, &w->index);
+    clearNodeSet(&w->closed);
+    resetAllocator(w->allocator);
+    w->lastOpen = emptyQueue(w, open, width, cmp);
+    return w->lastOpen;
+}
+
+void getSearchStats(Workspace *w, SearchStats *stats) {
+    stats->expanded = countNodeSet(&w->closed);
+    stats->generated = w->lastOpen ? (long long)countInserted(w->lastOpen) : 0;
+    stats->maxOpen = w->lastOpen ? (long long)peakSize(w->lastOpen) : 0;
+    stats->bytes = (long long)allocatedBytes(w->allocator);
+    stats->chunks = countChunks(w->allocator);
+}
+
+bool findPath(Map *map, Workspace *w, Point s, Point g, Node *storage) {
+    PriorityQueue *open = prepare(map, w, &w->open, sizeof(Node), highestG);
+    if (estimate(map, s, g) < 0) return false;
+    NodeSet *closed = &w->closed;
+    Allocator *a = w->allocator;
+    // the map doesn't change after the last constraint, so A* reaches a point then the earliest it can,
+    // later visits are no better and the search ends even if there is no path
+    mergeTimesAfter(closed, getLastConstrainedTime(map));
     
     int maxConstrainedTime = getGoalTimeBoundary(map, g);
+    // the goal is taken by another agent forever
+    if (maxConstrainedTime == INT_MAX) return false;
     bool found = false;
     bool isGoal = false;
 
@@ -58,20 +159,18 @@ bool findPath(Map *map, Point s, Point g, Node *storage) {
             }
         }
 
-        if (searchSet(closed, &node) != NULL)
+        if (!addToNodeSet(closed, node))
             // duplicate node, was already expanded
             continue;
         
-        addTo(closed, &node);
-        
         Point neighbors[5];
         int amount = getNeighbors(map, node->g + 1, node->p, isGoal, neighbors);
         for (int i = 0; i < amount; ++i) {
             Node neighbour = {neighbors[i], .g = node->g + 1};
-            Node *ptr = &neighbour;
 
-            if (searchSet(closed, &ptr) == NULL) {
-                neighbour.f = neighbour.g + manhattan(neighbour.p, g);
+            if (searchNodeSet(closed, &neighbour) == NULL) {
+                neighbour.f = neighbour.g + estimateAt(map, neighbour.p, neighbour.g, g, maxConstrainedTime);
+                neighbour.conflicts = node->conflicts + countConflicts(map, neighbour.g, neighbour.p);
                 neighbour.parent = node;
                 enqueue(open, &neighbour);
             }
@@ -79,55 +178,150 @@ bool findPath(Map *map, Point s, Point g, Node *storage) {
         node = allocate(a, sizeof(Node));
     }
     
-    deleteQueue(open);
-    deleteSet(closed);
+    return found;
+}
+
+bool findFocalPath(Map *map, Workspace *w, Point s, Point g, double suboptimality, Node *storage, int *lowerBound) {
+    // every node goes to `open`, and to `focal` or `rest` depending on its `f`,
+    // expanded nodes are not removed from the other queues, but skipped there
+    PriorityQueue *open = prepare(map, w, &w->focal[0], sizeof(Node*), lowestF);
+    PriorityQueue *focal = emptyQueue(w, &w->focal[1], sizeof(Node*), fewestConflicts);
+    PriorityQueue *rest = emptyQueue(w, &w->focal[2], sizeof(Node*), lowestF);
+    if (estimate(map, s, g) < 0) return false;
+    NodeSet *closed = &w->closed;
+    Allocator *a = w->allocator;
+    
+    int maxConstrainedTime = getGoalTimeBoundary(map, g);
+    // the goal is taken by another agent forever
+    if (maxConstrainedTime == INT_MAX) return false;
+    int horizon = horizonOf(map);
+    bool found = false;
+    
+    Node *node = allocate(a, sizeof(Node));
+    memset(node, 0, sizeof(Node));
+    node->p = s;
+    node->f = estimateAt(map, s, 0, g, maxConstrainedTime);
+    node->conflicts = countConflicts(map, 0, s);
+    enqueue(open, &node);
+    enqueue(focal, &node);
+    int bound = node->f;
+    
+    Node *first;
+    while (peek(open, &first)) {
+        if (searchNodeSet(closed, first)) {
+            dequeue(open, &first);
+            continue;
+        }
+        
+        // the least `f` has grown, so more nodes get into focal
+        int newBound = (int)(suboptimality * first->f + 1e-9);
+        if (newBound > bound) {
+            bound = newBound;
+            Node *next;
+            while (peek(rest, &next) && next->f <= bound) {
+                dequeue(rest, &next);
+                enqueue(focal, &next);
+            }
+        }
+        
+        // `first` is in focal, so it is never empty here
+        dequeue(focal, &node);
+        if (searchNodeSet(closed, node))
+            // duplicate node, was already expanded
+            continue;
+        
+        bool isGoal = node->p.x == g.x && node->p.y == g.y;
+        if (isGoal && node->g > maxConstrainedTime) {
+            found = true;
+            *storage = *node;
+            *lowerBound = first->f;
+            break;
+        }
+        
+        addToNodeSet(closed, node);
+        if (node->g > horizon) continue;
+        
+        Point neighbors[5];
+        int amount = getNeighbors(map, node->g + 1, node->p, isGoal, neighbors);
+        for (int i = 0; i < amount; ++i) {
+            Node neighbour = {neighbors[i], .g = node->g + 1};
+            if (searchNodeSet(closed, &neighbour)) continue;
+            
+            Node *next = allocate(a, sizeof(Node));
+            *next = neighbour;
+            next->f = next->g + estimateAt(map, next->p, next->g, g, maxConstrainedTime);
+            next->conflicts = node->conflicts + countConflicts(map, next->g, next->p);
+            next->parent = node;
+            enqueue(open, &next);
+            enqueue(next->f <= bound ? focal : rest, &next);
+        }
+    }
     
     return found;
 }
 
-bool findAllPaths(Map *map, Point s, Point g, MddNode *storage) {
-    Set *closed = newSet(sizeof(MddNode*), NUM_BUCKETS, nodePtrHash, nodePtrCmp, NULL);
+/// counts the fewest conflicts with the conflict avoidance table of the `map` on the way to the `node`
+/// and moves the parent on such way to the first place, so the path through `parents[0]` is the best one
+static int leastConflicts(Map *map, MddNode *node) {
+    if (node->conflicts >= 0) return node->conflicts;
     
+    int best = 0;
+    for (int i = 0; i < 5 && node->parents[i]; ++i) {
+        int conflicts = leastConflicts(map, node->parents[i]);
+        if (i == 0 || conflicts < best) {
+            best = conflicts;
+            MddNode *parent = node->parents[i];
+            node->parents[i] = node->parents[0];
+            node->parents[0] = parent;
+        }
+    }
+    node->conflicts = best + countConflicts(map, node->g, node->p);
+    return node->conflicts;
+}
+
+bool findAllPaths(Map *map, Workspace *w, Point s, Point g, bool allWaits, MddNode *storage) {
     // can use the same `highestG` and `lowestG` functions because `MddNode` stores data in the same way
-    PriorityQueue *open = newQueue(sizeof(MddNode), map->height * map->width / 2, lowestG);
+    PriorityQueue *open = prepare(map, w, &w->mddOpen, sizeof(MddNode), lowestG);
+    if (estimate(map, s, g) < 0) return false;
+    NodeSet *closed = &w->closed;
+    Allocator *a = w->allocator;
     
     int maxConstrainedTime = getGoalTimeBoundary(map, g);
+    // the goal is taken by another agent forever
+    if (maxConstrainedTime == INT_MAX) return false;
+    int horizon = horizonOf(map);
     bool found = false;
-    bool isGoal = false;
     
     MddNode *node = allocate(a, sizeof(MddNode));
     memset(node, 0, sizeof(MddNode));
     node->p = s;
+    node->conflicts = -1;
     enqueue(open, node);
     
     while (dequeue(open, node)) {
-        isGoal = false;
-        if (pointCmp(node->p, g) == 0) {
-            isGoal = true;
-            if (node->g > maxConstrainedTime) {
-                found = true;
-                *storage = *node;
-                break;
-            }
+        if (pointCmp(node->p, g) == 0 && node->g > maxConstrainedTime) {
+            found = true;
+            *storage = *node;
+            break;
         }
         
-        MddNode **expanded = searchSet(closed, &node);
+        MddNode *expanded = (MddNode*)searchNodeSet(closed, (Node*)node);
         if (expanded) {
             // found duplicate, add to parents and skip
-            addParent(*expanded, node->parents[0]);
+            addParent(expanded, node->parents[0]);
             continue;
         }
         
-        addTo(closed, &node);
+        addToNodeSet(closed, (Node*)node);
+        if (node->g > horizon) continue;
         
         Point neighbors[5];
-        int amount = getNeighbors(map, node->g + 1, node->p, false, neighbors);
+        int amount = getNeighbors(map, node->g + 1, node->p, allWaits, neighbors);
         for (int i = 0; i < amount; ++i) {
-            MddNode neighbour = {neighbors[i], .g = node->g + 1};
-            MddNode *ptr = &neighbour;
+            MddNode neighbour = {neighbors[i], .g = node->g + 1, .conflicts = -1};
 
-            if (searchSet(closed, &ptr) == NULL) {
-                neighbour.f = neighbour.g + manhattan(neighbour.p, g);
+            if (searchNodeSet(closed, (Node*)&neighbour) == NULL) {
+                neighbour.f = neighbour.g + estimate(map, neighbour.p, g);
                 addParent(&neighbour, node);
                 enqueue(open, &neighbour);
             }
@@ -138,12 +332,41 @@ bool findAllPaths(Map *map, Point s, Point g, MddNode *storage) {
     while (dequeue(open, node) && pointCmp(node->p, storage->p) == 0)
         addParent(storage, node->parents[0]);
     
-    deleteQueue(open);
-    deleteSet(closed);
+    // all shortest paths are known, choose the one for `storage` with the fewest conflicts
+    if (found && map->cat) leastConflicts(map, storage);
     
     return found;
 }
 
+void fillDistances(Map *map, Point g, int *distances) {
+    int size = map->width * map->height;
+    for (int i = 0; i < size; ++i) distances[i] = -1;
+    if (map->data[g.y * map->width + g.x]) return; // goal is in the wall
+    
+    // plain BFS from the goal, every cell is enqueued at most once
+    int *queue = malloc(size * sizeof(int));
+    int head = 0, tail = 0;
+    queue[tail++] = g.y * map->width + g.x;
+    distances[queue[0]] = 0;
+    
+    Point d[] = { {0, 1}, {0, -1}, {1, 0}, {-1, 0} };
+    while (head < tail) {
+        int cell = queue[head++];
+        Point p = {cell % map->width, cell / map->width};
+        for (int i = 0; i < 4; ++i) {
+            Point next = {p.x + d[i].x, p.y + d[i].y};
+            if (next.x < 0 || next.x >= map->width || next.y < 0 || next.y >= map->height) continue;
+            
+            int nextCell = next.y * map->width + next.x;
+            if (map->data[nextCell] == 0 && distances[nextCell] < 0) {
+                distances[nextCell] = distances[cell] + 1;
+                queue[tail++] = nextCell;
+            }
+        }
+    }
+    free(queue);
+}
+
 bool testPath(void) {
     // specify actual map
     // 1 - wall, 0 - path
@@ -161,7 +384,7 @@ bool testPath(void) {
     Point start = {1, 0};     // <----- specify start point (x, y)
     Point goal = {1, 1};     // <------- specify goal point (x, y)
     
-    a = newAllocator(10, mapWidth * mapHeight / 2);
+    Workspace *w = newWorkspace(mapWidth, mapHeight);
     
     Array vConstraints, eConstraints;
     
@@ -198,25 +421,23 @@ bool testPath(void) {
     // ^^^^^^^^^^ this would be the call                                   ^^^^
     
     Node result;
-    bool found = findPath(map, start, goal, &result);
+    bool found = findPath(map, w, start, goal, &result);
     
     if (!found) {
-        deleteAllocator(a);
+        deleteWorkspace(w);
+        deleteMap(map);
         return false;
     }
 
-    int l = 0;
-    Point path[100] = {0};
     Node *current = &result;
     printf("result.g = %d\n", result.g);
     while (current) {
-        path[l++] = current->p;
         printf("(%d, %d) <- ", current->p.x, current->p.y);
         current = current->parent;
     }
     printf("\n");
 
-    deleteAllocator(a);
+    deleteWorkspace(w);
     deleteMap(map);
     
     return found;
@@ -18,7 +18,7 @@ Allocator *newAllocator(size_t chunkSize, size_t capacity) {
 
 static void grow(Allocator *a) {
     if (a->chunkCount == a->capacity) {
-        void **reallocated = realloc(a->chunks, 2 * a->capacity);
+        void **reallocated = realloc(a->chunks, 2 * a->capacity * sizeof(void*));
         assert(reallocated);
         a->chunks = reallocated;
         a->capacity *= 2;
@@ -28,15 +28,36 @@ static void grow(Allocator *a) {
 }
 
 void *allocate(Allocator *a, size_t size) {
+    assert((int)size <= a->chunkSize);
     int chunkIndex = a->top / a->chunkSize;
     int nodeIndex = a->top % a->chunkSize;
     
+    if (nodeIndex + (int)size > a->chunkSize) {
+        // does not fit in the rest of the chunk, continue from the next one
+        chunkIndex++;
+        nodeIndex = 0;
+        a->top = chunkIndex * a->chunkSize;
+    }
+    
+    // chunks left from the previous use are taken again after `resetAllocator`
     if (chunkIndex == a->chunkCount) grow(a);
     
     a->top += size;
     return (char*)a->chunks[chunkIndex] + nodeIndex;
 }
 
+void resetAllocator(Allocator *a) {
+    a->top = 0;
+}
+
+size_t allocatedBytes(Allocator *a) {
+    return (size_t)a->top;
+}
+
+int countChunks(Allocator *a) {
+    return a->chunkCount;
+}
+
 void deleteAllocator(Allocator *a) {
     for (int i = 0; i < a->chunkCount; ++i)
         free(a->chunks[i]);
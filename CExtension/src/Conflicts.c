@@ -0,0 +1,110 @@
+#include "Conflicts.h"
+
+#include <stdlib.h>
+
+int countTimeSteps(const Paths *paths) {
+    int steps = 0;
+    for (int i = 0; i < paths->count; ++i)
+        if (paths->lengths[i] > steps) steps = paths->lengths[i];
+    return steps;
+}
+
+static Point pointAt(const Paths *paths, int agent, int time) {
+    int last = paths->lengths[agent] - 1;
+    return paths->paths[agent][time < last ? time : last];
+}
+
+static long long keyOf(Point p) {
+    return ((long long)p.x << 32) | (unsigned)p.y;
+}
+
+static bool equal(Point p1, Point p2) {
+    return p1.x == p2.x && p1.y == p2.y;
+}
+
+/** Agents standing at each point at one time step
+ `table` maps a point to the first agent there, `next` links the rest of them, `-1` ends the list
+ */
+typedef struct {
+    KeyTable table;
+    int *next;
+} Step;
+
+/// puts all agents into the `step` at the `time`, returns `true` if two of them are at the same point
+static bool fillStep(Step *step, const Paths *paths, int time) {
+    bool conflict = false;
+    clearKeyTable(&step->table);
+    for (int i = 0; i < paths->count; ++i) {
+        long long key = keyOf(pointAt(paths, i, time));
+        int first = getValue(&step->table, key, -1);
+        if (first >= 0) conflict = true;
+        step->next[i] = first;
+        putKey(&step->table, key, i);
+    }
+    return conflict;
+}
+
+/// checks if some agent goes along the move of some other agent backwards from `time - 1` to `time`
+static bool hasSwap(Step *previous, const Paths *paths, int time) {
+    for (int i = 0; i < paths->count; ++i) {
+        Point from = pointAt(paths, i, time - 1);
+        Point to = pointAt(paths, i, time);
+        if (equal(from, to)) continue;
+        
+        // everyone who was at our destination
+        int other = getValue(&previous->table, keyOf(to), -1);
+        for (; other >= 0; other = previous->next[other])
+            if (other != i && equal(pointAt(paths, other, time), from))
+                return true;
+    }
+    return false;
+}
+
+int findConflictTimes(const Paths *paths, bool all, int *times) {
+    int steps = countTimeSteps(paths);
+    Step step[2];
+    for (int k = 0; k < 2; ++k) {
+        initKeyTable(&step[k].table, paths->count);
+        step[k].next = malloc(paths->count * sizeof(int));
+    }
+    
+    int found = 0;
+    for (int time = 0; time < steps; ++time) {
+        Step *current = step + time % 2;
+        Step *previous = step + (time + 1) % 2;
+        
+        bool conflict = fillStep(current, paths, time);
+        if (!conflict && time > 0) conflict = hasSwap(previous, paths, time);
+        
+        if (conflict) {
+            times[found++] = time;
+            if (!all) break;
+        }
+    }
+    
+    for (int k = 0; k < 2; ++k) {
+        deinitKeyTable(&step[k].table);
+        free(step[k].next);
+    }
+    return found;
+}
+
+void findConflictsOf(const Paths *paths, int agent, Array *found) {
+    for (int other = 0; other < paths->count; ++other) {
+        if (other == agent) continue;
+        
+        // both wait at their goals after this
+        int steps = paths->lengths[agent] > paths->lengths[other] ? paths->lengths[agent] : paths->lengths[other];
+        Point p = pointAt(paths, agent, 0), q = pointAt(paths, other, 0);
+        for (int time = 0; time < steps; ++time) {
+            Point pNext = pointAt(paths, agent, time), qNext = pointAt(paths, other, time);
+            bool vertex = equal(pNext, qNext);
+            bool swap = time > 0 && !equal(p, pNext) && equal(p, qNext) && equal(q, pNext);
+            if (vertex || swap) {
+                AgentConflict conflict = {other, time};
+                append(found, &conflict);
+            }
+            p = pNext, q = qNext;
+        }
+    }
+}
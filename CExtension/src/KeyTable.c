@@ -0,0 +1,86 @@
+#include "KeyTable.h"
+
+#include <stdlib.h>
+#include <string.h>
+#include <assert.h>
+
+#define MIN_CAPACITY 16
+#define EMPTY -1
+
+static unsigned long long mix(long long key) {
+    unsigned long long h = (unsigned long long)key * 0x9E3779B97F4A7C15ull;
+    return h ^ (h >> 29);
+}
+
+void initKeyTable(KeyTable *table, size_t expected) {
+    int capacity = MIN_CAPACITY;
+    while (capacity < 2 * (int)expected) capacity *= 2;
+    
+    table->keys = malloc(capacity * sizeof(long long));
+    table->values = malloc(capacity * sizeof(int));
+    memset(table->keys, 0xFF, capacity * sizeof(long long)); // all `EMPTY`
+    table->capacity = capacity;
+    table->count = 0;
+}
+
+/// linear probing, index of the slot with the `key` or of the first empty slot
+static int slotFor(long long *keys, int capacity, long long key) {
+    unsigned long long mask = (unsigned long long)capacity - 1;
+    unsigned long long i = mix(key) & mask;
+    while (keys[i] != EMPTY && keys[i] != key)
+        i = (i + 1) & mask;
+    return (int)i;
+}
+
+static void grow(KeyTable *table) {
+    KeyTable bigger;
+    initKeyTable(&bigger, table->capacity);
+    
+    for (int i = 0; i < table->capacity; ++i)
+        if (table->keys[i] != EMPTY) {
+            int slot = slotFor(bigger.keys, bigger.capacity, table->keys[i]);
+            bigger.keys[slot] = table->keys[i];
+            bigger.values[slot] = table->values[i];
+        }
+    
+    bigger.count = table->count;
+    deinitKeyTable(table);
+    *table = bigger;
+}
+
+void putKey(KeyTable *table, long long key, int value) {
+    assert(key >= 0);
+    // keep load factor under 1/2
+    if (2 * (table->count + 1) > table->capacity) grow(table);
+    
+    int slot = slotFor(table->keys, table->capacity, key);
+    if (table->keys[slot] == EMPTY) {
+        table->keys[slot] = key;
+        table->count++;
+    }
+    table->values[slot] = value;
+}
+
+bool hasKey(KeyTable *table, long long key) {
+    if (key < 0) return false;
+    return table->keys[slotFor(table->keys, table->capacity, key)] != EMPTY;
+}
+
+int getValue(KeyTable *table, long long key, int missing) {
+    if (key < 0) return missing;
+    int slot = slotFor(table->keys, table->capacity, key);
+    return table->keys[slot] == EMPTY ? missing : table->values[slot];
+}
+
+void clearKeyTable(KeyTable *table) {
+    if (table->count == 0) return;
+    memset(table->keys, 0xFF, table->capacity * sizeof(long long));
+    table->count = 0;
+}
+
+void deinitKeyTable(KeyTable *table) {
+    free(table->keys);
+    free(table->values);
+    table->keys = NULL;
+    table->values = NULL;
+}
@@ -1,6 +1,7 @@
 #include "Map.h"
 
 #include <stdlib.h>
+#include <limits.h>
 #include <stdbool.h>
 
 int pointCmp(Point p1, Point p2) {
@@ -44,19 +45,85 @@ Map *newMapWithConstraints(int width, int height,
     Map *map = malloc(sizeof(Map));
     map->width = width;
     map->height = height;
-    map->vConstraints = vertexConstraints;
-    map->eConstraints = edgeConstraints;
     map->data = rawBuffer;
+    map->distances = NULL;
+    map->moves = NULL;
+    map->pConstraints = NULL;
+    map->parked = NULL;
+    map->index = NULL;
+    map->cat = NULL;
     
+    setConstraints(map, vertexConstraints, edgeConstraints);
+    return map;
+}
+
+void setConstraints(Map *map, Array *vertexConstraints, Array *edgeConstraints) {
+    map->vConstraints = vertexConstraints;
+    map->eConstraints = edgeConstraints;
+    map->index = NULL;
+    map->sorted = false;
+}
+
+void setPositiveConstraints(Map *map, Array *positiveConstraints) {
+    map->pConstraints = positiveConstraints;
+    map->index = NULL;
+    map->sorted = false;
+}
+
+/// sorts constraint arrays for binary search, searches index constraints instead and never need it
+static void sortConstraints(Map *map) {
+    if (map->sorted) return;
     if (map->vConstraints) sortArray(map->vConstraints, vConstraintCmp);
     if (map->eConstraints) sortArray(map->eConstraints, eConstraintCmp);
-    return map;
+    if (map->pConstraints) sortArray(map->pConstraints, vConstraintCmp);
+    map->sorted = true;
 }
 
-static void swap(Point *p1, Point *p2) {
-    Point temp = *p1;
-    *p1 = *p2;
-    *p2 = temp;
+void setParkedAgents(Map *map, Array *parked) {
+    map->parked = parked;
+    map->index = NULL;
+}
+
+#define EXPECTED_CONSTRAINTS 32
+
+void initConstraintIndex(ConstraintIndex *index) {
+    initKeyTable(&index->vertices, EXPECTED_CONSTRAINTS);
+    initKeyTable(&index->edges, EXPECTED_CONSTRAINTS);
+    initKeyTable(&index->lastTimes, EXPECTED_CONSTRAINTS);
+    initKeyTable(&index->lastMoves, EXPECTED_CONSTRAINTS);
+    initKeyTable(&index->positives, EXPECTED_CONSTRAINTS);
+    initKeyTable(&index->parked, EXPECTED_CONSTRAINTS);
+    index->lastTime = -1;
+    index->lastPositive = -1;
+}
+
+void deinitConstraintIndex(ConstraintIndex *index) {
+    deinitKeyTable(&index->vertices);
+    deinitKeyTable(&index->edges);
+    deinitKeyTable(&index->lastTimes);
+    deinitKeyTable(&index->lastMoves);
+    deinitKeyTable(&index->positives);
+    deinitKeyTable(&index->parked);
+}
+
+static long long cellOf(Map *map, Point p) {
+    return (long long)p.y * map->width + p.x;
+}
+
+static long long vertexKey(Map *map, int time, Point p) {
+    if (time < 0) return -1;
+    return (long long)time * map->width * map->height + cellOf(map, p);
+}
+
+/// `p1` and `p2` must be in sorted order, edges with not adjacent ends get `-1` key
+static long long edgeKey(Map *map, int time, Point p1, Point p2) {
+    int direction;
+    if (p2.x == p1.x + 1 && p2.y == p1.y) direction = 0;
+    else if (p2.x == p1.x && p2.y == p1.y + 1) direction = 1;
+    else return -1;
+    
+    long long vertex = vertexKey(map, time, p1);
+    return vertex < 0 ? -1 : vertex * 2 + direction;
 }
 
 static bool boundsCheck(Map *map, Point p) {
@@ -65,13 +132,160 @@ static bool boundsCheck(Map *map, Point p) {
     return xOk && yOk;
 }
 
+/// directions of moves in the order of bits in `map->moves`
+static const Point directions[] = { {0, 1}, {0, -1}, {1, 0}, {-1, 0} };
+
+static void updateLastMove(Map *map, ConstraintIndex *index, Point from, int time) {
+    long long cell = cellOf(map, from);
+    if (time > getValue(&index->lastMoves, cell, -1)) putKey(&index->lastMoves, cell, time);
+}
+
+void indexConstraints(Map *map, ConstraintIndex *index) {
+    clearKeyTable(&index->vertices);
+    clearKeyTable(&index->edges);
+    clearKeyTable(&index->lastTimes);
+    clearKeyTable(&index->lastMoves);
+    clearKeyTable(&index->positives);
+    clearKeyTable(&index->parked);
+    index->lastTime = -1;
+    index->lastPositive = -1;
+    
+    int count = map->vConstraints ? countArray(map->vConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *vc = getElement(map->vConstraints, i);
+        putKey(&index->vertices, vertexKey(map, vc->time, vc->p), 1);
+        
+        long long cell = cellOf(map, vc->p);
+        if (vc->time > getValue(&index->lastTimes, cell, -1))
+            putKey(&index->lastTimes, cell, vc->time);
+        if (vc->time > index->lastTime) index->lastTime = vc->time;
+        // moves to the cell from its neighbors
+        for (int d = 0; d < 4; ++d) {
+            Point from = {vc->p.x + directions[d].x, vc->p.y + directions[d].y};
+            if (boundsCheck(map, from)) updateLastMove(map, index, from, vc->time);
+        }
+    }
+    
+    count = map->eConstraints ? countArray(map->eConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        EConstraint *ec = getElement(map->eConstraints, i);
+        long long key = edgeKey(map, ec->time, ec->e.p1, ec->e.p2);
+        if (key >= 0) putKey(&index->edges, key, 1);
+        // edge constraint at `time` forbids the moves which end at `time + 1`
+        updateLastMove(map, index, ec->e.p1, ec->time + 1);
+        updateLastMove(map, index, ec->e.p2, ec->time + 1);
+        if (ec->time + 1 > index->lastTime) index->lastTime = ec->time + 1;
+    }
+    
+    count = map->pConstraints ? countArray(map->pConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *pc = getElement(map->pConstraints, i);
+        putKey(&index->positives, pc->time, (int)cellOf(map, pc->p));
+        if (pc->time > index->lastTime) index->lastTime = pc->time;
+        if (pc->time > index->lastPositive) index->lastPositive = pc->time;
+    }
+    
+    count = map->parked ? countArray(map->parked) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *parked = getElement(map->parked, i);
+        long long cell = cellOf(map, parked->p);
+        int from = getValue(&index->parked, cell, -1);
+        if (from < 0 || parked->time < from) putKey(&index->parked, cell, parked->time);
+        if (parked->time > index->lastTime) index->lastTime = parked->time;
+    }
+    
+    map->index = index;
+}
+
+void initConflictAvoidanceTable(ConflictAvoidanceTable *cat) {
+    initKeyTable(&cat->occupied, EXPECTED_CONSTRAINTS);
+    initKeyTable(&cat->parked, EXPECTED_CONSTRAINTS);
+}
+
+void clearConflictAvoidanceTable(ConflictAvoidanceTable *cat) {
+    clearKeyTable(&cat->occupied);
+    clearKeyTable(&cat->parked);
+}
+
+void deinitConflictAvoidanceTable(ConflictAvoidanceTable *cat) {
+    deinitKeyTable(&cat->occupied);
+    deinitKeyTable(&cat->parked);
+}
+
+void setConflictAvoidanceTable(Map *map, ConflictAvoidanceTable *cat) {
+    map->cat = cat;
+}
+
+void addToConflictAvoidanceTable(Map *map, const Point *path, int length) {
+    ConflictAvoidanceTable *cat = map->cat;
+    if (length <= 0) return;
+    for (int t = 0; t < length - 1; ++t) {
+        long long key = vertexKey(map, t, path[t]);
+        putKey(&cat->occupied, key, getValue(&cat->occupied, key, 0) + 1);
+    }
+    putKey(&cat->parked, cellOf(map, path[length - 1]), length - 1);
+}
+
+int countConflicts(Map *map, int time, Point p) {
+    if (!map->cat) return 0;
+    int count = getValue(&map->cat->occupied, vertexKey(map, time, p), 0);
+    int parked = getValue(&map->cat->parked, cellOf(map, p), -1);
+    return count + (parked >= 0 && time >= parked);
+}
+
+void setDistances(Map *map, const int *distances) {
+    map->distances = distances;
+}
+
+static void swap(Point *p1, Point *p2) {
+    Point temp = *p1;
+    *p1 = *p2;
+    *p2 = temp;
+}
+
+static bool isFree(Map *map, Point p) {
+    return boundsCheck(map, p) && map->data[p.y * map->width + p.x] == 0;
+}
+
+void precomputeMoves(Map *map) {
+    if (!map->moves) map->moves = malloc(map->width * map->height);
+    for (int y = 0; y < map->height; ++y)
+        for (int x = 0; x < map->width; ++x) {
+            unsigned char moves = 0;
+            for (int i = 0; i < 4; ++i) {
+                Point res = {x + directions[i].x, y + directions[i].y};
+                if (isFree(map, res)) moves |= 1 << i;
+            }
+            map->moves[y * map->width + x] = moves;
+        }
+}
+
+/// time from which some agent stays at the point `p` forever, `-1` if none does
+static int parkedSince(Map *map, Point p) {
+    if (!map->parked) return -1;
+    if (map->index) return getValue(&map->index->parked, cellOf(map, p), -1);
+    int since = -1;
+    int count = map->parked ? countArray(map->parked) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *parked = getElement(map->parked, i);
+        if (pointCmp(parked->p, p) == 0 && (since < 0 || parked->time < since)) since = parked->time;
+    }
+    return since;
+}
+
 static bool notInVConstraints(Map *map, int time, Point p) {
+    int parked = parkedSince(map, p);
+    if (parked >= 0 && time >= parked) return false;
+    if (map->index) return !hasKey(&map->index->vertices, vertexKey(map, time, p));
+    sortConstraints(map);
     VConstraint toFind = {time, p};
     return !map->vConstraints || searchArray(map->vConstraints, &toFind, vConstraintCmp, true) == ARRAY_NOT_FOUND;
 }
 static bool notInEConstraints(Map *map, int time, Point p1, Point p2) {
     if (pointCmp(p1, p2) > 0) // in unsorted order, swap
         swap(&p1, &p2);
+    if (map->index) return !hasKey(&map->index->edges, edgeKey(map, time - 1, p1, p2));
+    sortConstraints(map);
     EConstraint toFind = {time - 1, {p1, p2}};
     // the only difference and    ^^^^^^  reason why we can't have one type of constraints
     return !map->eConstraints || searchArray(map->eConstraints, &toFind, eConstraintCmp, true) == ARRAY_NOT_FOUND;
@@ -80,31 +294,107 @@ static bool notInConstraints(Map *map, int time, Point current, Point dest) {
     return notInVConstraints(map, time, dest) && notInEConstraints(map, time, current, dest);
 }
 
+/// cell where the agent must be at `time`, `-1` if it may be anywhere
+static long long requiredCell(Map *map, int time) {
+    if (map->index) return getValue(&map->index->positives, time, -1);
+    int count = map->pConstraints ? countArray(map->pConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *pc = getElement(map->pConstraints, i);
+        if (pc->time == time) return cellOf(map, pc->p);
+    }
+    return -1;
+}
+
+int getLastConstrainedTime(Map *map) {
+    if (map->index) return map->index->lastTime;
+    // arrays are sorted by time
+    sortConstraints(map);
+    int last = -1, count;
+    if (map->vConstraints && (count = countArray(map->vConstraints)) > 0)
+        last = ((VConstraint*)getElement(map->vConstraints, count - 1))->time;
+    if (map->eConstraints && (count = countArray(map->eConstraints)) > 0) {
+        int time = ((EConstraint*)getElement(map->eConstraints, count - 1))->time + 1;
+        if (time > last) last = time;
+    }
+    if (map->pConstraints && (count = countArray(map->pConstraints)) > 0) {
+        int time = ((VConstraint*)getElement(map->pConstraints, count - 1))->time;
+        if (time > last) last = time;
+    }
+    // parked agents are not sorted
+    count = map->parked ? countArray(map->parked) : 0;
+    for (int i = 0; i < count; ++i) {
+        int time = ((VConstraint*)getElement(map->parked, i))->time;
+        if (time > last) last = time;
+    }
+    return last;
+}
+
+/// the last time when a move from `p` to one of its neighbors is constrained, `-1` if none is
+static int lastMoveTime(Map *map, Point p) {
+    if (map->index) return getValue(&map->index->lastMoves, cellOf(map, p), -1);
+    int last = -1;
+    int count = map->vConstraints ? countArray(map->vConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *vc = getElement(map->vConstraints, i);
+        if (abs(vc->p.x - p.x) + abs(vc->p.y - p.y) == 1 && vc->time > last) last = vc->time;
+    }
+    count = map->eConstraints ? countArray(map->eConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        EConstraint *ec = getElement(map->eConstraints, i);
+        bool isEnd = pointCmp(ec->e.p1, p) == 0 || pointCmp(ec->e.p2, p) == 0;
+        if (isEnd && ec->time + 1 > last) last = ec->time + 1;
+    }
+    return last;
+}
+
+static int lastPositiveTime(Map *map) {
+    if (map->index) return map->index->lastPositive;
+    int last = -1;
+    int count = map->pConstraints ? countArray(map->pConstraints) : 0;
+    for (int i = 0; i < count; ++i) {
+        VConstraint *pc = getElement(map->pConstraints, i);
+        if (pc->time > last) last = pc->time;
+    }
+    return last;
+}
+
 int getNeighbors(Map *map, int time, Point p, bool isGoal, Point storage[5]) {
     int k = 0;
-    bool atLeastOneIsConstrained = false;
-    Point d[] = { {0, 1}, {0, -1}, {1, 0}, {-1, 0} };
+    unsigned char moves = map->moves ? map->moves[p.y * map->width + p.x] : 0;
     for (int i = 0; i < 4; ++i) {
-        Point res = {p.x + d[i].x, p.y + d[i].y};
-        if (boundsCheck(map, res) && map->data[res.y * map->width + res.x] == 0) {
-            // in bounds and there are no walls in this place
-            if (notInConstraints(map, time, p, res))
-                // no vertex constraints or edge constraints
-                storage[k++] = res;
-            else
-                atLeastOneIsConstrained = true;
-        }
+        Point res = {p.x + directions[i].x, p.y + directions[i].y};
+        bool canMove = map->moves ? (moves >> i) & 1 : isFree(map, res);
+        // in bounds and there are no walls in this place
+        // and no vertex constraints or edge constraints
+        if (canMove && notInConstraints(map, time, p, res))
+            storage[k++] = res;
     }
     
     // Respect to Maxim!
     // if not around constriaints then we should definetly move,
     // only otherwise may we stay on the same position, if not constrained
     //
+    // "around" is in space, but not only now: a move from here may be constrained later,
+    // and the agent may have to start waiting before it, when the moves it could make instead
+    // lead to other constrained places (a wait no such move follows can always go after the next move)
+    //
     // ps. If the node is already a goal node (but in lesser time than we want)
     // then we may also not move frome it
-    if ((atLeastOneIsConstrained || isGoal) && notInVConstraints(map, time, p))
+    //
+    // with positive constraints ahead the agent may have to wait to be at the right place in time
+    bool mayWait = isGoal || time <= lastMoveTime(map, p) || time <= lastPositiveTime(map);
+    if (mayWait && notInVConstraints(map, time, p))
         storage[k++] = p;
     
+    // the agent must be at some place at this time, drop the others
+    long long required = requiredCell(map, time);
+    if (required >= 0) {
+        int kept = 0;
+        for (int i = 0; i < k; ++i)
+            if (cellOf(map, storage[i]) == required) storage[kept++] = storage[i];
+        k = kept;
+    }
+    
     return k;
 }
 
@@ -120,13 +410,27 @@ static void findMax(void *p, void *acc) {
         s->maxSoFar = vc->time;
 }
 
+static void findMaxElsewhere(void *p, void *acc) {
+    VConstraint *vc = (VConstraint*)p;
+    SearchHelper *s = (SearchHelper*)acc;
+    if ((vc->p.x != s->g.x || vc->p.y != s->g.y) && vc->time > s->maxSoFar)
+        s->maxSoFar = vc->time;
+}
+
 int getGoalTimeBoundary(Map *map, Point g) {
+    // the agent can't stay at the goal taken by another one
+    if (parkedSince(map, g) >= 0) return INT_MAX;
+    
     SearchHelper acc = {g, .maxSoFar = -1};
-    if (map->vConstraints) mapArray(map->vConstraints, findMax, &acc);
+    if (map->index) acc.maxSoFar = getValue(&map->index->lastTimes, cellOf(map, g), -1);
+    else if (map->vConstraints) mapArray(map->vConstraints, findMax, &acc);
+    // the agent must visit the points of positive constraints before it finishes
+    if (map->pConstraints) mapArray(map->pConstraints, findMaxElsewhere, &acc);
     return acc.maxSoFar;
 }
 
 void deleteMap(Map *map) {
     map->data = NULL;
+    free(map->moves);
     free(map);
 }
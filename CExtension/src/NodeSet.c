@@ -0,0 +1,116 @@
+#include "NodeSet.h"
+
+#include <stdlib.h>
+#include <limits.h>
+#include <string.h>
+#include <assert.h>
+
+#define MIN_CAPACITY 16
+
+/// time of the node as the set sees it, all times after `lastTime` are one
+static int keyTime(const Node *node, int lastTime) {
+    return node->g > lastTime ? lastTime + 1 : node->g;
+}
+
+/// mixes `x`, `y` and `t` into one value, spreading close cells of the grid far from each other
+static unsigned spaceTimeHash(const Node *node, int lastTime) {
+    unsigned h = (unsigned)node->p.x * 0x9E3779B1u;
+    h ^= (unsigned)node->p.y * 0x85EBCA77u;
+    h ^= (unsigned)keyTime(node, lastTime) * 0xC2B2AE3Du;
+    h ^= h >> 15;
+    h *= 0x2C1B3C6Du;
+    h ^= h >> 13;
+    return h;
+}
+
+static bool sameSpaceTime(const Node *node1, const Node *node2, int lastTime) {
+    return keyTime(node1, lastTime) == keyTime(node2, lastTime) && node1->p.x == node2->p.x && node1->p.y == node2->p.y;
+}
+
+void initNodeSet(NodeSet *set, size_t expected) {
+    int capacity = MIN_CAPACITY;
+    while (capacity < 2 * (int)expected) capacity *= 2;
+    
+    set->slots = calloc(capacity, sizeof(Node*));
+    set->capacity = capacity;
+    set->count = 0;
+    set->lastTime = INT_MAX;
+}
+
+NodeSet *newNodeSet(size_t expected) {
+    NodeSet *set = malloc(sizeof(NodeSet));
+    initNodeSet(set, expected);
+    return set;
+}
+
+int countNodeSet(NodeSet *set) { return set->count; }
+
+/// linear probing, returns the slot with the node equal to `node` or the first empty slot
+static Node **slotFor(Node **slots, int capacity, int lastTime, const Node *node) {
+    unsigned mask = (unsigned)capacity - 1;
+    unsigned i = spaceTimeHash(node, lastTime) & mask;
+    while (slots[i] && !sameSpaceTime(slots[i], node, lastTime))
+        i = (i + 1) & mask;
+    return slots + i;
+}
+
+static void grow(NodeSet *set) {
+    int capacity = set->capacity * 2;
+    Node **slots = calloc(capacity, sizeof(Node*));
+    assert(slots);
+    
+    for (int i = 0; i < set->capacity; ++i)
+        if (set->slots[i])
+            *slotFor(slots, capacity, set->lastTime, set->slots[i]) = set->slots[i];
+    
+    free(set->slots);
+    set->slots = slots;
+    set->capacity = capacity;
+}
+
+bool addToNodeSet(NodeSet *set, Node *node) {
+    assert(node);
+    // keep load factor under 1/2
+    if (2 * (set->count + 1) > set->capacity) grow(set);
+    
+    Node **slot = slotFor(set->slots, set->capacity, set->lastTime, node);
+    if (*slot) return false;
+    
+    *slot = node;
+    set->count++;
+    return true;
+}
+
+Node *searchNodeSet(NodeSet *set, const Node *node) {
+    assert(node);
+    return *slotFor(set->slots, set->capacity, set->lastTime, node);
+}
+
+void mapNodeSet(NodeSet *set, MapFunction map, void *auxData) {
+    assert(map);
+    for (int i = 0; i < set->capacity; ++i)
+        if (set->slots[i])
+            map(set->slots + i, auxData);
+}
+
+void mergeTimesAfter(NodeSet *set, int time) {
+    assert(set->count == 0);
+    set->lastTime = time;
+}
+
+void clearNodeSet(NodeSet *set) {
+    set->lastTime = INT_MAX;
+    if (set->count == 0) return;
+    memset(set->slots, 0, set->capacity * sizeof(Node*));
+    set->count = 0;
+}
+
+void deinitNodeSet(NodeSet *set) {
+    free(set->slots);
+    set->slots = NULL;
+}
+
+void deleteNodeSet(NodeSet *set) {
+    deinitNodeSet(set);
+    free(set);
+}
@@ -4,72 +4,110 @@
 #include <string.h>
 #include <assert.h>
 
-#define getElem(q, i) (char*)q->nodes + q->width * (i)
+#define getElem(q, i) ((char*)q->nodes + q->width * (i))
 
 PriorityQueue *newQueue(size_t width, size_t capacity, CompareFunction cmp) {
     assert(capacity > 0);
     PriorityQueue *q = malloc(sizeof(PriorityQueue));
     q->nodes = calloc(capacity, width);
+    q->stamps = calloc(capacity, sizeof(size_t));
+    q->hole = malloc(width);
     q->capacity = capacity;
     q->width = width;
     q->size = 0;
+    q->inserted = 0;
+    q->peak = 0;
     q->cmp = cmp;
     return q;
 }
 
-bool dequeue(PriorityQueue *q, void *storage) {
-    assert(storage);
-    if (q->size == 0) return false;
-    q->size--;
-    memcpy(storage, getElem(q, q->size), q->width);
-    return true;
-}
-
 static void grow(PriorityQueue *q) {
     void *reallocated = realloc(q->nodes, q->width * q->capacity * 2);
     assert(reallocated);
-    q->capacity *= 2;
     q->nodes = reallocated;
+    
+    reallocated = realloc(q->stamps, sizeof(size_t) * q->capacity * 2);
+    assert(reallocated);
+    q->stamps = reallocated;
+    
+    q->capacity *= 2;
 }
 
-static int binarySearch(PriorityQueue *q, const void *target) {
-    int a = 0, b = (int)q->size, m;
-    do {
-        m = (a + b) / 2;
-        int cmp = q->cmp(getElem(q, m), target);
-        if (cmp < 0) a = m + 1;
-        else if (cmp > 0) b = m;
-        else break;
-        m = a;
-    } while (a != b);
-    
-    // we want to insert equal value to the rightmost index
-    // so it will be extracted first
-    while (m < b && q->cmp(getElem(q, m), target) == 0) ++m;
-    // no, we don't
-    // yes we do
+/// `true` if the `elem` with insertion `stamp` should be drawn before the element at index `i`
+/// equal elements are ordered by their stamps, so the last inserted goes first
+static bool before(PriorityQueue *q, const void *elem, size_t stamp, size_t i) {
+    int cmp = q->cmp(elem, getElem(q, i));
+    if (cmp != 0) return cmp > 0;
+    return stamp > q->stamps[i];
+}
+
+static void put(PriorityQueue *q, size_t i, const void *elem, size_t stamp) {
+    memcpy(getElem(q, i), elem, q->width);
+    q->stamps[i] = stamp;
+}
+
+bool dequeue(PriorityQueue *q, void *storage) {
+    assert(storage);
+    if (q->size == 0) return false;
+    memcpy(storage, getElem(q, 0), q->width);
+    q->size--;
+    if (q->size == 0) return true;
     
-    return m;
+    // sift the last element down from the root, moving the hole instead of swapping
+    memcpy(q->hole, getElem(q, q->size), q->width);
+    size_t stamp = q->stamps[q->size];
+    size_t i = 0;
+    while (2 * i + 1 < q->size) {
+        size_t child = 2 * i + 1;
+        if (child + 1 < q->size && before(q, getElem(q, child + 1), q->stamps[child + 1], child))
+            ++child;
+        if (before(q, q->hole, stamp, child)) break;
+        put(q, i, getElem(q, child), q->stamps[child]);
+        i = child;
+    }
+    put(q, i, q->hole, stamp);
+    return true;
+}
+
+bool peek(PriorityQueue *q, void *storage) {
+    assert(storage);
+    if (q->size == 0) return false;
+    memcpy(storage, getElem(q, 0), q->width);
+    return true;
 }
 
 void enqueue(PriorityQueue *q, const void *node) {
     if (q->size == q->capacity) grow(q);
     
-    if (q->size == 0) {
-        memcpy(getElem(q, q->size), node, q->width);
-        q->size++;
-        return;
+    size_t stamp = q->inserted++;
+    size_t i = q->size++;
+    if (q->size > q->peak) q->peak = q->size;
+    while (i > 0) {
+        size_t parent = (i - 1) / 2;
+        if (!before(q, node, stamp, parent)) break;
+        put(q, i, getElem(q, parent), q->stamps[parent]);
+        i = parent;
     }
-    
-    int paste = binarySearch(q, node);
-    
-    memmove(getElem(q, paste + 1), getElem(q, paste), q->width * (q->size - paste));
-    memcpy(getElem(q, paste), node, q->width);
-    
-    q->size++;
+    put(q, i, node, stamp);
+}
+
+size_t countInserted(PriorityQueue *q) {
+    return q->inserted;
+}
+
+size_t peakSize(PriorityQueue *q) {
+    return q->peak;
+}
+
+void clearQueue(PriorityQueue *q) {
+    q->size = 0;
+    q->inserted = 0;
+    q->peak = 0;
 }
 
 void deleteQueue(PriorityQueue *q) {
     free(q->nodes);
+    free(q->stamps);
+    free(q->hole);
     free(q);
 }
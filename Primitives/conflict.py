@@ -8,23 +8,37 @@ class Conflict:
     agent_ids: tuple[int, int]
     time: int
 
-    def produce_constraint(self, agent_id: int) -> Constraint: 
+    def produce_constraint(self, agent_id: int, positive=False) -> Constraint: 
         ...
 
+    def split(self, disjoint=False) -> list[Constraint]:
+        """
+        Constraints for the children of a node with this conflict: negative ones for both agents,
+        or with `disjoint` positive and negative ones for the first agent, so the children share no solutions
+        """
+        if disjoint:
+            agent_id = self.agent_ids[0]
+            return [self.produce_constraint(agent_id, positive=True), self.produce_constraint(agent_id)]
+        return [self.produce_constraint(agent_id) for agent_id in self.agent_ids]
+
 
 @dataclass
 class VertexConflict(Conflict):
     point: Point
 
-    def produce_constraint(self, agent_id: int) -> Constraint:
+    def produce_constraint(self, agent_id: int, positive=False) -> Constraint:
         assert agent_id in self.agent_ids
-        return VertexConstraint(agent_id, self.time, self.point)
+        return VertexConstraint(agent_id, self.time, self.point, positive)
 
 
 @dataclass
 class EdgeConflict(Conflict):
+    """ The first agent moves along the `edge` from `time` to `time + 1`, the second one moves backwards """
     edge: Edge
 
-    def produce_constraint(self, agent_id: int) -> Constraint:
+    def produce_constraint(self, agent_id: int, positive=False) -> Constraint:
         assert agent_id in self.agent_ids
-        return EdgeConstraint(agent_id, self.time, self.edge)
+        if not positive:
+            return EdgeConstraint(agent_id, self.time, tuple(sorted(self.edge))) # type: ignore
+        edge = self.edge if agent_id == self.agent_ids[0] else self.edge[::-1]
+        return EdgeConstraint(agent_id, self.time, edge, positive) # type: ignore
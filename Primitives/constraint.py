@@ -5,23 +5,81 @@ from dataclasses import dataclass
 
 @dataclass(frozen=True)
 class Constraint:
+    """
+    Negative constraint forbids the agent something at the `time`, positive one demands it
+
+    Positive constraint of one agent is a negative one for every other agent, see `implied_for`
+    """
     agent_id: int
     time: int
 
+    positive = False
+
     def __array__(self): ...
 
+    def parts(self) -> list['Constraint']:
+        """ Vertex and edge constraints this one consists of """
+        return [self]
+
+    def visits(self) -> list['VertexConstraint']:
+        """ Positive vertex constraints the agent must satisfy to satisfy this positive one """
+        ...
+
+    def implied_for(self, agent_id: int) -> list['Constraint']:
+        """ Negative constraints on another agent following from this positive one """
+        ...
+
 
 @dataclass(frozen=True)
 class VertexConstraint(Constraint):
     point: Point
+    positive: bool = False
 
     def __array__(self):
         return np.array([self.time, *self.point])
 
+    def visits(self) -> list['VertexConstraint']:
+        return [self]
+
+    def implied_for(self, agent_id: int) -> list[Constraint]:
+        return [VertexConstraint(agent_id, self.time, self.point)]
+
 
 @dataclass(frozen=True)
 class EdgeConstraint(Constraint):
+    """ Negative edge constraint has its edge in sorted order, positive one in the direction of the move """
     edge: Edge
+    positive: bool = False
 
     def __array__(self):
         return np.array([self.time, *self.edge[0], *self.edge[1]])
+
+    def visits(self) -> list[VertexConstraint]:
+        return [
+            VertexConstraint(self.agent_id, self.time, self.edge[0], positive=True),
+            VertexConstraint(self.agent_id, self.time + 1, self.edge[1], positive=True)
+        ]
+
+    def implied_for(self, agent_id: int) -> list[Constraint]:
+        return [
+            VertexConstraint(agent_id, self.time, self.edge[0]),
+            VertexConstraint(agent_id, self.time + 1, self.edge[1]),
+            EdgeConstraint(agent_id, self.time, tuple(sorted(self.edge))) # type: ignore
+        ]
+
+
+@dataclass(frozen=True)
+class BarrierConstraint(Constraint):
+    """
+    Negative constraint on many vertices at once, each at its own time, used for symmetric conflicts:
+    barriers of rectangles and ranges of times at the ends of corridors
+
+    - vertices: pairs of time and point
+    """
+    vertices: tuple[tuple[int, Point], ...]
+
+    def __array__(self):
+        return np.array([[t, *p] for t, p in self.vertices])
+
+    def parts(self) -> list[Constraint]:
+        return [VertexConstraint(self.agent_id, t, p) for t, p in self.vertices]
@@ -0,0 +1,46 @@
+import os
+import hashlib
+import numpy as np
+from typing import Callable, Optional
+
+
+def load_cached(filename: str, parse: Callable[[bytes], np.ndarray], cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Array `parse` makes of the contents of the file, kept in `cache_dir` as `.npy` between the runs
+
+    The cached array is used while the file has the same size and modification time as when it was parsed,
+    they are in the name of the cache entry, so a changed file is parsed again and its old entry is removed.
+    Processes may share the cache directory, each one writes its own temporary file and moves it in place
+
+    - cache_dir: directory of the cache, created if needed, `None` to parse the file every time
+    """
+    if cache_dir is None:
+        with open(filename, 'rb') as file:
+            return parse(file.read())
+
+    stat = os.stat(filename)
+    # files with the same name in different folders get different entries
+    prefix = f"{os.path.basename(filename)}-{hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:16]}-"
+    entry = f"{prefix}{stat.st_size}-{stat.st_mtime_ns}.npy"
+    path = os.path.join(cache_dir, entry)
+
+    try:
+        return np.load(path)
+    except (OSError, ValueError):
+        pass # no entry yet or a broken one, made again below
+
+    with open(filename, 'rb') as file:
+        array = parse(file.read())
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        np.save(file, array)
+    os.replace(temporary, path)
+
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith('.npy') and name != entry:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass # removed by another process
+    return array
@@ -1,6 +1,9 @@
 import numpy as np
+from typing import Optional
 from collections import namedtuple
 
+from .file_cache import load_cached
+
 Point = tuple[int, int]
 Edge = tuple[Point, Point]
 
@@ -12,21 +15,19 @@ class Map:
     1 - for wall, 0 - for traversable path
     """
 
-    def read_map(self, filename: str):
+    def read_map(self, filename: str, cache_dir: Optional[str] = None):
         """
         Read the map file and fill bool array
         it considers '.' symbol as traversable and everything else as wall
 
         :param filename: name of the file
+        :param cache_dir: optional directory to keep the parsed cells in, see `load_cached`
         """
-        with open(filename, 'r') as file:
-            lines = file.readlines()
-        self.height = int(lines[1].split()[1])
-        self.width = int(lines[2].split()[1])
-        self._init_cells(lines[4:])
-    
-    def read_txt(self, lines: list[str]):
-        """ Does the same as `read_from_map` but now reads from lines in special format (instances folder) """
+        self.cells = load_cached(filename, _parse_map, cache_dir)
+        self.height, self.width = self.cells.shape
+
+    def read_txt(self, lines: list):
+        """ Does the same as `read_from_map` but now reads from lines (str or bytes) in special format (instances folder) """
 
         self.height, self.width = map(int, lines[0].split())
         self._init_cells(lines[1:self.height + 1], skip_spaces=True)
@@ -39,14 +40,27 @@ class Map:
         self.width = len(lines[0])
         self._init_cells(lines)
 
-    def _init_cells(self, lines: list[str], skip_spaces=False):
-        self.cells = np.zeros((self.height, self.width), dtype=np.int8)
-        assert len(lines) == self.height, 'height of the map should match given height'
-        for i, line in enumerate(lines):
-            j = 0
-            for c in line.strip():
-                if skip_spaces and c == ' ': continue
-                self.cells[i, j] = (c != '.')
-                j += 1
-
-            assert j == self.width, 'width of each row should match given width'
+    def _init_cells(self, lines: list, skip_spaces=False):
+        self.cells = _cells(lines, self.height, self.width, skip_spaces)
+
+
+def _cells(lines: list, height: int, width: int, skip_spaces=False) -> np.ndarray:
+    """ Cells of the map from its rows, all rows are joined and compared with '.' at once """
+    rows = [line.encode() if isinstance(line, str) else line for line in lines]
+    rows = [row.strip() for row in rows]
+    if skip_spaces: rows = [row.replace(b' ', b'') for row in rows]
+
+    assert len(rows) == height, 'height of the map should match given height'
+    assert all(len(row) == width for row in rows), 'width of each row should match given width'
+    chars = np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(height, width)
+    return (chars != ord('.')).astype(np.int8)
+
+
+def _parse_map(data: bytes) -> np.ndarray:
+    """ Cells of the map in the MovingAI format: type, height, width, 'map' and the rows """
+    lines = data.splitlines()
+    height = int(lines[1].split()[1])
+    width = int(lines[2].split()[1])
+    rows = lines[4:]
+    while len(rows) > height and not rows[-1].strip(): rows.pop() # empty lines at the end
+    return _cells(rows, height, width)
@@ -0,0 +1,37 @@
+import numpy as np
+from numpy import ndarray
+
+
+class MDD:
+    """
+    Multi-valued decision diagram of an agent, cells of all layers in one array
+
+    - cells: 2d ndarray with cells of all layers one after another (rows for cells, 2 columns for x and y)
+    - offsets: 1d ndarray, layer `t` takes rows from `offsets[t]` to `offsets[t + 1]` in `cells`
+
+    Indexing and iteration give layers as views into `cells`, like the list of layers did
+    """
+
+    __slots__ = ('cells', 'offsets')
+
+    def __init__(self, cells: ndarray, offsets: ndarray) -> None:
+        self.cells = cells
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, time: int) -> ndarray:
+        return self.cells[self.offsets[time]:self.offsets[time + 1]]
+
+    def __iter__(self):
+        return (self[t] for t in range(len(self)))
+
+    def widths(self) -> ndarray:
+        """ Number of cells in each layer """
+        return np.diff(self.offsets)
+
+    def singletons(self) -> ndarray:
+        """ Cells of the layers with only one cell as `x << 32 | y`, -1 for the wider layers """
+        first = self.cells[self.offsets[:-1]].astype(np.int64)
+        return np.where(self.widths() == 1, first[:, 0] << 32 | first[:, 1], -1)
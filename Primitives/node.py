@@ -1,60 +1,147 @@
-from copy import deepcopy
+import numpy as np
+from typing import Optional
+
 from .solution import Solution
-from .constraint import Constraint, VertexConstraint, EdgeConstraint
+from .constraint import Constraint, VertexConstraint, EdgeConstraint, BarrierConstraint
+
+_NoVertexConstraints = np.empty((0, 3), dtype=np.int32)
+_NoEdgeConstraints = np.empty((0, 5), dtype=np.int32)
 
 
 class Node:
     """
     Node for the CBS Algorithm
 
-    - vertexConstraints: mapping from agent index to all vertex constraints on that agent, readonly
-    - edgeConstraints: mapping from agent index to all edge constraints on that agent, readonly
+    Constraints are stored as a tree: each node knows its parent and the one constraint it added to the parent's ones
+
+    - parent: node this one was copied from, `None` for the root, readonly
+    - constraint: constraint added to the parent's ones, `None` for the root, readonly
+    - vertexConstraints: all vertex constraints of the node, collected on first access, readonly
+    - edgeConstraints: all edge constraints of the node, collected on first access, readonly
 
     - solutions: list of solutions for all agents, readonly, modify using `update_solution_for` method
+        solutions themselves are shared between a node and its copies, so they must never be changed in place
     - cost: summary cost of all solutions, readonly
+    - lower_bound: summary lower bound of all solutions, equals `cost` unless the paths may be longer than the shortest ones
     - time: time needed for all agents to complete their paths, just max time over all solutions
+
+    - conflict_table: sorted conflict times for every pair of conflicting agents `(i, j)` with `i < j`,
+        `None` until computed by `Algorithms.utils.conflict_table`, copies take it from the parent
+    - replanned: agents whose solutions changed since the `conflict_table` was computed
+    - cardinal_graph: graph of agents with meeting singleton MDD layers and its cover, 
+        `None` until computed by `Algorithms.cbsh.cardinal_graph`
     """
 
     def __init__(self, initial_solutions: list[Solution]) -> None:
         assert initial_solutions
-        self.vertexConstraints: frozenset[VertexConstraint] = frozenset()
-        self.edgeConstraints: frozenset[EdgeConstraint] = frozenset()
+        self.parent: Optional[Node] = None
+        self.constraint: Optional[Constraint] = None
+        self.depth = 0
+        # order independent, so nodes with the same constraints added in different order are equal
+        # constraints on one branch are all different: replanned agent never violates its constraints
+        self._hash = 0
 
-        # self._all_constraints: frozenset[Constraint] = frozenset()
+        self._vertex_constraints: Optional[frozenset[VertexConstraint]] = None
+        self._edge_constraints: Optional[frozenset[EdgeConstraint]] = None
+        self._arrays: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+        self.conflict_table: Optional[dict[tuple[int, int], list[int]]] = None
+        self.replanned: set[int] = set()
+        self.cardinal_graph: Optional[object] = None
 
         self.solutions = initial_solutions
         self.cost = sum(map(lambda sol: sol.cost, self.solutions))
+        self.lower_bound = sum(map(lambda sol: sol.lower_bound, self.solutions))
         self.time = max(map(lambda sol: sol.cost, self.solutions))
 
     def make_copy(self, new_constraint: Constraint) -> 'Node':
-        node = Node(deepcopy(self.solutions))
-        # node.cost = self.cost
-
-        if isinstance(new_constraint, VertexConstraint):
-            node.vertexConstraints = self.vertexConstraints.union([new_constraint])
-            node.edgeConstraints = self.edgeConstraints
-        elif isinstance(new_constraint, EdgeConstraint):
-            node.vertexConstraints = self.vertexConstraints
-            node.edgeConstraints = self.edgeConstraints.union([new_constraint])
-        else:
+        if not isinstance(new_constraint, (VertexConstraint, EdgeConstraint, BarrierConstraint)):
             raise TypeError("Unexpected Constraint type")
 
+        # copy only the list, `update_solution_for` replaces the entry of the replanned agent
+        # and leaves the parent's one untouched
+        node = Node(list(self.solutions))
+        node.parent = self
+        node.constraint = new_constraint
+        node.depth = self.depth + 1
+        node._hash = (self._hash + hash(new_constraint)) & 0xFFFFFFFFFFFFFFFF
+        node.conflict_table = self.conflict_table
+        node.replanned = set(self.replanned)
+
         return node
 
+    @property
+    def vertexConstraints(self) -> frozenset[VertexConstraint]:
+        if self._vertex_constraints is None:
+            self._collect_constraints()
+        return self._vertex_constraints # type: ignore
+
+    @property
+    def edgeConstraints(self) -> frozenset[EdgeConstraint]:
+        if self._edge_constraints is None:
+            self._collect_constraints()
+        return self._edge_constraints # type: ignore
+
+    def _collect_constraints(self):
+        constraints = [part for node in self._branch() for part in node.constraint.parts()] # type: ignore
+        self._vertex_constraints = frozenset(c for c in constraints if isinstance(c, VertexConstraint))
+        self._edge_constraints = frozenset(c for c in constraints if isinstance(c, EdgeConstraint))
+
+    def _branch(self):
+        """ All nodes from this one up to the root, excluding the root """
+        node = self
+        while node.parent is not None:
+            yield node
+            node = node.parent
+
+    def constraints_for(self, agent_id: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vertex, edge and positive vertex constraints on the agent as contiguous int32 arrays, 
+        rows are (t, x, y), (t, x1, y1, x2, y2) and (t, x, y), can be passed to `lightspeed` as they are,
+        positive constraints of other agents are turned into negative ones for this agent
+
+        Arrays are cached in the node and built from the closest ancestor which has them
+        """
+        new: list[Constraint] = []
+        node = self
+        while agent_id not in node._arrays and node.parent is not None:
+            constraint: Constraint = node.constraint # type: ignore
+            if constraint.agent_id == agent_id:
+                new.extend(reversed(constraint.parts()))
+            elif constraint.positive:
+                new.extend(reversed(constraint.implied_for(agent_id)))
+            node = node.parent
+
+        v, e, p = node._arrays.get(agent_id, (_NoVertexConstraints, _NoEdgeConstraints, _NoVertexConstraints))
+        if new:
+            new.reverse()
+            ps = [np.asarray(visit) for c in new if c.positive for visit in c.visits()] # type: ignore
+            vs = [np.asarray(c) for c in new if isinstance(c, VertexConstraint) and not c.positive]
+            es = [np.asarray(c) for c in new if isinstance(c, EdgeConstraint) and not c.positive]
+            if vs: v = np.concatenate((v, np.array(vs, dtype=np.int32)))
+            if es: e = np.concatenate((e, np.array(es, dtype=np.int32)))
+            if ps: p = np.concatenate((p, np.array(ps, dtype=np.int32)))
+
+        self._arrays[agent_id] = (v, e, p)
+        return v, e, p
+
     def update_solution_for(self, agent_id: int, solution: Solution):
         assert self.solutions[agent_id].agent_id == agent_id
         self.cost -= self.solutions[agent_id].cost
         self.cost += solution.cost
+        self.lower_bound -= self.solutions[agent_id].lower_bound
+        self.lower_bound += solution.lower_bound
         self.solutions[agent_id] = solution
+        self.replanned.add(agent_id)
         self.time = max(map(lambda sol: sol.cost, self.solutions))
 
     def __hash__(self) -> int:
-        # TODO: test hash
-        return hash((self.vertexConstraints, self.edgeConstraints))
+        return self._hash
 
     def __eq__(self, other) -> bool:
-        # TODO: test this as well
-        return self.vertexConstraints == other.vertexConstraints \
+        if self is other: return True
+        return self._hash == other._hash and self.depth == other.depth \
+            and self.vertexConstraints == other.vertexConstraints \
             and self.edgeConstraints == other.edgeConstraints
 
     def __lt__(self, other) -> bool:
@@ -1,30 +1,39 @@
 from typing import Optional
 from numpy import ndarray
 from .map import Point
+from .mdd import MDD
 
 
 class Solution:
     """
-    Wrapper around agent's path
+    Wrapper around agent's path, immutable: nodes share solutions of the agents they didn't replan
 
     - agent_id: agent who has this solution
     - path: agent's path represented as 2d ndarray (rows for vertices, 2 columns for x and y)
     - countedMdd: optional ndarray, for time `t` `mdd[2 * t]` shows how many nodes are there 
         on the agent MDD's t'th layer, `mdd[2 * t + 1]` shows how many edges are there
         between t'th and (t + 1)'th layer.
-    - mdd: list of ndarrays, each representing corresponding vertex layer of cells in the actual MDD. 
+    - mdd: optional `MDD`, all vertex layers of cells in the actual MDD in one array
+    - lower_bound: lower bound on the cost of the agent's shortest path, when the path itself
+        may be longer (focal search), the cost by default
     """
 
     def __init__(
         self, agent_id: int, path: ndarray,
         counted_mdd: Optional[ndarray]=None,
-        mdd: Optional[list[ndarray]]=None
+        mdd: Optional[MDD]=None,
+        lower_bound: Optional[int]=None
     ) -> None:
         self.agent_id = agent_id
         self._path = path
         self.cost = len(path) - 1
         self.counted_mdd = counted_mdd
         self.mdd = mdd
+        self.lower_bound = self.cost if lower_bound is None else lower_bound
+
+    @property
+    def path(self) -> ndarray:
+        return self._path
 
     def get_point_at(self, time: int) -> Point:
         p =  self._path[time if time <= self.cost else -1]
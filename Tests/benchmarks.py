@@ -0,0 +1,300 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from copy import deepcopy
+from datetime import datetime
+from functools import partial
+from typing import Optional
+
+from Primitives.map import Map
+from Primitives.node import Node
+from Primitives.constraint import VertexConstraint
+from Algorithms.mapf import MAPF
+from Algorithms import cbs, cbs_pc, cbsh, icbs, ecbs, prioritized
+from Algorithms.utils import get_start_node, update_solution_for
+from Tests.utils import read_scen, scen_files
+from Tests.experiments import run_parallel
+
+SOLVERS = {'cbs': cbs, 'cbs_pc': cbs_pc, 'cbsh': cbsh, 'icbs': icbs, 'ecbs': ecbs, 'prioritized': prioritized}
+# statuses of the runs which found a solution, the one the solver promises
+SOLVED = ('optimal', 'solved')
+METRICS = ['success_rate', 'expanded', 'low_level_calls', 'cpu_time', 'wall_time', 'peak_memory']
+# (relative, absolute) growth of a metric against the baseline which is reported as a regression,
+# timings (seconds) and memory (MiB) are noisy, so they get more room; any drop of the success rate is one
+REGRESSION_TOLERANCE = {
+    'expanded': (0.05, 0), 'low_level_calls': (0.05, 0),
+    'cpu_time': (0.25, 0.01), 'wall_time': (0.25, 0.01), 'peak_memory': (0.25, 1)
+}
+
+
+def random_task(map: Map, num_agents: int, seed: int = 0) -> MAPF:
+    """ Task with random distinct start and goal points on the free cells of the `map` """
+    rng = random.Random(seed)
+    free = [(x, y) for y, x in np.argwhere(map.cells == 0)]
+
+    task = MAPF()
+    task.map = map
+    task.start_points = np.array(rng.sample(free, num_agents))
+    task.goal_points = np.array(rng.sample(free, num_agents))
+    return task
+
+
+def copy_with_deepcopy(node: Node, constraint) -> Node:
+    """ How `Node.make_copy` used to copy solutions, for comparison """
+    neighbor = node.make_copy(constraint)
+    neighbor.solutions = deepcopy(neighbor.solutions)
+    return neighbor
+
+
+def bench_expansions(task: MAPF, expansions: int, make_copy, *, seed: int = 0) -> tuple[float, float]:
+    """
+    Imitates `expansions` CBS expansions with icbs-sized solutions (paths and both kinds of MDDs):
+    each one copies the node for two constrained agents and replans them, children are kept alive
+    as they would be in the open list.
+
+    Returns time in milliseconds and allocated memory in kilobytes, both per expansion
+    """
+    rng = random.Random(seed)
+    node = get_start_node(task, counted_mdds=True, mdds=True)
+    assert node is not None, "task has no solution"
+
+    children = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(expansions):
+        for agent_id in rng.sample(range(len(node.solutions)), 2):
+            solution = node.solutions[agent_id]
+            t = rng.randint(1, max(solution.cost - 1, 1))
+            neighbor = make_copy(node, VertexConstraint(agent_id, t, solution.get_point_at(t)))
+            if update_solution_for(agent_id, neighbor, task, counted_mdd=True, mdd=True):
+                children.append(neighbor)
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return 1000 * elapsed / expansions, memory / 1024 / expansions
+
+
+def compare_copying(num_agents: list[int], expansions: int = 200):
+    """ Prints time and memory per expansion for shared solutions against deep copies of them """
+    map = Map()
+    map.read_map(current_dir + "/maps/warehouse.map")
+
+    print(f"{'agents':>6} | {'copying':>8} | {'ms / expansion':>14} | {'KiB / expansion':>15}")
+    for k in num_agents:
+        task = random_task(map, k)
+        for name, make_copy in [('deepcopy', copy_with_deepcopy), ('shared', Node.make_copy)]:
+            ms, kib = bench_expansions(task, expansions, make_copy)
+            print(f"{k:>6} | {name:>8} | {ms:>14.3f} | {kib:>15.1f}")
+
+
+def compare_symmetry(num_agents: list[int], instances: int = 10, timeout: int = 30):
+    """
+    Prints expanded nodes and time of `cbs_pc` and `icbs` with and without symmetry reasoning
+    on random warehouse tasks, averaged over the tasks all of them solved within `timeout` seconds
+    """
+    map = Map()
+    map.read_map(current_dir + "/maps/warehouse.map")
+    runs = [(algorithm, symmetry) for algorithm in (cbs_pc, icbs) for symmetry in (False, True)]
+
+    print(f"{'agents':>6} | {'algorithm':>9} | {'symmetry':>8} | {'solved':>6} | {'expanded':>8} | {'ms':>8} | {'rectangles':>10} | {'corridors':>9}")
+    for k in num_agents:
+        results = {run: [] for run in runs}
+        for seed in range(instances):
+            for algorithm, symmetry in runs:
+                # new task every time, so caches of one run don't help the other
+                start = time.perf_counter()
+                _, ast = algorithm.solve(random_task(map, k, seed), symmetry=symmetry, time_limit=timeout)
+                elapsed = time.perf_counter() - start
+
+                reasoning = ast.stats.get('symmetric conflicts')
+                results[algorithm, symmetry].append(None if ast.status != 'optimal' else (
+                    ast.count_expanded(), 1000 * elapsed,
+                    reasoning.rectangles if reasoning else 0, reasoning.corridors if reasoning else 0
+                ))
+
+        common = [i for i in range(instances) if all(results[run][i] is not None for run in runs)]
+        for (algorithm, symmetry), rows in results.items():
+            solved = sum(row is not None for row in rows)
+            means = np.mean([rows[i] for i in common], axis=0) if common else [np.nan] * 4
+            name = algorithm.__name__.split('.')[-1]
+            print(
+                f"{k:>6} | {name:>9} | {str(symmetry):>8} | {solved:>6} | {means[0]:>8.1f} | "
+                f"{means[1]:>8.1f} | {means[2]:>10.1f} | {means[3]:>9.1f}"
+            )
+
+
+def scenario_task(map: Map, scen: pd.DataFrame, num_agents: int) -> MAPF:
+    """ Task with the first `num_agents` agents of the MovingAI scenario, `read_scen` gives (row, column) points """
+    task = MAPF()
+    task.map = map
+    task.start_points = scen[['start_y', 'start_x']].to_numpy()[:num_agents]
+    task.goal_points = scen[['goal_y', 'goal_x']].to_numpy()[:num_agents]
+    return task
+
+
+def run_scenario(run: tuple[str, str, int, str], timeout: float, cache_dir: Optional[str] = None) -> dict:
+    """ Solves the first `k` agents of the scenario with the solver, returns the metrics of the run """
+    map_file, scen_file, k, name = run
+    map = Map()
+    map.read_map(map_file, cache_dir)
+    task = scenario_task(map, read_scen(scen_file, max_bucket=None, cache_dir=cache_dir), k)
+
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    _, ast = SOLVERS[name].solve(task, time_limit=timeout)
+    cpu_time, wall_time = time.process_time() - start_cpu, time.perf_counter() - start_wall
+
+    return dict(
+        status=ast.status, expanded=ast.count_expanded(),
+        low_level_calls=task.grid.calls if task.grid is not None else 0,
+        cpu_time=cpu_time, wall_time=wall_time,
+        # growth of the peak resident memory of the worker, `ru_maxrss` is in KiB on Linux
+        peak_memory=(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory) / 1024
+    )
+
+
+def summarize_runs(runs: pd.DataFrame, num_scenarios: int) -> pd.DataFrame:
+    """ `METRICS` for each solver and number of agents, the others than the success rate are means over the solved runs """
+    groups = runs.groupby(['solver', 'k'])
+    solved = runs[runs.status.isin(SOLVED)].groupby(['solver', 'k'])
+    summary = solved[METRICS[1:]].mean().reindex(groups.size().index)
+    summary.insert(0, 'success_rate', (solved.size() / num_scenarios).reindex(summary.index).fillna(0))
+    return summary
+
+
+def find_regressions(summary: pd.DataFrame, baseline: pd.DataFrame) -> list[str]:
+    """ Descriptions of the metrics in `summary` which are worse than in the `baseline` beyond `REGRESSION_TOLERANCE` """
+    regressions = []
+    for solver, k in summary.index.intersection(baseline.index):
+        now, then = summary.loc[(solver, k)], baseline.loc[(solver, k)]
+        if now.success_rate < then.success_rate:
+            regressions.append(f"{solver} with {k} agents: success_rate {then.success_rate:.2f} -> {now.success_rate:.2f}")
+        for metric, (relative, absolute) in REGRESSION_TOLERANCE.items():
+            # metrics of the groups without solved runs are NaN and never compare
+            if now[metric] > then[metric] * (1 + relative) + absolute:
+                regressions.append(f"{solver} with {k} agents: {metric} {then[metric]:.4g} -> {now[metric]:.4g}")
+    return regressions
+
+
+def code_version() -> str:
+    """ Commit of the benchmarked code, marked 'dirty' when there are uncommitted changes """
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=parent_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare_movingai(
+    map_file: str, scen_paths: list[str], solvers: list[str], num_agents: list[int], *,
+    timeout: float = 30, jobs: int = 1, history: str, baseline: str, save_baseline=False,
+    cache_dir: Optional[str] = None
+) -> int:
+    """
+    Runs the solvers on the first `k` agents of every MovingAI scenario for each `k` in `num_agents`,
+    each run in its own process with a hard timeout, see `run_parallel`
+
+    The summary is printed and appended to the `history` CSV along with the code version,
+    then compared with the `baseline` JSON for the same map, `save_baseline` makes it the new baseline
+
+    - scen_paths: `.scen` files or folders with them
+    - cache_dir: directory to keep the parsed map and scenarios in, so the workers don't parse them again
+
+    Returns the number of regressions against the baseline
+    """
+    scens = [file for path in scen_paths for file in (scen_files(path) if os.path.isdir(path) else [path])]
+    runs = [(map_file, scen, k, solver) for scen in scens for k in num_agents for solver in solvers]
+
+    rows = []
+    def collect(run: tuple[str, str, int, str], row: dict):
+        rows.append(dict(solver=run[3], k=run[2], scen=run[1], **row))
+
+    work = partial(run_scenario, timeout=timeout, cache_dir=cache_dir)
+    run_parallel(runs, work, collect, jobs=jobs, timeout=timeout)
+    summary = summarize_runs(pd.DataFrame(rows), len(scens))
+    print(summary.to_string(float_format='{:.4g}'.format))
+
+    map_name = os.path.basename(map_file)
+    version, date = code_version(), datetime.now().isoformat(timespec='seconds')
+    record = summary.reset_index()
+    for i, (column, value) in enumerate(
+        [('version', version), ('date', date), ('map', map_name), ('scenarios', len(scens)), ('timeout', timeout)]
+    ):
+        record.insert(i, column, value)
+    record.to_csv(history, mode='a', header=not os.path.isfile(history), index=False)
+
+    baselines = {}
+    if os.path.isfile(baseline):
+        with open(baseline) as f:
+            baselines = json.load(f)
+
+    regressions = []
+    if map_name in baselines:
+        reference = pd.DataFrame(baselines[map_name]['summary']).set_index(['solver', 'k'])
+        regressions = find_regressions(summary, reference)
+        print(f"\nAgainst the baseline of {baselines[map_name]['version']}: {len(regressions)} regressions")
+        for regression in regressions:
+            print(f"    {regression}")
+
+    if save_baseline:
+        baselines[map_name] = dict(
+            version=version, date=date, timeout=timeout,
+            summary=json.loads(summary.reset_index().to_json(orient='records'))
+        )
+        with open(baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+
+    return len(regressions)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of the CBS implementation")
+    parser.add_argument(
+        'benchmark', nargs='?', choices=['copying', 'symmetry', 'movingai'], default='copying',
+        help="time and memory spent on node expansions, symmetry reasoning on the warehouse map, "
+             "or solvers on MovingAI scenarios with the history of results and regressions"
+    )
+    parser.add_argument('-k', '--agents', type=int, nargs='+', help="numbers of agents")
+    parser.add_argument('-n', '--expansions', type=int, default=200, help="expansions to make for each number")
+    parser.add_argument('-i', '--instances', type=int, default=10, help="random tasks for each number of agents")
+    parser.add_argument('-t', '--timeout', type=int, default=30, help="seconds for one task")
+    parser.add_argument('--map', help="MovingAI .map file")
+    parser.add_argument('--scen', nargs='+', help="MovingAI .scen files or folders with them")
+    parser.add_argument('-s', '--solvers', nargs='+', choices=list(SOLVERS), default=['icbs'], help="solvers to run")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument(
+        '--history', default=current_dir + '/tables/movingai_history.csv', help="CSV the results are appended to"
+    )
+    parser.add_argument(
+        '--baseline', default=current_dir + '/tables/movingai_baseline.json', help="JSON with the baseline results"
+    )
+    parser.add_argument('--save-baseline', action='store_true', help="make these results the baseline for the map")
+    parser.add_argument('--cache', metavar='DIR', help="directory to keep the parsed map and scenarios in")
+    args = parser.parse_args()
+    if args.benchmark == 'movingai' and (args.map is None or args.scen is None):
+        parser.error("movingai needs --map and --scen")
+
+    if args.benchmark == 'copying':
+        compare_copying(args.agents or [25, 50, 100], args.expansions)
+    elif args.benchmark == 'symmetry':
+        compare_symmetry(args.agents or [6, 8, 10, 12], args.instances, args.timeout)
+    else:
+        regressions = compare_movingai(
+            args.map, args.scen, args.solvers, args.agents or [5, 10, 15, 20], timeout=args.timeout, jobs=args.jobs,
+            history=args.history, baseline=args.baseline, save_baseline=args.save_baseline, cache_dir=args.cache
+        )
+        sys.exit(1 if regressions else 0)
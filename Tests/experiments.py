@@ -4,18 +4,25 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-import signal
+import csv
+import time
 import random
+import argparse
 import numpy as np
 import pandas as pd
-from dataclasses import dataclass
+import multiprocessing as mp
+from functools import partial
+from typing import Callable, Iterable, Optional, TypeVar
+from multiprocessing.connection import wait
 
 from Primitives.map import Map
 from Algorithms.mapf import MAPF
 from Algorithms import cbs, cbs_pc, cbsh, icbs
 from Tests.test import base_test
+from Tests.utils import read_instances
 
-TIMEOUT = 30 # 5 minutes
+TIMEOUT = 30 # seconds for one run
+KILL_GRACE = 5 # seconds a run may take over the timeout before its worker is killed
 MIN_AGENTS = 6
 MAX_AGENTS = 7
 NUM_INSTANCES = 100
@@ -32,6 +39,12 @@ COLUMNS = pd.MultiIndex.from_product([FEATURES, ALG_NAMES])
 # an algorithm is a `solve` function inside each module
 ALGORITHMS = [eval(alg) for alg in ALG_NAMES]
 
+# columns of the checkpoint file, one row for each finished run
+RUN_FIELDS = ['k', 'instance', 'algorithm', 'status', 'time', 'expanded']
+
+Run = tuple[int, int, str] # number of agents, instance, algorithm name
+Item = TypeVar('Item')
+
 
 def setup():
     map = Map()
@@ -48,85 +61,165 @@ def setup():
         f.close()
 
 
-def handle(signum, frame):
-    raise TimeoutError("Test ran out of time limit")
-
-signal.signal(signal.SIGALRM, handle)
-
-
-@dataclass
-class AlgorithmStats:
-    num_solved: int = 0
-    cpu_time: float = 0
-    nodes_expanded: float = 0
+def mapf_for(m: Map, k: int, instance: int, cache_dir: Optional[str] = None) -> MAPF:
+    """ Task number `instance` with `k` agents on the map `m`, from the files written by `setup`, see `read_instances` """
+    rows = read_instances(current_dir + f"/maps/tests/{k}.txt", cache_dir)[instance]
 
-    def features(self) -> tuple[float, float, float]:
-        return (
-            self.cpu_time / self.num_solved,
-            self.nodes_expanded / self.num_solved,
-            self.num_solved / NUM_INSTANCES
-        )
+    task = MAPF()
+    task.map = m
+    task.start_points = rows[:, [1, 0]]
+    task.goal_points = rows[:, [3, 2]]
+    return task
 
 
-def experiment1():
-    def mapf_for(k: int, instance: int) -> MAPF:
-        with open(current_dir + f"/maps/tests/{k}.txt", 'r') as f:
-            lines = f.readlines()
-
-        task = MAPF()
-        task.map = m
-        task.start_points = np.zeros((k, 2), dtype=int)
-        task.goal_points = np.zeros((k, 2), dtype=int)
-        for j in range(k):
-            sy, sx, gy, gx = map(int, lines[(k + 2) * instance + 1 + j].split())
-            task.start_points[j] = (sx, sy)
-            task.goal_points[j] = (gx, gy)
-
-        return task
-
+def run_one(run: Run, timeout: float, cache_dir: Optional[str] = None) -> dict:
+    """ Solves one task with one algorithm, returns its status, time and expanded nodes """
+    k, instance, name = run
     m = Map()
-    m.read_map(current_dir + "/maps/warehouse.map")
-    results = np.zeros((MAX_AGENTS - MIN_AGENTS + 1, NUM_ALGORITHMS * NUM_FEATURES))
-
-    for k in range(MIN_AGENTS, MAX_AGENTS + 1):
-        stats = [AlgorithmStats() for _ in range(NUM_ALGORITHMS)]
-        # 100 instances for each number of agents
-        for i in range(NUM_INSTANCES):
-            task = mapf_for(k, i)
-
-            for stat, alg in zip(stats, ALGORITHMS):
-                signal.alarm(TIMEOUT)
-
-                result, debug = base_test(task, algorithm=alg.solve)
-
-                signal.alarm(0)
-
-                if result is not None:
-                    ast, elapsed, wall_time = debug # type: ignore
-                    stat.num_solved += 1
-                    stat.cpu_time += elapsed
-                    stat.nodes_expanded += ast.count_expanded()
-                else:
-                    assert debug is None
-                    print(f"{k} agents, {i} instance")
-        
-        for i, stat in enumerate(stats):
-            if stat.num_solved == 0: continue
-            row = k - MIN_AGENTS
-            cols = range(i, NUM_ALGORITHMS * NUM_FEATURES, NUM_ALGORITHMS)
-            results[row, cols] = stat.features()
-
-        np.save(current_dir + f"/tables/save{k}.npy", arr=results)
-
-    data = pd.DataFrame(results, columns=COLUMNS, index=range(MIN_AGENTS, MAX_AGENTS + 1))
-    data.to_csv(current_dir + '/tables/warehouse2.csv')
-
-experiment1()
-setup()
-
-def concat():
-    results = np.load(current_dir + f"/tables/save7.npy")
-    data = pd.DataFrame(results[0:6], columns=COLUMNS, index=range(MIN_AGENTS, MAX_AGENTS + 1))
-    data.to_csv(current_dir + '/tables/warehouse.csv') 
-
-# concat()
+    m.read_map(current_dir + "/maps/warehouse.map", cache_dir)
+    task = mapf_for(m, k, instance, cache_dir)
+
+    solve = ALGORITHMS[ALG_NAMES.index(name)].solve
+    result, debug = base_test(task, algorithm=partial(solve, time_limit=timeout))
+
+    row = dict(status='error')
+    if debug is not None:
+        ast, cpu_time, _ = debug
+        row.update(status=ast.status, time=cpu_time, expanded=ast.count_expanded())
+    return row
+
+
+def _worker(work: Callable, item, connection):
+    connection.send(work(item))
+    connection.close()
+
+
+def run_parallel(
+    items: Iterable[Item], work: Callable[[Item], dict], on_result: Callable[[Item, dict], None], *,
+    jobs: int, timeout: float
+):
+    """
+    Calls `work` on every item in its own worker process, at most `jobs` at once,
+    and gives each item with its row to `on_result` as soon as it is ready, in any order
+
+    `work` must stop by itself after `timeout` seconds, a worker still running `KILL_GRACE` seconds
+    later (stuck in a long low level search, for example) is killed, its row is `{'status': 'killed'}`,
+    and `{'status': 'crashed'}` if the worker dies
+    """
+    pending = iter(items)
+    running = {} # connection -> (process, item, deadline)
+
+    def start(item: Item):
+        receiver, sender = mp.Pipe(duplex=False)
+        process = mp.Process(target=_worker, args=(work, item, sender), daemon=True)
+        process.start()
+        sender.close() # the worker has its own copy, so the pipe breaks if it dies
+        running[receiver] = (process, item, time.monotonic() + timeout + KILL_GRACE)
+
+    while True:
+        while len(running) < jobs:
+            item = next(pending, None)
+            if item is None: break
+            start(item)
+        if not running: return
+
+        nearest = min(deadline for _, _, deadline in running.values())
+        for receiver in wait(list(running), timeout=max(0, nearest - time.monotonic())):
+            process, item, _ = running.pop(receiver) # type: ignore
+            try:
+                row = receiver.recv() # type: ignore
+            except EOFError: # the worker died without an answer
+                row = dict(status='crashed')
+            receiver.close() # type: ignore
+            process.join()
+            on_result(item, row)
+
+        now = time.monotonic()
+        for receiver, (process, item, deadline) in list(running.items()):
+            if now >= deadline:
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+                on_result(item, dict(status='killed'))
+
+
+def summarize(runs: pd.DataFrame, agents: range) -> pd.DataFrame:
+    """ Table with `COLUMNS`: mean time and expanded nodes over the solved runs and the share of solved ones """
+    solved = runs[runs.status == 'optimal'].groupby(['k', 'algorithm'])
+    data = pd.concat({
+        'time': solved.time.mean().unstack(),
+        'expanded': solved.expanded.mean().unstack(),
+        'success_rate': solved.size().unstack() / NUM_INSTANCES
+    }, axis=1)
+    return data.reindex(index=agents, columns=COLUMNS).fillna(0)
+
+
+def experiment1(*, jobs: int, timeout: float = TIMEOUT, agents: range = range(MIN_AGENTS, MAX_AGENTS + 1),
+                output: str = current_dir + '/tables/warehouse.csv', cache_dir: Optional[str] = None):
+    """
+    Runs all algorithms on `NUM_INSTANCES` tasks for each number of `agents` in parallel
+
+    Every finished run is appended to the checkpoint file next to the `output` table,
+    runs already in it are not repeated, so a stopped experiment continues where it was;
+    delete the checkpoint to start over, for example with another timeout
+
+    `cache_dir` keeps the parsed map and tasks, so the workers don't parse them again
+    """
+    checkpoint = os.path.splitext(output)[0] + '_runs.csv'
+    done = set()
+    if os.path.isfile(checkpoint):
+        previous = pd.read_csv(checkpoint)
+        done = set(zip(previous.k, previous.instance, previous.algorithm))
+
+    runs = [
+        (k, i, name) for k in agents for i in range(NUM_INSTANCES) for name in ALG_NAMES
+        if (k, i, name) not in done
+    ]
+    print(f"{len(done)} runs are in '{checkpoint}', {len(runs)} to go on {jobs} workers")
+
+    with open(checkpoint, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RUN_FIELDS)
+        if f.tell() == 0: writer.writeheader()
+
+        def save(run: Run, row: dict):
+            k, instance, name = run
+            writer.writerow(dict(k=k, instance=instance, algorithm=name, **row))
+            f.flush()
+            if row['status'] != 'optimal':
+                print(f"{k} agents, {instance} instance, {name}: {row['status']}")
+
+        work = partial(run_one, timeout=timeout, cache_dir=cache_dir)
+        run_parallel(runs, work, save, jobs=jobs, timeout=timeout)
+
+    data = summarize(pd.read_csv(checkpoint), agents)
+    data.to_csv(output)
+    return data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Experiments with the CBS variants on the warehouse map")
+    parser.add_argument(
+        'command', nargs='?', choices=['run', 'setup'], default='run',
+        help="run the algorithms on the tasks, or generate new tasks"
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('-t', '--timeout', type=float, default=TIMEOUT, help="seconds for one run")
+    parser.add_argument(
+        '-k', '--agents', type=int, nargs=2, default=[MIN_AGENTS, MAX_AGENTS], metavar=('MIN', 'MAX'),
+        help="range of the numbers of agents"
+    )
+    parser.add_argument(
+        '-o', '--output', default=current_dir + '/tables/warehouse.csv',
+        help="table to write, its checkpoint is next to it"
+    )
+    parser.add_argument('--cache', metavar='DIR', help="directory to keep the parsed map and tasks in")
+    args = parser.parse_args()
+
+    if args.command == 'setup':
+        setup()
+    else:
+        agents = range(args.agents[0], args.agents[1] + 1)
+        print(experiment1(
+            jobs=args.jobs, timeout=args.timeout, agents=agents, output=args.output, cache_dir=args.cache
+        ))
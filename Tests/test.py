@@ -14,11 +14,13 @@ from typing import Callable, Optional
 from Primitives.node import Node
 from Algorithms.mapf import MAPF
 from Algorithms.search_tree import SearchTreePQS as ST
+from Algorithms.utils import simulate
 
 import Tests.utils as utils
 from Tests.graphics import animate_solutions
 
 import Algorithms.cbs as cbs
+import Algorithms.ecbs as ecbs
 
 # Should be universal type for all CBS-like algorithms
 Solver = Callable[[MAPF], tuple[Optional[Node], ST]]
@@ -103,6 +105,48 @@ def test_correctness(algorithm: Solver = cbs.solve, can_fail_before_quit=10):
         )
 
 
+def test_bounded(algorithm: Solver = ecbs.solve, suboptimality: Optional[float] = 1.5, can_fail_before_quit=10):
+    """
+    Validate an algorithm which doesn't promise optimal solutions: each solution must be conflict free,
+    and its cost at most `suboptimality` times the precomputed optimal one
+
+    - algorithm: algorithm to test, such as `ecbs.solve` (bounded suboptimal) or `prioritized.solve`
+    - suboptimality: bound the algorithm was given, `None` to check only that solutions are conflict free
+    - can_fail_before_quit: number of failed tests allowed before quiting this test, as in `test_correctness`
+    """
+    print(
+        f"Testing '{getmodule(algorithm).__name__}.{algorithm.__name__}' for conflict free solutions"  # type: ignore
+        + (f" within {suboptimality} of the optimal cost: " if suboptimality is not None else ": ")
+    )
+    failed = 0
+    answers = pd.read_csv(current_dir + "/instances/min-sum-of-cost.csv")
+    for i, (name, cost) in tqdm(answers.iterrows()):
+        task = MAPF()
+        task.read_txt(current_dir + '/' + name)
+        result, _ = base_test(task, algorithm)
+        # the solutions are checked in a fresh node, without anything the solver kept in its own
+        solution = Node(list(result.solutions)) if result is not None else None
+        if solution is None:
+            problem = "no solution found"
+        elif simulate(solution) != []:
+            problem = "solution has conflicts"
+        elif suboptimality is not None and solution.cost > suboptimality * cost:
+            problem = f"cost found = {solution.cost} > {suboptimality} * {cost}"
+        else:
+            continue
+
+        print(f"❌❌❌ 😰 Fail on test {i + 1}: {problem}, file: {name} ❌❌❌")  # type: ignore
+        failed += 1
+        if failed >= can_fail_before_quit:
+            print("\nToo many failed cases 😩, breaking the test 😡")
+            return
+
+    if failed == 0:
+        print(
+            "️✅✅️✅ Congratulations! 🤩 Your algorithm has passed all tests! 😎😎😎"
+        )
+
+
 def simple_test(filename: str, algorithms: list[Solver] = [cbs.solve], show=True, save=None, print_path=False):
     """ 
     Tests algorithms (one or multiple) on one test, giving maximum information 
@@ -126,11 +170,15 @@ def simple_test(filename: str, algorithms: list[Solver] = [cbs.solve], show=True
         result, debug = base_test(task, algorithm, show=show, save=save)
         if result is None:
             print("\nPath not fount!")
+            if debug is not None: print(f"Status: {debug[0].status}, lower bound: {debug[0].lower_bound}")
             continue
         print(f"\nFound solution with cost = {result.cost}")
         if debug is not None:
             ast, cpu_time, wall_time = debug
+            print(f"Status: {ast.status}, lower bound: {ast.lower_bound}")
             print(f"Expanded nodes: {ast.count_expanded()}")
+            for name, value in ast.stats.items():
+                print(f"{name}: {value}")
             print(f"CPU time = {cpu_time} seconds, Wall time = {wall_time} seconds")
             if print_path: utils.print_path(result)
         print("------------------------------------------------------------------------------------------------\n")
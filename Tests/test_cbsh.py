@@ -0,0 +1,52 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import random
+from itertools import combinations
+
+import pytest
+
+from Algorithms.cbsh import min_vertex_cover
+
+
+def adjacency_of(size: int, edges: list) -> list[int]:
+    adjacency = [0] * size
+    for u, v in edges:
+        adjacency[u] |= 1 << v
+        adjacency[v] |= 1 << u
+    return adjacency
+
+
+def smallest_cover(size: int, edges: list) -> int:
+    """ Size of the minimum vertex cover by trying all subsets, smallest first """
+    for k in range(size + 1):
+        for cover in combinations(range(size), k):
+            if all(u in cover or v in cover for u, v in edges):
+                return k
+    return size
+
+
+@pytest.mark.parametrize('size, edges, cover', [
+    (0, [], 0),
+    (3, [], 0),
+    (2, [(0, 1)], 1),
+    (5, [(0, 1), (1, 2), (2, 3), (3, 4)], 2), # path
+    (5, [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0)], 3), # odd cycle
+    (4, list(combinations(range(4), 2)), 3), # clique
+    (6, [(0, 1), (0, 2), (1, 2), (3, 4), (4, 5)], 3), # two components
+])
+def test_known_graphs(size, edges, cover):
+    assert min_vertex_cover(adjacency_of(size, edges)) == cover
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_graphs(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        size = rng.randint(1, 10)
+        density = rng.random()
+        edges = [(u, v) for u, v in combinations(range(size), 2) if rng.random() < density]
+        assert min_vertex_cover(adjacency_of(size, edges)) == smallest_cover(size, edges)
@@ -0,0 +1,83 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import numpy as np
+import pytest
+
+from CExtension import lightspeed as ls
+
+
+def point_at(path: list, time: int) -> tuple:
+    return tuple(path[min(time, len(path) - 1)])
+
+
+def conflicting(first: list, second: list, time: int) -> bool:
+    """ The agents are at the same point at the `time` or swap their points on the way to it """
+    if point_at(first, time) == point_at(second, time): return True
+    return time > 0 and point_at(first, time - 1) != point_at(first, time) and \
+        (point_at(first, time - 1), point_at(first, time)) == (point_at(second, time), point_at(second, time - 1))
+
+
+def random_paths(rng: np.random.Generator) -> list:
+    """ Random walks with waits on a small grid, so they meet often """
+    steps = np.array([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)])
+    paths = []
+    for _ in range(rng.integers(1, 6)):
+        path = [rng.integers(0, 3, size=2)]
+        for _ in range(rng.integers(0, 8)):
+            path.append(np.clip(path[-1] + steps[rng.integers(0, 5)], 0, 2))
+        paths.append(np.array(path, dtype=np.int32))
+    return paths
+
+
+def test_vertex_and_swap_conflicts():
+    paths = [
+        np.array([(0, 0), (1, 0), (2, 0)], dtype=np.int32),
+        np.array([(2, 0), (1, 0), (0, 0)], dtype=np.int32), # meets the first one at (1, 0)
+        np.array([(0, 1), (1, 1)], dtype=np.int32),
+        np.array([(2, 1), (2, 1), (1, 1), (0, 1)], dtype=np.int32), # swaps with the third one, then meets it
+    ]
+    assert ls.conflict_times(paths) == [1]
+    assert ls.conflict_times(paths, all_conflicts=True) == [1, 2]
+    assert ls.conflict_times(paths[2:], all_conflicts=True) == [2]
+    assert ls.conflicts_of(paths, 3) == [(2, 2)]
+
+
+def test_agents_wait_at_the_ends_of_their_paths():
+    paths = [np.array([(1, 1)], dtype=np.int32), np.array([(0, 1), (0, 0), (1, 0), (1, 1)], dtype=np.int32)]
+    assert ls.conflict_times(paths) == [3]
+    assert ls.conflicts_of(paths, 0) == [(1, 3)]
+    assert ls.conflict_times(paths[:1]) == []
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_conflicts_of_random_paths(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(500):
+        paths = random_paths(rng)
+        steps = max(len(path) for path in paths)
+        pairs = [(i, j) for i in range(len(paths)) for j in range(len(paths)) if i != j]
+        times = [time for time in range(steps) if any(conflicting(paths[i], paths[j], time) for i, j in pairs)]
+
+        assert ls.conflict_times(paths, all_conflicts=True) == times
+        assert ls.conflict_times(paths) == times[:1]
+        for agent in range(len(paths)):
+            # a pair stays in conflict once both agents wait at the same goal, it is reported once
+            expected = [
+                (other, time) for other in range(len(paths)) if other != agent
+                for time in range(max(len(paths[agent]), len(paths[other])))
+                if conflicting(paths[agent], paths[other], time)
+            ]
+            assert ls.conflicts_of(paths, agent) == expected
+
+
+def test_wrong_paths():
+    with pytest.raises(ValueError, match='non empty'):
+        ls.conflict_times([np.zeros((0, 2), dtype=np.int32)])
+    with pytest.raises(ValueError, match='2 columns'):
+        ls.conflict_times([np.zeros((2, 3), dtype=np.int32)])
+    with pytest.raises(IndexError):
+        ls.conflicts_of([np.zeros((1, 2), dtype=np.int32)], 1)
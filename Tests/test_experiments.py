@@ -0,0 +1,51 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import time
+
+import pytest
+
+pytest.importorskip('matplotlib') # experiments draw with Tests.graphics
+from Tests import experiments
+
+
+def answer(item: float) -> dict:
+    time.sleep(item)
+    return dict(status='optimal', time=item)
+
+
+def hang(item: float) -> dict:
+    if item > 0: time.sleep(60)
+    return dict(status='optimal')
+
+
+def die(item: int) -> dict:
+    if item: os._exit(1)
+    return dict(status='optimal')
+
+
+def collect(items, work, **options) -> dict:
+    rows = {}
+    experiments.run_parallel(items, work, rows.__setitem__, **options)
+    return rows
+
+
+def test_every_item_gets_its_row():
+    items = [0.2, 0.0, 0.1, 0.05, 0.0]
+    rows = collect(items, answer, jobs=2, timeout=5)
+    assert rows == {item: dict(status='optimal', time=item) for item in items}
+
+
+def test_worker_over_the_timeout_is_killed(monkeypatch):
+    monkeypatch.setattr(experiments, 'KILL_GRACE', 0.2)
+    start = time.monotonic()
+    rows = collect([0.0, 1.0, 2.0], hang, jobs=3, timeout=0.3)
+    assert rows == {0.0: dict(status='optimal'), 1.0: dict(status='killed'), 2.0: dict(status='killed')}
+    assert time.monotonic() - start < 5
+
+
+def test_dead_worker_is_crashed():
+    assert collect([0, 1], die, jobs=1, timeout=5) == {0: dict(status='optimal'), 1: dict(status='crashed')}
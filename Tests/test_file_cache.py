@@ -0,0 +1,83 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import numpy as np
+
+from Primitives.file_cache import load_cached
+
+
+class Parser:
+    """ Parses whitespace separated integers and counts its calls """
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, contents: bytes) -> np.ndarray:
+        self.calls += 1
+        return np.array(contents.split(), dtype=np.int32)
+
+
+def test_without_cache_dir_parses_every_time(tmp_path):
+    data = tmp_path / 'data.txt'
+    data.write_text('1 2 3')
+    parse = Parser()
+    for _ in range(2):
+        assert load_cached(str(data), parse).tolist() == [1, 2, 3]
+    assert parse.calls == 2
+
+
+def test_cached_array_is_reused(tmp_path):
+    data, cache = tmp_path / 'data.txt', tmp_path / 'cache'
+    data.write_text('1 2 3')
+    parse = Parser()
+    for _ in range(3):
+        assert load_cached(str(data), parse, str(cache)).tolist() == [1, 2, 3]
+    assert parse.calls == 1 and len(os.listdir(cache)) == 1
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    data, cache = tmp_path / 'data.txt', tmp_path / 'cache'
+    data.write_text('1 2 3')
+    parse = Parser()
+    load_cached(str(data), parse, str(cache))
+    old_entry = os.listdir(cache)
+
+    data.write_text('4 5 6') # same size, so only the modification time tells
+    stat = os.stat(data)
+    os.utime(data, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_cached(str(data), parse, str(cache)).tolist() == [4, 5, 6]
+    assert parse.calls == 2
+    assert len(os.listdir(cache)) == 1 and os.listdir(cache) != old_entry
+
+    data.write_text('7 8')
+    assert load_cached(str(data), parse, str(cache)).tolist() == [7, 8]
+    assert parse.calls == 3 and len(os.listdir(cache)) == 1
+
+
+def test_broken_entry_is_made_again(tmp_path):
+    data, cache = tmp_path / 'data.txt', tmp_path / 'cache'
+    data.write_text('1 2 3')
+    parse = Parser()
+    load_cached(str(data), parse, str(cache))
+    (entry,) = os.listdir(cache)
+    (cache / entry).write_bytes(b'not an array')
+
+    assert load_cached(str(data), parse, str(cache)).tolist() == [1, 2, 3]
+    assert load_cached(str(data), parse, str(cache)).tolist() == [1, 2, 3]
+    assert parse.calls == 2
+
+
+def test_same_names_in_different_folders(tmp_path):
+    cache = tmp_path / 'cache'
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir(), second.mkdir()
+    (first / 'data.txt').write_text('1 2 3')
+    (second / 'data.txt').write_text('4 5 6')
+    parse = Parser()
+    for _ in range(2):
+        assert load_cached(str(first / 'data.txt'), parse, str(cache)).tolist() == [1, 2, 3]
+        assert load_cached(str(second / 'data.txt'), parse, str(cache)).tolist() == [4, 5, 6]
+    assert parse.calls == 2 and len(os.listdir(cache)) == 2
@@ -0,0 +1,81 @@
+import sys
+import random
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import numpy as np
+import pytest
+
+from CExtension import lightspeed as ls
+
+# random tasks are small, so every optimal path ends before these times
+MAX_CONSTRAINED_TIME = 12
+HORIZON = 40
+
+
+def random_task(rng: random.Random):
+    """ Small map, start, goal and random vertex, edge and positive constraints, `None` if the map has no room """
+    width, height = rng.randint(3, 6), rng.randint(1, 5)
+    cells = np.array([[rng.random() < 0.2 for _ in range(width)] for _ in range(height)], dtype=np.int8)
+    free = [(x, y) for y in range(height) for x in range(width) if cells[y, x] == 0]
+    if len(free) < 2: return None
+    start, goal = rng.sample(free, 2)
+
+    vertices = [(rng.randint(1, MAX_CONSTRAINED_TIME), *rng.choice(free)) for _ in range(rng.randint(0, 12))]
+    edges = []
+    for _ in range(rng.randint(0, 6)):
+        x, y = rng.choice(free)
+        other = (x + rng.choice([-1, 1]), y) if rng.random() < 0.5 else (x, y + rng.choice([-1, 1]))
+        if other in free:
+            first, second = sorted([(x, y), other])
+            edges.append((rng.randint(0, MAX_CONSTRAINED_TIME), *first, *second))
+    positives = [(rng.randint(1, MAX_CONSTRAINED_TIME), *rng.choice(free))] if rng.random() < 0.2 else []
+    return cells, free, start, goal, vertices, edges, positives
+
+
+def shortest_cost(free, start, goal, vertices, edges, positives):
+    """ Cost of the shortest path by breadth first search on the time expanded graph, waits allowed everywhere """
+    taken = set(vertices)
+    forbidden = set(edges)
+    required = {time: (x, y) for time, x, y in positives}
+    # the agent stays at its goal, so it must not be taken later, and other positive constraints must be met
+    arrival = max(
+        [time for time, x, y in vertices if (x, y) == goal] +
+        [time for time, x, y in positives if (x, y) != goal] + [-1]
+    )
+
+    layer = {start}
+    for time in range(HORIZON):
+        if goal in layer and time > arrival: return time
+        next_layer = set()
+        for x, y in layer:
+            for point in [(x, y), (x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+                if point not in free or (time + 1, *point) in taken: continue
+                if (time, *min((x, y), point), *max((x, y), point)) in forbidden: continue
+                if required.get(time + 1, point) != point: continue
+                next_layer.add(point)
+        layer = next_layer
+    return None
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_shortest_paths_under_random_constraints(seed):
+    rng = random.Random(seed)
+    for _ in range(1000):
+        task = random_task(rng)
+        if task is None: continue
+        cells, free, start, goal, vertices, edges, positives = task
+        expected = shortest_cost(free, start, goal, vertices, edges, positives)
+
+        options = dict(
+            v_constraints=np.array(vertices, dtype=np.int32).reshape(-1, 3),
+            e_constraints=np.array(edges, dtype=np.int32).reshape(-1, 5),
+            p_constraints=np.array(positives, dtype=np.int32).reshape(-1, 3),
+        )
+        for mdds in ({}, dict(lite_mdd=True, full_mdd=True)):
+            result = ls.find_path(cells, start, goal, **options, **mdds)
+            path = result[0] if mdds and result is not None else result
+            cost = None if path is None else len(path) - 1
+            assert cost == expected, (start, goal, vertices, edges, positives, cells.tolist())
@@ -0,0 +1,103 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import numpy as np
+import pytest
+
+from CExtension import lightspeed as ls
+
+
+def open_grid(height=3, width=3) -> ls.Grid:
+    return ls.Grid(np.zeros((height, width), dtype=np.int8))
+
+
+@pytest.mark.parametrize('dtype', [np.int32, np.int64])
+def test_constraints_of_any_int_type(dtype):
+    grid = open_grid()
+    # (t, x, y): (1, 0) is taken at t = 1, the agent has to wait or go around
+    path = grid.find_path((0, 0), (2, 0), v_constraints=np.array([[1, 1, 0]], dtype=dtype))
+    assert len(path) == 4 and tuple(path[1]) != (1, 0)
+
+    # (t, x1, y1, x2, y2): the move (0, 0) -> (1, 0) is forbidden at t = 0
+    path = grid.find_path((0, 0), (2, 0), e_constraints=np.array([[0, 0, 0, 1, 0]], dtype=dtype))
+    assert len(path) == 4 and tuple(path[1]) != (1, 0)
+
+
+def test_constraints_in_fortran_order():
+    constraints = np.asfortranarray(np.array([[1, 1, 0], [2, 1, 0]], dtype=np.int32))
+    path = open_grid().find_path((0, 0), (2, 0), v_constraints=constraints)
+    assert not any(tuple(point) == (1, 0) for point in path[1:3])
+
+
+@pytest.mark.parametrize('keyword, columns', [
+    ('v_constraints', 4), ('e_constraints', 3), ('p_constraints', 5), ('parked', 2)
+])
+def test_constraints_with_wrong_columns(keyword, columns):
+    with pytest.raises(ValueError, match=keyword):
+        open_grid().find_path((0, 0), (2, 0), **{keyword: np.zeros((1, columns), dtype=np.int32)})
+
+
+def breadth_first_distances(cells: np.ndarray, goal) -> np.ndarray:
+    """ Distances to the goal (x, y) by breadth first search, -1 for unreachable cells """
+    height, width = cells.shape
+    distances = np.full(cells.shape, -1)
+    distances[goal[1], goal[0]] = 0
+    layer = [goal]
+    while layer:
+        next_layer = []
+        for x, y in layer:
+            for nx, ny in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+                if 0 <= nx < width and 0 <= ny < height and cells[ny, nx] == 0 and distances[ny, nx] < 0:
+                    distances[ny, nx] = distances[y, x] + 1
+                    next_layer.append((nx, ny))
+        layer = next_layer
+    return distances
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_distances_match_breadth_first_search(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(50):
+        cells = (rng.random((rng.integers(1, 8), rng.integers(1, 8))) < 0.3).astype(np.int8)
+        grid = ls.Grid(cells)
+        for y, x in np.argwhere(cells == 0):
+            expected = breadth_first_distances(cells, (x, y))
+            assert np.array_equal(grid.distances((x, y)), expected)
+            assert np.array_equal(ls.distances(cells, (x, y)), expected)
+
+
+def test_grid_counts_searches():
+    grid = open_grid()
+    assert len(grid.find_path((0, 0), (2, 2))) == 5
+    assert grid.find_path((0, 0), (2, 2), v_constraints=np.array([[4, 2, 2]], dtype=np.int32)) is not None
+    assert grid.calls == 2 and grid.expanded > 0
+
+
+def test_grid_reinitialized_with_another_map():
+    grid = open_grid()
+    grid.__init__(np.array([[0, 1, 0], [0, 0, 0]], dtype=np.int8))
+    assert grid.map.shape == (2, 3)
+    assert len(grid.find_path((0, 0), (2, 0))) == 5
+    assert grid.distances((2, 0)).tolist() == [[4, -1, 0], [3, 2, 1]]
+
+
+def test_grid_without_init():
+    grid = ls.Grid.__new__(ls.Grid)
+    with pytest.raises(RuntimeError, match='not initialized'):
+        grid.find_path((0, 0), (1, 0))
+    with pytest.raises(RuntimeError, match='not initialized'):
+        grid.distances((0, 0))
+
+
+@pytest.mark.parametrize('point', [(3, 0), (0, -1)])
+def test_points_out_of_bounds(point):
+    grid = open_grid()
+    with pytest.raises(ValueError, match='out of the map bounds'):
+        grid.find_path(point, (0, 0))
+    with pytest.raises(ValueError, match='out of the map bounds'):
+        grid.find_path((0, 0), point)
+    with pytest.raises(ValueError, match='out of the map bounds'):
+        grid.distances(point)
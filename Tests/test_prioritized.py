@@ -0,0 +1,32 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from Algorithms.mapf import MAPF
+from Algorithms.utils import simulate
+from Algorithms import prioritized
+
+
+def read_task(name: str) -> MAPF:
+    task = MAPF()
+    task.read_txt(current_dir + '/instances/' + name)
+    return task
+
+
+def test_orderings_are_counted_apart_from_nodes():
+    # the same ordering twice is tried once
+    node, ast = prioritized.solve(read_task('test_50.txt'), orderings=('given', 'given', 'longest'), restarts=2)
+    assert node is not None and simulate(node) == []
+    assert ast.status == 'solved' and node.cost >= ast.lower_bound
+    assert ast.stats['tried orderings'] == 4
+    assert ast.count_expanded() == 0 and ast.duplicates == 0
+
+
+def test_node_limit_bounds_tried_orderings():
+    node, ast = prioritized.solve(read_task('test_50.txt'), node_limit=1)
+    assert node is not None and ast.stats['tried orderings'] == 1
+
+    node, ast = prioritized.solve(read_task('test_50.txt'), node_limit=0)
+    assert node is None and ast.status == 'node limit'
@@ -0,0 +1,110 @@
+import sys
+import os.path
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import numpy as np
+
+from Algorithms.mapf import MAPF
+from Algorithms.utils import find_paths_batch, get_start_node, update_solution_for, path_cache_for, PathCache
+
+
+def make_task(rows: str, starts: list, goals: list) -> MAPF:
+    """ Task on the map given by its rows, '.' is a free cell, points are (x, y) """
+    task = MAPF()
+    task.map.read_string(rows)
+    task.start_points = np.array(starts)
+    task.goal_points = np.array(goals)
+    return task
+
+
+OPEN_3x3 = "...\n...\n..."
+
+
+def test_find_paths_batch_without_constraints():
+    task = make_task(OPEN_3x3, [(0, 0), (2, 2)], [(2, 0), (0, 2)])
+    paths = find_paths_batch(task, [1, 0])
+    assert [len(path) for path in paths] == [3, 3]
+    assert tuple(paths[0][0]) == (2, 2) and tuple(paths[1][-1]) == (2, 0)
+
+
+def test_find_paths_batch_passes_each_constraint():
+    task = make_task(OPEN_3x3, [(0, 0)] * 4, [(2, 0)] * 4)
+    no_move = np.array([[0, 0, 0, 1, 0]], dtype=np.int32) # (0, 0) -> (1, 0) at t = 0
+    taken = np.array([[1, 1, 0]], dtype=np.int32) # (1, 0) at t = 1
+    must_visit = np.array([[1, 0, 1]], dtype=np.int32) # (0, 1) at t = 1
+    paths = find_paths_batch(task, range(4), {
+        0: (None, no_move, None),
+        1: (taken, None, None),
+        2: (None, None, must_visit),
+        3: (taken, no_move), # pairs are fine too
+    })
+    assert [len(path) for path in paths] == [4, 4, 5, 4]
+    assert tuple(paths[2][1]) == (0, 1)
+
+
+def test_conflict_avoiding_search_takes_conflict_free_cached_path():
+    task = make_task(OPEN_3x3, [(0, 0), (2, 2)], [(2, 0), (0, 2)])
+    node = get_start_node(task)
+    cache = path_cache_for(task)
+
+    assert update_solution_for(0, node, task, avoid_conflicts=True)
+    assert (cache.hits, cache.misses) == (0, 1)
+    # the stored path doesn't meet agent 1, so the search avoiding agent 1 takes it as well
+    assert update_solution_for(0, node, task, avoid_conflicts=True)
+    assert update_solution_for(0, node, task)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_conflict_avoiding_search_skips_conflicting_cached_path():
+    # agent 1 stays at (1, 0) from t = 1, every shortest path of agent 0 goes through it
+    task = make_task(OPEN_3x3, [(0, 0), (1, 1)], [(2, 0), (1, 0)])
+    node = get_start_node(task)
+    cache = path_cache_for(task)
+
+    assert update_solution_for(0, node, task)
+    assert update_solution_for(0, node, task, avoid_conflicts=True)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert len(node.solutions[0].path) == 3
+
+
+def test_path_cache_evicts_least_recently_used_by_bytes():
+    path = np.zeros((4, 2), dtype=np.int32) # 32 bytes
+    cache = PathCache(capacity=100)
+    for agent_id in range(3):
+        cache.put((agent_id,), path)
+    assert cache.size == 96
+    assert cache.get((0,)) is path # now 1 is the least recently used
+
+    cache.put((3,), path)
+    assert cache.size == 96
+    assert cache.get((1,)) is None and cache.get((0,)) is path and cache.get((3,)) is path
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_path_cache_sizes():
+    cache = PathCache(capacity=100)
+    cache.put((0, b'1234'), (np.zeros((4, 2), dtype=np.int32), None, None)) # key bytes count too
+    cache.put((1,), None) # no path is cached as well
+    assert cache.size == 36 and cache.get((1,), default='missing') is None
+
+    cache.put((2,), np.zeros((20, 2), dtype=np.int32)) # larger than the whole cache
+    assert cache.get((2,)) is None and cache.size == 36
+
+
+def test_path_cache_key_ignores_row_order():
+    rows = np.array([[3, 1, 0], [1, 2, 2], [1, 0, 2]], dtype=np.int32)
+    empty = np.zeros((0, 5), dtype=np.int32)
+    assert PathCache.key(0, (rows, empty), True) == PathCache.key(0, (rows[::-1].copy(), empty), True)
+    assert PathCache.key(0, (rows, empty), True) != PathCache.key(0, (rows[:2], empty), True)
+    assert PathCache.key(0, (rows, empty), True) != PathCache.key(1, (rows, empty), True)
+
+
+def test_path_cache_get_with_accept():
+    path = np.zeros((2, 2), dtype=np.int32)
+    cache = PathCache()
+    cache.put((0,), path)
+    assert cache.get((0,), accept=lambda result: False) is None
+    assert cache.get((0,), accept=lambda result: result is path) is path
+    assert (cache.hits, cache.misses) == (1, 1)
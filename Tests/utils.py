@@ -1,8 +1,12 @@
+import io
 import pathlib
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
 from Primitives.node import Node
+from Primitives.file_cache import load_cached
 
 # max time for each mini-test in seconds
 TIME_LIMIT = 30
@@ -27,35 +31,63 @@ def print_path(result: Node):
         print(f"cost = {solution.cost}")
 
 
-def read_scen(filename: str) -> pd.DataFrame:
+def read_scen(filename: str, max_bucket: Optional[int] = 10, cache_dir: Optional[str] = None) -> pd.DataFrame:
     '''
     Reads .map.scen file and writes all necessary fields into data frame
 
     :param filename: path to file
+    :param max_bucket: read only the tasks of the buckets up to this one, sorted by bucket,
+        `None` reads all of them in the order of the file, as the MovingAI benchmarks take agents
+    :param cache_dir: optional directory to keep the parsed table in, see `load_cached`
     '''
-    with open(filename) as file:
-        lines = file.readlines()
-    rows: tp.List[tp.Dict] = []
-    for line in lines[1:]:
-        bucket, _, _, _, start_x, start_y, goal_x, goal_y, length = line.split()
-        # the x-y coordiantes are flipped with matrix i-j coordinates
-        # so flip them back
-
+    table = load_cached(filename, _parse_scen, cache_dir)
+    # the x-y coordiantes are flipped with matrix i-j coordinates
+    # so flip them back
+    base = pd.DataFrame({
+        'bucket': table[:, 0].astype(int),
+        'start_x': table[:, 2].astype(int),
+        'start_y': table[:, 1].astype(int),
+        'goal_x': table[:, 4].astype(int),
+        'goal_y': table[:, 3].astype(int),
+        'length': table[:, 5]
+    })
+    if max_bucket is not None:
         # read only easy tasks
-        if int(bucket) <= 10:
-            row_table = {'bucket': int(bucket),
-                        'start_x': int(start_y),
-                        'start_y': int(start_x),
-                        'goal_x': int(goal_y),
-                        'goal_y': int(goal_x),
-                        'length': float(length)}
-            rows.append(row_table)
-    base = pd.DataFrame(rows).sort_values('bucket').reset_index(drop=True)
-    # base.sort_values('bucket')
+        base = base[base.bucket <= max_bucket]
+        base = base.sort_values('bucket', kind='stable').reset_index(drop=True)
     return base
 
 
-def read_scen_folder(folderName: str) -> Tests:
+def _parse_scen(data: bytes) -> np.ndarray:
+    ''' Rows (bucket, x, y of the start, x, y of the goal, length) of the scenario, parsed by the C reader of pandas '''
+    table = pd.read_csv(
+        io.BytesIO(data), sep=r'\s+', skiprows=1, header=None, usecols=[0, 4, 5, 6, 7, 8], dtype=float
+    )
+    return table.to_numpy()
+
+
+def read_instances(filename: str, cache_dir: Optional[str] = None) -> np.ndarray:
+    '''
+    Reads all tasks of the file written by `experiments.setup` at once
+
+    Returns (tasks, agents, 4) array of the rows (sy, sx, gy, gx) of each task,
+    every task there has the same number of agents
+
+    :param cache_dir: optional directory to keep the parsed tasks in, see `load_cached`
+    '''
+    return load_cached(filename, _parse_instances, cache_dir)
+
+
+def _parse_instances(data: bytes) -> np.ndarray:
+    # each task is the number of agents followed by their rows
+    numbers = np.array(data.split()).astype(int)
+    if numbers.size == 0: return np.zeros((0, 0, 4), dtype=int)
+    k = numbers[0]
+    return numbers.reshape(-1, 1 + 4 * k)[:, 1:].reshape(-1, k, 4)
+
+
+def scen_files(folderName: str) -> list[str]:
+    ''' Paths of the files in the folder, ordered by the number in their names '''
     folder = pathlib.Path(folderName)
     files = []
     for file in folder.iterdir():
@@ -63,7 +95,11 @@ def read_scen_folder(folderName: str) -> Tests:
         files.append((int(s) ,str(file)))
 
     files.sort()
-    return [read_scen(file) for _, file in files]
+    return [file for _, file in files]
+
+
+def read_scen_folder(folderName: str) -> Tests:
+    return [read_scen(file) for file in scen_files(folderName)]
 
 
 # import os
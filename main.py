@@ -1,6 +1,7 @@
 import argparse
+from functools import partial, wraps
 
-from Algorithms import cbs, cbs_pc, cbsh, icbs
+from Algorithms import cbs, cbs_pc, cbsh, icbs, ecbs, prioritized
 from Tests.test import simple_test
 
 parser = argparse.ArgumentParser(
@@ -9,7 +10,7 @@ parser = argparse.ArgumentParser(
 )
 parser.add_argument(
     'algorithm',
-     choices=['cbs', 'cbs_pc', 'cbsh', 'icbs'],
+     choices=['cbs', 'cbs_pc', 'cbsh', 'icbs', 'ecbs', 'prioritized'],
      help="algorithm to solve your problem with"
 )
 parser.add_argument(
@@ -23,11 +24,67 @@ parser.add_argument(
     metavar="filepath",
     help="store the solution animation in specified path, defaults 'solution_animation.gif'"
 )
+parser.add_argument(
+    '--disjoint',
+    action='store_true',
+    help="split conflicts into a positive and a negative constraint on one agent"
+)
+parser.add_argument(
+    '--symmetry',
+    action='store_true',
+    help="split rectangle and corridor conflicts with barrier constraints (cbs_pc and icbs only)"
+)
+parser.add_argument(
+    '--stats',
+    action='store_true',
+    help="time the phases of the search and count its nodes at both levels (cbs, cbs_pc, cbsh and icbs only)"
+)
+parser.add_argument(
+    '-w', '--suboptimality',
+    type=float,
+    metavar="factor",
+    help="bound on the cost of the ecbs solution relative to the optimal one, at least 1, defaults 1.5"
+)
+parser.add_argument(
+    '-t', '--time-limit',
+    type=float,
+    metavar="seconds",
+    help="stop the search after this time, giving the best solution found so far, if any"
+)
+parser.add_argument(
+    '-n', '--node-limit',
+    type=int,
+    metavar="nodes",
+    help="stop the search after expanding this many nodes (trying this many orderings for prioritized), "
+         "giving the best solution found so far, if any"
+)
 
 args = parser.parse_args()
+if args.symmetry and args.algorithm not in ('cbs_pc', 'icbs'):
+    parser.error("--symmetry is supported only by cbs_pc and icbs")
+if args.stats and args.algorithm in ('ecbs', 'prioritized'):
+    parser.error("--stats is supported only by cbs, cbs_pc, cbsh and icbs")
+if args.disjoint and args.algorithm in ('ecbs', 'prioritized'):
+    parser.error(f"--disjoint is not supported by {args.algorithm}")
+if args.suboptimality is not None and args.algorithm != 'ecbs':
+    parser.error("--suboptimality is supported only by ecbs")
+if args.suboptimality is not None and args.suboptimality < 1:
+    parser.error("--suboptimality must be at least 1")
+
+options = {}
+if args.disjoint: options['disjoint'] = True
+if args.symmetry: options['symmetry'] = True
+if args.stats: options['stats'] = True
+if args.suboptimality is not None: options['suboptimality'] = args.suboptimality
+if args.time_limit is not None: options['time_limit'] = args.time_limit
+if args.node_limit is not None: options['node_limit'] = args.node_limit
+
+solve = eval(args.algorithm + '.solve')
+if options:
+    solve = wraps(solve)(partial(solve, **options))
 
 simple_test(
     args.filename, 
-    algorithms=[eval(args.algorithm + '.solve')],
+    algorithms=[solve],
     show=False, save=args.draw, print_path=True
 )
@@ -14,6 +14,9 @@ module1 = Extension(
         dir + 'src/PriorityQueue.c',
         dir + 'src/Array.c',
         dir + 'src/Set.c',
+        dir + 'src/NodeSet.c',
+        dir + 'src/KeyTable.c',
+        dir + 'src/Conflicts.c',
     ],
     include_dirs=[
         dir + 'include',